@@ -4,124 +4,239 @@
 # (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
 # Government retains certain rights in this software.
 
+import heapq
+
 
 class TestBacklog:
     """
-    Stores a list of TestCase objects.  They are sorted in descending order
-    using keys (num procs, runtime)
+    Stores TestCase objects, which are popped in descending order of a sort
+    key, which by default is (num procs, runtime).  Tests with equal keys are
+    popped in the order they were inserted.  Only tests that are ready to run
+    (not blocked by dependencies) should be added, but tests can be added at
+    any time.
+
+    The tests are stored in buckets by size (num procs, num devices, and the
+    consumable resources such as memory), and each bucket is a heap ordered
+    by the sort key.  The number of distinct sizes is small, so finding the
+    largest test that fits a size constraint only looks at the top of each
+    bucket.
+
+    The key of each test is computed when it is inserted (the runtime
+    attribute is reset when tests are prepared for execution).
     """
 
     def __init__(self):
         ""
-        self.tests = []
+        self.buckets = {}  # schedule size -> heap of (negated key,count,TestCase)
+        self.count = 0     # insertion counter, used to break ties
+        self.numtests = 0
 
-    def insert(self, tcase):
+    def insert(self, tcase, key=None):
         """
-        Note: to support streaming, this function would have to do a
-              sorted insert rather than an append
+        Adds a test.  The 'key' is a sequence of numbers used to order the
+        tests, which defaults to sort_key(tcase).
         """
-        self.tests.append( tcase )
+        if key is None:
+            key = sort_key( tcase )
+
+        size = tcase.getScheduleSize()
+
+        heap = self.buckets.get( size, None )
+        if heap is None:
+            heap = []
+            self.buckets[ size ] = heap
 
-    def sort(self):
+        negkey = tuple( [ -k for k in key ] )
+        heapq.heappush( heap, ( negkey, self.count, tcase ) )
+
+        self.count += 1
+        self.numtests += 1
+
+    def numTests(self):
         ""
-        self.tests.sort(
-                key=lambda tc: [ tc.getSize()[0], tc.getStat().getRuntime(0) ],
-                reverse=True )
+        return self.numtests
 
     def pop(self):
         ""
         return self._pop_test( None )
 
-    def pop_by_size(self, maxsize):
-        ""
-        constraint = TestConstraint( maxsize )
-        return self._pop_test( constraint )
+    def peek(self):
+        """
+        Returns the test with the largest key without removing it, or None if
+        the backlog is empty.
+        """
+        best = None
+        for heap in self.buckets.values():
+            if best is None or heap[0][:2] < best[:2]:
+                best = heap[0]
+
+        if best is None:
+            return None
+        return best[2]
+
+    def pop_by_size(self, maxsize, accept=None):
+        """
+        Removes and returns the test with the largest key whose size fits
+        within 'maxsize', a (np,ndevice) or (np,ndevice,consumables) tuple
+        (see fits_within()).  If 'maxsize' is None, the test with the largest key
+        is returned.  None is returned if no test fits.
+
+        If 'accept' is given, it is a function taking a TestCase and returning
+        True if the test can be popped.  This has to look past the top of
+        each bucket, so it is slower.
+        """
+        if accept is None:
+            return self._pop_test( maxsize )
+        return self._pop_accepted_test( maxsize, accept )
 
     def consume(self):
         ""
-        while len( self.tests ) > 0:
-            tcase = self.tests.pop( 0 )
-            yield tcase
+        while self.numtests > 0:
+            yield self._pop_test( None )
 
     def iterate(self):
         ""
-        for tcase in self.tests:
-            yield tcase
+        entries = []
+        for heap in self.buckets.values():
+            entries.extend( heap )
+        entries.sort( key=lambda ent: ent[:2] )
+
+        for ent in entries:
+            yield ent[2]
 
-    def _pop_test(self, constraint):
+    def _pop_test(self, maxsize):
         ""
-        tcase = None
+        bucket = None
+        best = None
 
-        if constraint:
-            idx = self._get_starting_index( constraint.getMaxNP() )
-        else:
-            idx = 0
+        for size,heap in self.buckets.items():
+            if maxsize is None or fits_within( size, maxsize ):
+                order = heap[0][:2]
+                if best is None or order < best:
+                    best = order
+                    bucket = size
+
+        if bucket is None:
+            return None
+
+        heap = self.buckets[ bucket ]
+        tcase = heapq.heappop( heap )[2]
+        if len( heap ) == 0:
+            self.buckets.pop( bucket )
 
-        while idx < len( self.tests ):
-            if constraint is None or constraint.apply( self.tests[idx] ):
-                tcase = self.tests.pop( idx )
-                break
-            idx += 1
+        self.numtests -= 1
 
         return tcase
 
-    def _get_starting_index(self, max_np):
+    def _pop_accepted_test(self, maxsize, accept):
         ""
-        if max_np == None:
-            return 0
-        else:
-            return bisect_left( self.tests, max_np )
+        bucket = None
+        best = None
+
+        for size,heap in self.buckets.items():
+            if maxsize is None or fits_within( size, maxsize ):
+                idx = find_accepted_entry( heap, accept )
+                if idx is not None:
+                    order = heap[idx][:2]
+                    if best is None or order < best[0]:
+                        best = ( order, idx )
+                        bucket = size
+
+        if bucket is None:
+            return None
 
+        heap = self.buckets[ bucket ]
+        idx = best[1]
+        tcase = heap[idx][2]
 
-class TestConstraint:
+        heap[idx] = heap[-1]
+        heap.pop()
+        heapq.heapify( heap )
+        if len( heap ) == 0:
+            self.buckets.pop( bucket )
 
-    def __init__(self, maxsize):
-        ""
-        self.maxsize = maxsize
+        self.numtests -= 1
 
-    def getMaxNP(self):
-        ""
-        if self.maxsize == None:
-            return None
-        else:
-            return self.maxsize[0]
+        return tcase
 
-    def apply(self, tcase):
-        ""
-        if self.maxsize != None:
 
-            np,nd = tcase.getSize()
-            maxnp,maxnd = self.maxsize
+def find_accepted_entry( heap, accept ):
+    """
+    Returns the index of the smallest heap entry whose test is accepted, or
+    None if no entry is accepted.
+    """
+    if accept( heap[0][2] ):
+        return 0
+
+    best = None
+    for idx in range( 1, len(heap) ):
+        if best is None or heap[idx][:2] < heap[best][:2]:
+            if accept( heap[idx][2] ):
+                best = idx
 
-            if np > maxnp or nd > maxnd:
-                return False
+    return best
 
-        if tcase.isBlocked():
+
+def fits_within( size, maxsize ):
+    """
+    True if each element of 'size' is not larger than the same element of
+    'maxsize'.  A maxsize element of None is unlimited, as are the elements
+    past the length of 'maxsize'.
+
+    The third element, if present, is a tuple of (name,amount) pairs for
+    consumable resources in 'size' and a dict of name to amount available in
+    'maxsize'.  Names not in the dict are unlimited.
+    """
+    for sz,mx in zip( size, maxsize ):
+        if mx is None:
+            pass
+        elif isinstance( mx, dict ):
+            for name,amount in sz:
+                if amount > mx.get( name, amount ):
+                    return False
+        elif sz > mx:
             return False
 
-        return True
+    return True
+
+
+def add_sizes( maxsize, size ):
+    """
+    Adds a size to a maxsize (see fits_within()).  The result has the length
+    of the shorter of the two.
+    """
+    newsize = []
+
+    for mx,sz in zip( maxsize, size ):
+        if mx is None:
+            newsize.append( None )
+        elif isinstance( mx, dict ):
+            mx = dict( mx )
+            for name,amount in sz:
+                if name in mx:
+                    mx[name] += amount
+            newsize.append( mx )
+        else:
+            newsize.append( mx + sz )
+
+    return tuple( newsize )
+
+
+def subtract_sizes( maxsize, size ):
+    """
+    Subtracts a size from a maxsize (see fits_within()).
+    """
+    negsize = []
+
+    for sz in size:
+        if isinstance( sz, tuple ):
+            negsize.append( tuple( [ (name,-amount) for name,amount in sz ] ) )
+        else:
+            negsize.append( -sz )
+
+    return add_sizes( maxsize, negsize )
 
 
-def bisect_left( tests, np ):
+def sort_key( tcase ):
     ""
-    lo = 0
-    hi = len(tests)
-    while lo < hi:
-        mid = (lo+hi)//2
-        if np < tests[mid].getSize()[0]: lo = mid+1
-        else: hi = mid
-    return lo
-
-# To insert into the sorted test list, a specialization of insort_right is
-# needed.  The comparison is based on np, and the list is in descending order.
-# This function is just the python implementation of bisect.insort_right()
-# and would need to be modified to work for this use case.
-# def insort_right( a, x, less_than ):
-#     ""
-#     lo = 0
-#     hi = len(a)
-#     while lo < hi:
-#         mid = (lo+hi)//2
-#         if less_than( x, a[mid] ): hi = mid
-#         else: lo = mid+1
-#     a.insert(lo, x)
+    return [ tcase.getSize()[0], tcase.getStat().getRuntime(0) ]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import signal
+import select
+import errno
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ChildExitWaiter:
+    """
+    Blocks until a child process exits or a timeout expires.
+
+    A SIGCHLD handler writes a byte into a pipe (the "self-pipe trick"), and
+    the wait is a select() on the read end of the pipe.  A child that exits
+    after the caller last polled but before it calls wait() leaves a byte in
+    the pipe, so no exit is missed.  If the handler cannot be installed (not
+    the main thread, or no SIGCHLD on this platform), wait() just sleeps.
+    """
+
+    def __init__(self):
+        ""
+        self.rfd = None
+        self.wfd = None
+        self.saved_handler = None
+
+    def start(self):
+        ""
+        assert self.rfd is None
+
+        if fcntl is None or not hasattr( signal, 'SIGCHLD' ):
+            return
+
+        rfd,wfd = os.pipe()
+        set_nonblocking_close_on_exec( rfd )
+        set_nonblocking_close_on_exec( wfd )
+
+        try:
+            self.saved_handler = signal.signal( signal.SIGCHLD,
+                                                self._sigchld_handler )
+        except ValueError:
+            # signal handlers can only be set in the main thread
+            os.close( rfd )
+            os.close( wfd )
+            return
+
+        # restart interrupted system calls in the rest of the program
+        signal.siginterrupt( signal.SIGCHLD, False )
+
+        self.rfd = rfd
+        self.wfd = wfd
+
+    def stop(self):
+        ""
+        if self.rfd is not None:
+            signal.signal( signal.SIGCHLD, self.saved_handler or signal.SIG_DFL )
+            os.close( self.rfd )
+            os.close( self.wfd )
+            self.rfd = None
+            self.wfd = None
+            self.saved_handler = None
+
+    def isActive(self):
+        ""
+        return self.rfd is not None
+
+    def wait(self, timeout, other_files=[]):
+        """
+        Returns when a child process exits, when one of the 'other_files' is
+        readable, or after 'timeout' seconds, whichever comes first.  A
+        'timeout' of None means no time limit.
+        """
+        if timeout is not None:
+            timeout = max( 0, timeout )
+
+        if self.rfd is None:
+            if other_files:
+                select_ignoring_interrupt( other_files, timeout )
+            elif timeout is not None:
+                time.sleep( timeout )
+            return
+
+        select_ignoring_interrupt( [self.rfd]+list(other_files), timeout )
+
+        self._drain()
+
+
+    def _drain(self):
+        ""
+        try:
+            while os.read( self.rfd, 512 ):
+                pass
+        except OSError:
+            pass
+
+    def _sigchld_handler(self, signum, frame):
+        ""
+        try:
+            os.write( self.wfd, b'x' )
+        except (OSError, TypeError):
+            # pipe is full (a wake up is already pending) or closed
+            pass
+
+
+def select_ignoring_interrupt( read_files, timeout ):
+    ""
+    try:
+        select.select( read_files, [], [], timeout )
+    except (select.error, OSError, IOError):
+        # an interrupted select (Python 2) counts as a wake up
+        if sys.exc_info()[1].args[0] != errno.EINTR:
+            raise
+
+
+def set_nonblocking_close_on_exec( fd ):
+    ""
+    fl = fcntl.fcntl( fd, fcntl.F_GETFL )
+    fcntl.fcntl( fd, fcntl.F_SETFL, fl | os.O_NONBLOCK )
+
+    set_close_on_exec( fd )
+
+
+def set_close_on_exec( fd ):
+    ""
+    fl = fcntl.fcntl( fd, fcntl.F_GETFD )
+    fcntl.fcntl( fd, fcntl.F_SETFD, fl | fcntl.FD_CLOEXEC )
@@ -15,6 +15,7 @@ from .platexpr import create_platform_expression
 from .paramexpr import create_parameter_expression
 from . import wordcheck
 from .timehandler import parse_num_seconds
+from .parseutil import parse_memory_size
 
 
 def parse_command_line( argvlist, vvtest_version=None ):
@@ -125,6 +126,9 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--scan-type', metavar='TYPE', dest='scan_type', action='append',
         help='Unused. Left in as a placeholder in case another test format type '
              'comes along (such as the Sierra project).' )
+    grp.add_argument( '--scan-jobs', metavar='NUM', dest='scan_jobs', type=int,
+        help='Parse the test files found while scanning directories using '
+             'this many processes.  Default is one (no subprocesses).' )
 
     # behavior
     grp = psr.add_argument_group( 'Runtime behavior' )
@@ -166,6 +170,20 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--minimal-xdirs', action='store_true',
         help='Shorten execution directory names by excluding parameterize '
              'names with only one value.' )
+    if an_argument_startswith( '--parse-cache=', argvlist ):
+        grp.add_argument( '--parse-cache', action='store', metavar='DIRECTORY',
+            help='Optionally just --parse-cache.  Cache the results of parsing '
+                 'test files in the given directory and reuse them for test '
+                 'files that have not changed.' )
+    else:
+        grp.add_argument( '--parse-cache', action='store_true',
+            help='Optionally --parse-cache=<directory>.  Cache the results of '
+                 'parsing test files in the test results directory (or the '
+                 'given directory) and reuse them for test files that have '
+                 'not changed.' )
+    grp.add_argument( '--refresh-generators', action='store_true',
+        help='Run parameter generator programs even if their output is '
+             'available in the --parse-cache directory.' )
 
     # resources
     grp = psr.add_argument_group( 'Resource controls' )
@@ -185,6 +203,12 @@ def create_parser( argvlist, vvtest_version ):
         help='The max number of devices available for each test (e.g. max '
              'GPUs). Tests taking more than this value are not run. '
              'Defaults to platform plugin value if set, or zero if not.' )
+    grp.add_argument( '--max-memory', metavar='SIZE',
+        help='The amount of memory tests can use at any one time (such as '
+             '64G or 512M; a plain number is megabytes).  Tests given a '
+             '"memory" directive are not started until enough of it is '
+             'free.  Defaults to platform plugin value if set, or the '
+             'system memory (or control group limit) if not.' )
     grp.add_argument( '--plat',
         help='Use this platform name for defaults and plugins.' )
     grp.add_argument( '--platopt', action='append',
@@ -197,10 +221,41 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--timeout-multiplier', metavar='NUMBER',
         help='Apply a multiplier to the timeout value for each test. '
              'Can be a positive integer or float.' )
+    grp.add_argument( '--timeout-percentile', metavar='NUMBER',
+        help='For tests with enough previous runtimes, the timeout is this '
+             'percentile (0 to 100) of the runtimes times the '
+             '--timeout-margin.  Default is 95.' )
+    grp.add_argument( '--timeout-margin', metavar='NUMBER',
+        help='The multiplier applied to the runtime percentile to get the '
+             'timeout of a test.  Can be a positive integer or float.  '
+             'Default is 1.5.' )
     grp.add_argument( '--max-timeout', metavar='SECONDS',
         help='Maximum timeout value for each test and for batch jobs '
              '(number of seconds or 10m or 2h or HH:MM:SS). A zero '
              'or negative value means no maximum.' )
+    grp.add_argument( '--schedule', metavar='POLICY',
+        help='The policy for choosing the next test to run. The default, '
+             '"size", runs tests using the most processors first, then the '
+             'longest running. Use "critical-path" to first run tests '
+             'with the longest runtime of the test plus the tests that '
+             'depend on it.' )
+    grp.add_argument( '--backfill', action='store_true',
+        help='When the next test does not fit in the free processors, '
+             'reserve them for it, and only start other tests that are '
+             'predicted (from previous runtimes) to finish before the '
+             'reservation time.  Prevents tests using many processors from '
+             'waiting indefinitely behind smaller tests.' )
+    grp.add_argument( '--load-adaptive', metavar='MIN_CORES', type=int,
+        help='Sample the machine load average and CPU pressure while '
+             'running, and reduce the number of cores occupied (down to '
+             'MIN_CORES) when other processes are loading the machine.  '
+             'Grows back to NUM_CORES when the load drops.  Running tests '
+             'are not stopped.' )
+    grp.add_argument( '--bind-cores', action='store_true',
+        help='Bind each test to the CPU cores allocated to it, and set '
+             'OMP_NUM_THREADS and OMP_PLACES to match (unless they are '
+             'already set).  Keeps concurrent threaded tests from '
+             'migrating across the machine.' )
     grp.add_argument( '--total-timeout', metavar='SECONDS',
         help='Stop running tests but exit normally after this amount of time '
              '(number of seconds or 10m or 2h or HH:MM:SS). A zero '
@@ -414,6 +469,10 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.dash_N is not None and float(opts.dash_N) <= 0:
             raise Exception( 'must be positive' )
 
+        errtype = '--load-adaptive'
+        if opts.load_adaptive is not None and opts.load_adaptive <= 0:
+            raise Exception( 'must be positive' )
+
         errtype = 'num devices'
         if opts.devices is not None and opts.devices <= 0:
             raise Exception( 'must be positive' )
@@ -422,6 +481,19 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.max_devices is not None and float(opts.max_devices) <= 0:
             raise Exception( 'must be positive' )
 
+        errtype = '--max-memory'
+        if opts.max_memory is not None:
+            mb,err = parse_memory_size( opts.max_memory )
+            if err:
+                raise Exception( err )
+            opts.max_memory = mb
+
+        errtype = '--schedule'
+        if opts.schedule is not None:
+            if opts.schedule not in [ 'size', 'critical-path' ]:
+                raise Exception( 'must be "size" or "critical-path": ' + \
+                                 repr(opts.schedule) )
+
         errtype = 'tmin/tmax/tsum'
         mn,mx,sm = convert_test_time_options( opts.tmin, opts.tmax, opts.tsum )
         opts.tmin = mn
@@ -436,6 +508,10 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.scan_type is not None:
             opts.scan_type = check_adjust_scan_type( opts.scan_type )
 
+        errtype = '--scan-jobs'
+        if opts.scan_jobs is not None and opts.scan_jobs <= 0:
+            raise Exception( 'must be positive' )
+
     except Exception:
         sys.stderr.write( '*** error: command line problem with ' + \
             str(errtype)+': '+str(sys.exc_info()[1]) + '\n' )
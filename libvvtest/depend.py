@@ -6,6 +6,7 @@
 
 import os, sys
 import fnmatch
+import bisect
 
 from . import logger
 
@@ -32,7 +33,7 @@ class DependencyPattern:
         self.expect = expect
         self.expr = result_word_expr
 
-    def find_deps(self, strict, testfile, params, testcasemap):
+    def find_deps(self, strict, testfile, params, testcasemap, index=None):
         """
         Returns ( list of TestCase, failure reason ), where 'reason' is
         None on success.
@@ -40,19 +41,21 @@ class DependencyPattern:
         If 'strict' is True, then any issue gathering the dependencies is
         treated as a failure. If False, then all matching dependencies are
         gathered and returned in the list.
+
+        The 'index' is an optional TestMatchIndex of the 'testcasemap'.
         """
-        depL = self._find_tests( testfile, params, testcasemap )
+        depL = self._find_tests( testfile, params, testcasemap, index )
         if self._matched_as_expected( depL, strict ):
             return depL,None
         else:
             reason = self._make_match_fail_reason( testfile, params, depL )
             return None,reason
 
-    def _find_tests(self, testfile, params, testcasemap):
+    def _find_tests(self, testfile, params, testcasemap, index=None):
         ""
         srcdir = os.path.dirname( testfile )
         matchpat = self._make_match_pattern( testfile, params )
-        dep_ids = find_tests_by_pattern( srcdir, matchpat, testcasemap )
+        dep_ids = find_tests_by_pattern( srcdir, matchpat, testcasemap, index )
         depL = [ testcasemap[tid] for tid in dep_ids ]
         return depL
 
@@ -228,7 +231,7 @@ class BadMatchReason:
         return s
 
 
-def find_tests_by_pattern( srcdir, pattern, testcasemap ):
+def find_tests_by_pattern( srcdir, pattern, testcasemap, index=None ):
     """
     The 'srcdir' is the directory of the dependent test source file relative
     to the scan root.  The shell glob 'pattern' is matched against the match
@@ -245,8 +248,14 @@ def find_tests_by_pattern( srcdir, pattern, testcasemap ):
     included (unless none of them are a last stage, in which case all of
     them are included).
 
+    If 'index' is not None, it must be a TestMatchIndex of the
+    'testcasemap', and is used to avoid matching against every test.
+
     A python set of TestSpec ID is returned.
     """
+    if index is None:
+        index = TestMatchIndex( testcasemap )
+
     if srcdir == '.':
         srcdir = ''
     elif srcdir:
@@ -257,30 +266,89 @@ def find_tests_by_pattern( srcdir, pattern, testcasemap ):
     pat3 = pattern
     pat4 = '*'+pattern
 
-    L1 = [] ; L2 = [] ; L3 = [] ; L4 = []
+    for pat in [ pat1, pat2, pat3, pat4 ]:
+        L = index.findMatches( pat )
+        if len(L) > 0:
+            return collect_matching_test_ids( L, testcasemap )
+
+    return set()
 
-    for tid,tcase in testcasemap.items():
 
-        tspec = tcase.getSpec()
-        mat = tspec.getTestID().computeMatchString()
+class TestMatchIndex:
+    """
+    An index of the match strings of the tests in a test case map, used to
+    find the tests matching a shell pattern without applying the pattern to
+    every test.
+
+    Patterns without wildcard characters are looked up in a map of match
+    string to test IDs.  For other patterns, the leading (or trailing)
+    characters before (or after) the first (or last) wildcard select a range
+    of the sorted match strings (or sorted reversed match strings), and only
+    those are matched with fnmatch.  A pattern without either a literal
+    prefix or suffix is matched against all tests.
+    """
 
-        if fnmatch.fnmatch( mat, pat1 ):
-            L1.append( tid )
+    def __init__(self, testcasemap):
+        ""
+        self.matchmap = {}
+        for tid,tcase in testcasemap.items():
+            mat = tcase.getSpec().getTestID().computeMatchString()
+            self.matchmap.setdefault( mat, [] ).append( tid )
 
-        if fnmatch.fnmatch( mat, pat2 ):
-            L2.append( tid )
+        self.matches = sorted( self.matchmap.keys() )
+        self.reversed = sorted( [ mat[::-1] for mat in self.matches ] )
 
-        if fnmatch.fnmatch( mat, pat3 ):
-            L3.append( tid )
+    def findMatches(self, pattern):
+        """
+        Returns a list of the test IDs whose match string matches the shell
+        'pattern', in the same way fnmatch.fnmatch() would.
+        """
+        pattern = os.path.normcase( pattern )
 
-        if fnmatch.fnmatch( mat, pat4 ):
-            L4.append( tid )
+        prefix = literal_pattern_prefix( pattern )
 
-    for L in [ L1, L2, L3, L4 ]:
-        if len(L) > 0:
-            return collect_matching_test_ids( L, testcasemap )
+        if prefix == pattern:
+            return list( self.matchmap.get( pattern, [] ) )
 
-    return set()
+        suffix = literal_pattern_prefix( pattern[::-1] )[::-1]
+
+        if len( suffix ) > len( prefix ):
+            rL = strings_with_prefix( self.reversed, suffix[::-1] )
+            candidates = [ rmat[::-1] for rmat in rL ]
+        else:
+            candidates = strings_with_prefix( self.matches, prefix )
+
+        idL = []
+        for mat in fnmatch.filter( candidates, pattern ):
+            idL.extend( self.matchmap[mat] )
+
+        return idL
+
+
+def literal_pattern_prefix( pattern ):
+    """
+    Returns the characters of the shell 'pattern' before the first special
+    character.  The ']' character is included so the function can also be
+    applied to a reversed pattern.
+    """
+    for i,c in enumerate( pattern ):
+        if c in '*?[]':
+            return pattern[:i]
+    return pattern
+
+
+def strings_with_prefix( sorted_strings, prefix ):
+    ""
+    if not prefix:
+        return sorted_strings
+
+    i = bisect.bisect_left( sorted_strings, prefix )
+    j = i
+    n = len( sorted_strings )
+    while j < n and sorted_strings[j].startswith( prefix ):
+        j += 1
+
+    return sorted_strings[i:j]
 
 
 def collect_matching_test_ids( idlist, testcasemap ):
@@ -361,8 +429,11 @@ def connect_analyze_dependencies( analyze, tcaseL, testcasemap ):
                 gxt.setHasDependent()
 
 
-def check_connect_dependencies( tcase, testcasemap, strict=True ):
-    ""
+def check_connect_dependencies( tcase, testcasemap, strict=True, index=None ):
+    """
+    The 'index' is an optional TestMatchIndex of the 'testcasemap', which
+    should be given when connecting the dependencies of many tests.
+    """
     tspec = tcase.getSpec()
 
     for dpat in tspec.getDependencyPatterns():
@@ -370,7 +441,8 @@ def check_connect_dependencies( tcase, testcasemap, strict=True ):
         depL,reason = dpat.find_deps( strict,
                                       tspec.getFilepath(),
                                       tspec.getParameters(), 
-                                      testcasemap )
+                                      testcasemap,
+                                      index )
 
         if depL is None:
             if strict:
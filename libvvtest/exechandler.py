@@ -19,7 +19,8 @@ except Exception:
 
 from . import logger
 from . import writeutil
-from .makecmd import MakeScriptCommand
+from .makecmd import MakeScriptCommand, make_program_command
+from .userplugin import call_preload_request
 
 
 class ExecutionHandler:
@@ -64,41 +65,47 @@ class ExecutionHandler:
         wdir = pjoin( self.loc.getTestingDirectory(), xdir )
         texec.setRunDirectory( wdir )
 
-    def check_run_preclean(self, tcase, baseline):
+    def check_run_preclean(self, tcase, baseline, rundir='.'):
         ""
-        if self.rtconfig.getAttr('preclean') and \
-           not self.rtconfig.getAttr('analyze') and \
-           not baseline and \
-           tcase.getSpec().isFirstStage():
-            self.preclean( tcase )
+        if self.needs_preclean( tcase, baseline ):
+            self.preclean( tcase, rundir )
 
-    def preclean(self, tcase):
+    def needs_preclean(self, tcase, baseline):
+        ""
+        return self.rtconfig.getAttr('preclean') and \
+               not self.rtconfig.getAttr('analyze') and \
+               not baseline and \
+               tcase.getSpec().isFirstStage()
+
+    def preclean(self, tcase, rundir='.'):
         """
         Should only be run just prior to launching the test script.  It
         removes all files in the execute directory except for a few vvtest
         files.
         """
         print( "Cleaning execute directory for execution..." )
-        pre_clean_execute_directory()
-
-    def check_set_working_files(self, tcase, baseline):
-        """
-        establish soft links and make copies of working files
-        """
-        if not baseline:
-            if not self.setWorkingFiles( tcase ):
-                sys.stdout.flush()
-                sys.stderr.flush()
-                raise Exception( 'failed to setup working files' )
+        pre_clean_execute_directory( rundir )
 
-    def setWorkingFiles(self, tcase):
+    def setWorkingFiles(self, tcase, rundir=None):
         """
         Called before the test script is executed, this sets the link and
-        copy files in the test execution directory.  Returns False if certain
-        errors are encountered and written to stderr, otherwise True.
+        copy files in the test execution directory 'rundir' (defaults to the
+        current directory).  Returns False if certain errors are encountered
+        and written to stderr, otherwise True.
         """
         print( "Linking and copying working files..." )
 
+        srcdir,lnL,cpL = self.get_working_files( tcase )
+
+        ok = link_and_copy_files( srcdir, lnL, cpL, rundir )
+
+        return ok
+
+    def get_working_files(self, tcase):
+        """
+        Returns the test source directory and the lists of files to soft link
+        and to copy into the execution directory.
+        """
         tspec = tcase.getSpec()
 
         srcdir = self.loc.path_to_source( tspec.getFilepath(), tspec.getRootpath() )
@@ -110,11 +117,9 @@ class ExecutionHandler:
             cpL = tspec.getLinkFiles() + tspec.getCopyFiles()
             lnL = []
 
-        ok = link_and_copy_files( srcdir, lnL, cpL )
-
-        return ok
+        return srcdir, lnL, cpL
 
-    def set_timeout_environ_variable(self, timeout):
+    def set_timeout_environ_variable(self, environ, timeout):
         """
         add a timeout environ variable so the test can take steps to
         shutdown a running application that is taking too long; the app
@@ -122,7 +127,17 @@ class ExecutionHandler:
         not recognize it as a timeout
         """
         if timeout > 0:
-            os.environ['VVTEST_TIMEOUT'] = str( timeout )
+            environ['VVTEST_TIMEOUT'] = str( timeout )
+
+    def set_affinity_environ_variables(self, environ, cpus):
+        """
+        if the test is bound to a set of CPUs, have OpenMP use those CPUs,
+        unless the variables are already set by the user
+        """
+        if cpus:
+            places = ','.join( [ '{'+str(c)+'}' for c in cpus ] )
+            environ.setdefault( 'OMP_NUM_THREADS', str( len(cpus) ) )
+            environ.setdefault( 'OMP_PLACES', places )
 
     def check_run_postclean(self, tcase, rundir):
         ""
@@ -139,7 +154,7 @@ class ExecutionHandler:
         """
         post_clean_execute_directory( rundir )
 
-    def copyBaselineFiles(self, tcase):
+    def copyBaselineFiles(self, tcase, rundir):
         ""
         tspec = tcase.getSpec()
 
@@ -149,19 +164,7 @@ class ExecutionHandler:
         for fromfile,tofile in tspec.getBaselineFiles():
             dst = pjoin( srcdir, tofile )
             logger.info( "baseline: cp -p {0} {1}".format(fromfile, dst) )
-            shutil.copy2( fromfile, dst )
-
-    def check_write_mpi_machine_file(self, resourceobj):
-        ""
-        if hasattr( resourceobj, 'machinefile' ):
-
-            fp = open( "machinefile", "w" )
-            try:
-                fp.write( resourceobj.machinefile )
-            finally:
-                fp.close()
-
-            self.perms.apply( os.path.abspath( "machinefile" ) )
+            shutil.copy2( pjoin( rundir, fromfile ), pjoin( rundir, dst ) )
 
     def finishExecution(self, texec):
         ""
@@ -176,6 +179,10 @@ class ExecutionHandler:
         else:
             tstat.markTimedOut( time.time() )
 
+        usage = texec.getResourceUsage()
+        if usage:
+            tstat.setResourceUsage( usage )
+
         rundir = texec.getRunDirectory()
         self.perms.recurse( rundir )
 
@@ -189,7 +196,8 @@ class ExecutionHandler:
 
         maker = MakeScriptCommand( self.loc, tcase.getSpec(),
                                    program=prog,
-                                   shbang_supported=self.shbang )
+                                   shbang_supported=self.shbang,
+                                   rundir=texec.getRunDirectory() )
         cmdL = maker.make_base_execute_command( baseline )
 
         if cmdL is not None:
@@ -206,33 +214,73 @@ class ExecutionHandler:
         return cmdL
 
     def prepare_for_launch(self, texec, baseline):
-        ""
+        """
+        Writes the vvtest utility scripts and returns the command to run, the
+        environment to run it in (a dict), and the test setup (see
+        make_test_setup).  The setup is done by the process that runs the
+        command (see setup_test_process), so that copying large working files
+        does not hold up vvtest and the user plugin preload function runs in
+        the test directory without affecting vvtest.  The current working
+        directory and os.environ are not changed.
+        """
         tcase = texec.getTestCase()
 
         rundir = texec.getRunDirectory()
         self.write_script_utils( tcase, rundir, baseline )
 
+        environ = dict( os.environ )
+
         tm = texec.getExecTimeout()
-        self.set_timeout_environ_variable( tm )
+        self.set_timeout_environ_variable( environ, tm )
+        self.set_affinity_environ_variables( environ, texec.getAffinity() )
 
-        self.check_run_preclean( tcase, baseline )
-        self.check_write_mpi_machine_file( texec.getResourceObject() )
-        self.check_set_working_files( tcase, baseline )
+        setup = self.make_test_setup( texec, baseline )
 
-        set_PATH_and_PYTHONPATH( rundir, self.rtconfig )
+        set_PATH_and_PYTHONPATH( environ, rundir, self.rtconfig )
 
-        prog = self.plugin.testPreload( tcase )
+        cmd_list = self.make_execute_command( texec, baseline, None )
 
-        cmd_list = self.make_execute_command( texec, baseline, prog )
+        if cmd_list is not None:
+            preload = self.plugin.getPreloadRequest( tcase )
+            if preload is not None:
+                # the arguments that follow a program returned by the preload
+                setup['preload'] = preload
+                setup['arguments'] = self.make_execute_command(
+                                            texec, baseline, 'program' )[1:]
+        else:
+            echo_test_execution_info( tcase.getSpec().getName(), None, tm,
+                                      rundir )
+            print('')
 
-        echo_test_execution_info( tcase.getSpec().getName(), cmd_list, tm )
+        if baseline:
+            self.copyBaselineFiles( tcase, rundir )
 
-        print('')
+        return cmd_list, environ, setup
 
-        if baseline:
-            self.copyBaselineFiles( tcase )
+    def make_test_setup(self, texec, baseline):
+        """
+        Returns a dict describing the preparation done by the test process
+        just before the test runs (see setup_test_process).
+        """
+        tcase = texec.getTestCase()
+
+        setup = { 'name'    : tcase.getSpec().getName(),
+                  'timeout' : texec.getExecTimeout() }
 
-        return cmd_list
+        if self.needs_preclean( tcase, baseline ):
+            setup['preclean'] = True
+
+        obj = texec.getResourceObject()
+        if hasattr( obj, 'machinefile' ):
+            setup['machinefile'] = obj.machinefile
+
+        if not baseline:
+            srcdir,lnL,cpL = self.get_working_files( tcase )
+            setup['srcdir'] = srcdir
+            setup['links'] = lnL
+            setup['copies'] = cpL
+
+        return setup
 
     def write_script_utils(self, tcase, rundir, baseline):
         ""
@@ -254,7 +302,7 @@ class ExecutionHandler:
                 self.perms.apply( os.path.abspath( script_file ) )
 
 
-def set_PATH_and_PYTHONPATH( rundir, rtconfig ):
+def set_PATH_and_PYTHONPATH( environ, rundir, rtconfig ):
     """
     When running Python in a test, the sys.path must include a few vvtest
     directories as well as the user's config dir.  These paths are passed
@@ -268,15 +316,45 @@ def set_PATH_and_PYTHONPATH( rundir, rtconfig ):
     """
     configdirs = rtconfig.getAttr( 'configdir' )
     vdir = rtconfig.getAttr( 'vvtestdir' )
-    os.environ['PYTHONPATH'] = determine_PYTHONPATH( rundir, configdirs, vdir )
-    os.environ['PATH'] = determine_PATH( rundir, configdirs )
+    environ['PYTHONPATH'] = determine_PYTHONPATH( rundir, configdirs, vdir, environ )
+    environ['PATH'] = determine_PATH( rundir, configdirs, environ )
+
+
+def call_with_environ( environ, func, *args ):
+    """
+    Calls the function with os.environ set to the 'environ' dict, and any
+    changes the function makes to os.environ are recorded back in 'environ'.
+    The original os.environ is restored before returning.
+    """
+    save = dict( os.environ )
+    try:
+        reset_os_environ( environ )
+        return func( *args )
+    finally:
+        environ.clear()
+        environ.update( os.environ )
+        reset_os_environ( save )
+
+
+def reset_os_environ( environ ):
+    ""
+    for k in list( os.environ.keys() ):
+        if k not in environ:
+            del os.environ[k]
 
+    for k,v in environ.items():
+        if os.environ.get( k, None ) != v:
+            os.environ[k] = v
 
-def determine_PYTHONPATH( rundir, configdirs, vdir ):
+
+def determine_PYTHONPATH( rundir, configdirs, vdir, environ=None ):
     """
     Add an empty directory, the test execute directory, and the config
     directories to PYTHONPATH.
     """
+    if environ is None:
+        environ = os.environ
+
     val = ':'+rundir
 
     for cfgd in configdirs:
@@ -286,32 +364,35 @@ def determine_PYTHONPATH( rundir, configdirs, vdir ):
     if ':' not in vdir:
         val += ':'+vdir
 
-    if 'PYTHONPATH' in os.environ:
-        val += ':'+os.environ['PYTHONPATH']
+    if 'PYTHONPATH' in environ:
+        val += ':'+environ['PYTHONPATH']
 
     return val
 
 
-def determine_PATH( rundir, configdirs ):
+def determine_PATH( rundir, configdirs, environ=None ):
     """
     Add the test execute directory, and the config directories to the PATH.
     """
+    if environ is None:
+        environ = os.environ
+
     val = rundir
 
     for cfgd in configdirs:
         if ':' not in cfgd:
             val += ':'+cfgd
 
-    if 'PATH' in os.environ:
-        val += ':'+os.environ['PATH']
+    if 'PATH' in environ:
+        val += ':'+environ['PATH']
 
     return val
 
 
-def echo_test_execution_info( testname, cmd_list, timeout ):
+def echo_test_execution_info( testname, cmd_list, timeout, rundir=None ):
     ""
     print( "Starting test: {0}".format(testname) )
-    print( "Directory    : {0}".format(os.getcwd()) )
+    print( "Directory    : {0}".format(os.path.abspath(rundir or os.getcwd())) )
 
     if cmd_list != None:
         cmd = ' '.join( [ quote(arg) for arg in cmd_list ] )
@@ -322,16 +403,65 @@ def echo_test_execution_info( testname, cmd_list, timeout ):
     print('')
 
 
-def pre_clean_execute_directory():
+def setup_test_process( setup, rundir, cmd_list, environ ):
+    """
+    Called by the process that runs the test, in the directory 'rundir', just
+    before the command is executed.  Prepares the execution directory, calls
+    the user plugin preload function (which may modify 'environ'), and writes
+    the test information to stdout.  Returns the command to execute.
+    """
+    setup_execute_directory( setup, rundir )
+
+    preload = setup.get( 'preload', None )
+    if preload is not None:
+        prog = call_with_environ( environ, call_preload_request, preload )
+        if prog:
+            cmd_list = make_program_command( prog, setup['arguments'] )
+
+    echo_test_execution_info( setup['name'], cmd_list, setup['timeout'], rundir )
+    print('')
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    return cmd_list
+
+
+def setup_execute_directory( setup, rundir ):
+    """
+    Prepares the test execution directory as described by the 'setup' dict
+    from ExecutionHandler.make_test_setup(): removes old files, writes
+    the MPI machine file, and soft links and copies the working files.
+    Raises an exception if a working file could not be linked or copied.
+    """
+    if setup.get( 'preclean', False ):
+        print( "Cleaning execute directory for execution..." )
+        pre_clean_execute_directory( rundir )
+
+    mfile = setup.get( 'machinefile', None )
+    if mfile is not None:
+        with open( pjoin( rundir, 'machinefile' ), 'w' ) as fp:
+            fp.write( mfile )
+
+    if 'srcdir' in setup:
+        print( "Linking and copying working files..." )
+        if not link_and_copy_files( setup['srcdir'], setup['links'],
+                                    setup['copies'], rundir ):
+            sys.stdout.flush()
+            sys.stderr.flush()
+            raise Exception( 'failed to setup working files' )
+
+
+def pre_clean_execute_directory( rundir='.' ):
     ""
     excludes = [ 'execute.log',
                  'baseline.log',
                  'vvtest_util.py',
                  'vvtest_util.sh' ]
 
-    for fn in os.listdir('.'):
+    for fn in os.listdir( rundir ):
         if fn not in excludes and not fnmatch.fnmatch( fn, 'execute_*.log' ):
-            remove_path( fn )
+            remove_path( pjoin( rundir, fn ) )
 
 
 def post_clean_execute_directory( rundir ):
@@ -350,7 +480,7 @@ def post_clean_execute_directory( rundir ):
                 remove_path( fullpath )
 
 
-def link_and_copy_files( srcdir, linkfiles, copyfiles ):
+def link_and_copy_files( srcdir, linkfiles, copyfiles, destdir=None ):
     ""
     ok = True
 
@@ -361,11 +491,11 @@ def link_and_copy_files( srcdir, linkfiles, copyfiles ):
         else:
             srcf = normpath( pjoin( srcdir, srcname ) )
 
-        srcL = get_source_file_names( srcf )
+        srcL = get_source_file_names( srcf, destdir )
 
         if check_source_file_list( 'soft link', srcf, srcL, destname ):
             for srcf in srcL:
-                force_link_path_to_current_directory( srcf, destname )
+                force_link_path_to_current_directory( srcf, destname, destdir )
         else:
             ok = False
 
@@ -376,11 +506,11 @@ def link_and_copy_files( srcdir, linkfiles, copyfiles ):
         else:
             srcf = normpath( pjoin( srcdir, srcname ) )
 
-        srcL = get_source_file_names( srcf )
+        srcL = get_source_file_names( srcf, destdir )
 
         if check_source_file_list( 'copy', srcf, srcL, destname ):
             for srcf in srcL:
-                force_copy_path_to_current_directory( srcf, destname )
+                force_copy_path_to_current_directory( srcf, destname, destdir )
         else:
             ok = False
 
@@ -405,8 +535,15 @@ def check_source_file_list( operation_type, srcf, srcL, destname ):
     return ok
 
 
-def get_source_file_names( srcname ):
-    ""
+def get_source_file_names( srcname, basedir=None ):
+    """
+    A relative 'srcname' is relative to 'basedir', if given, and the
+    returned names are too.
+    """
+    if basedir and not os.path.isabs( srcname ):
+        fL = get_source_file_names( pjoin( basedir, srcname ) )
+        return [ os.path.relpath( fn, basedir ) for fn in fL ]
+
     files = []
 
     if os.path.exists( srcname ):
@@ -417,40 +554,57 @@ def get_source_file_names( srcname ):
     return files
 
 
-def force_link_path_to_current_directory( srcf, destname ):
-    ""
-    if destname == None:
-        tstf = os.path.basename( srcf )
-    else:
-        tstf = destname
+def force_link_path_to_current_directory( srcf, destname, destdir=None ):
+    """
+    The link is made in 'destdir', which defaults to the current directory.
+    """
+    name,tstf = destination_path( srcf, destname, destdir )
 
     if os.path.islink( tstf ):
         lf = os.readlink( tstf )
         if lf != srcf:
             os.remove( tstf )
-            print( 'ln -s {0} {1}'.format(srcf, tstf) )
+            print( 'ln -s {0} {1}'.format(srcf, name) )
             os.symlink( srcf, tstf )
     else:
         remove_path( tstf )
-        print( 'ln -s {0} {1}'.format(srcf, tstf) )
+        print( 'ln -s {0} {1}'.format(srcf, name) )
         os.symlink( srcf, tstf )
 
 
-def force_copy_path_to_current_directory( srcf, destname ):
-    ""
-    if destname == None:
-        tstf = os.path.basename( srcf )
-    else:
-        tstf = destname
+def force_copy_path_to_current_directory( srcf, destname, destdir=None ):
+    """
+    The copy is made in 'destdir', which defaults to the current directory.
+    """
+    name,tstf = destination_path( srcf, destname, destdir )
 
     remove_path( tstf )
 
-    if os.path.isdir( srcf ):
-        print( 'cp -rp {0} {1}'.format(srcf, tstf) )
-        shutil.copytree( srcf, tstf, symlinks=True )
+    srcpath = srcf
+    if destdir and not os.path.isabs( srcf ):
+        srcpath = pjoin( destdir, srcf )
+
+    if os.path.isdir( srcpath ):
+        print( 'cp -rp {0} {1}'.format(srcf, name) )
+        shutil.copytree( srcpath, tstf, symlinks=True )
     else:
-        print( 'cp -rp {0} {1}'.format(srcf, tstf) )
-        shutil.copy2( srcf, tstf )
+        print( 'cp -rp {0} {1}'.format(srcf, name) )
+        shutil.copy2( srcpath, tstf )
+
+
+def destination_path( srcf, destname, destdir ):
+    """
+    Returns the destination file name and its path in 'destdir'.
+    """
+    if destname == None:
+        name = os.path.basename( srcf )
+    else:
+        name = destname
+
+    if destdir:
+        return name, pjoin( destdir, name )
+
+    return name, name
 
 
 def remove_path( path ):
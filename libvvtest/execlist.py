@@ -5,36 +5,61 @@
 # Government retains certain rights in this software.
 
 import os, sys
+import time
 
 from .testexec import TestExec
-from .backlog import TestBacklog
+from .backlog import TestBacklog, fits_within, add_sizes, subtract_sizes
 
 
 class TestExecList:
 
-    def __init__(self, tlist, handler):
-        ""
+    def __init__(self, tlist, handler, schedule=None, backfill=False):
+        """
+        The 'schedule' is the policy used to choose the next test to run:
+
+            size          : (the default) largest number of processors first,
+                            then longest runtime
+            critical-path : longest runtime of the test plus the tests that
+                            depend on it (recursively) first
+
+        If 'backfill' is True, a test that does not fit in the free resources
+        gets a reservation rather than being passed over by smaller tests.
+        """
         self.tlist = tlist
         self.handler = handler
+        self.schedule = schedule
+        self.backfill = backfill
 
-        self.backlog = TestBacklog()
+        self.backlog = TestBacklog()  # tests ready to run
         self.started = {}  # TestSpec ID -> TestExec object
         self.stopped = {}  # TestSpec ID -> TestExec object
 
+        # tests whose dependencies are not yet resolved are held here rather
+        # than in the backlog; when every test they depend on is done (or
+        # will never run), they are moved to the backlog or to self.blocked
+        self.unresolved = set()  # IDs of tests not done and not blocked
+        self.waiting = {}     # TestSpec ID -> TestCase
+        self.sortkeys = {}    # TestSpec ID -> backlog sort key
+        self.runtimes = {}    # TestSpec ID -> previous runtime (or zero)
+        self.pathlen = {}     # TestSpec ID -> critical path runtime
+        self.numblocking = {} # TestSpec ID -> num unresolved dependencies
+        self.dependents = {}  # TestSpec ID -> list of waiting TestCase
+        self.blocked = []     # tests that will never run
+
         self._prepare_test_backlog()
 
     def createExecutionDirectories(self):
         """
         Creates the execution directory for each test to be run.
         """
-        for tcase in self.backlog.iterate():
+        for tcase in self._iterate_tests():
             self.handler.create_execution_directory( tcase )
 
     def getExecutionHandler(self):
         ""
         return self.handler
 
-    def popNext(self, maxsize):
+    def popNext(self, maxsize, now=None):
         """
         Finds a test to execute.  Returns a TestExec object, or None if no
         test can run.  In this latter case, one of the following is true
@@ -44,9 +69,16 @@ class TestExecList:
                a fail) preventing the test from running
 
         For case #2, numRunning() will be zero.
+
+        The 'now' is the current time, which defaults to time.time().  It is
+        only used when backfilling.
         """
-        # find longest runtime test with size constraint
-        tcase = self.backlog.pop_by_size( maxsize )
+        if self.backfill:
+            tcase = self._pop_with_backfill( maxsize, now )
+        else:
+            # find longest runtime test with size constraint
+            tcase = self.backlog.pop_by_size( maxsize )
+
         if tcase is None and len(self.started) == 0:
             # find longest runtime test without size constraint
             tcase = self.backlog.pop_by_size( None )
@@ -58,6 +90,7 @@ class TestExecList:
 
     def consumeBacklog(self):
         ""
+        self._return_unready_tests_to_backlog()
         for tcase in self.backlog.consume():
             texec = self._move_to_started( tcase )
             yield texec
@@ -67,6 +100,7 @@ class TestExecList:
         All remaining tests are removed from the backlog and returned as a
         list of (testexec,blocked_reason).
         """
+        self._return_unready_tests_to_backlog()
         tL = []
         for tcase in self.backlog.consume():
             tL.append( tcase )
@@ -85,6 +119,30 @@ class TestExecList:
         self.tlist.appendTestResult( tcase )
         self.started.pop( xid, None )
         self.stopped[ xid ] = texec
+        self._release_dependents( tcase )
+
+    def addTest(self, tcase):
+        """
+        Adds a test to be run, such as a retry of a test or a dynamically
+        generated test.  This can be done while other tests are running.
+        The test is also added to the test list (if not already there).
+        """
+        assert tcase.getSpec().constructionCompleted()
+
+        self.tlist.addTest( tcase )
+
+        tid = tcase.getSpec().getID()
+        self.runtimes[ tid ] = tcase.getStat().getRuntime( 0 )
+        tcase.getStat().resetResults()
+        self.waiting[ tid ] = tcase
+        self.unresolved.add( tid )
+
+        self._count_blocking_dependencies( tcase )
+        self.pathlen.pop( tid, None )
+        self.sortkeys[ tid ] = self._compute_sort_key( tcase )
+
+        if self._check_waiting( tcase ):
+            self._release_dependents( tcase )
 
     def numDone(self):
         """
@@ -109,16 +167,221 @@ class TestExecList:
 
         return texec
 
+    def _pop_with_backfill(self, maxsize, now):
+        """
+        This is EASY backfilling.  If the first test in the backlog does not
+        fit, it gets a reservation at the time enough resources are predicted
+        to be free.  Until then, other tests are started only if they are
+        predicted to finish before the reservation time, or if they fit in
+        the resources the reserved test will not need.
+        """
+        head = self.backlog.peek()
+        if head is None or fits_within( head.getScheduleSize(), maxsize ):
+            return self.backlog.pop_by_size( maxsize )
+
+        if now is None:
+            now = time.time()
+
+        shadow,extra = self._compute_reservation( head.getScheduleSize(),
+                                                  maxsize, now )
+
+        def finishes_in_time( tcase ):
+            if fits_within( tcase.getScheduleSize(), extra ):
+                return True
+            return now + self._predict_runtime( tcase ) <= shadow
+
+        return self.backlog.pop_by_size( maxsize, accept=finishes_in_time )
+
+    def _compute_reservation(self, size, maxsize, now):
+        """
+        Returns the earliest time that a test of the given size can start,
+        based on the predicted end times of the running tests, and the size
+        left over at that time once the test is started.
+        """
+        endL = []
+        for texec in self.started.values():
+            tcase = texec.getTestCase()
+            start = tcase.getStat().getStartDate( now )
+            # a test running over its prediction could end any moment
+            end = max( now, start + self._predict_runtime( tcase ) )
+            endL.append( ( end, tcase.getScheduleSize() ) )
+        endL.sort( key=lambda end_size: end_size[0] )
+
+        shadow = now
+        free = maxsize
+        for end,tsize in endL:
+            # tests ending at the same time all add to the leftover size
+            if end > shadow and fits_within( size, free ):
+                break
+            shadow = end
+            free = add_sizes( free, tsize )
+
+        return shadow, subtract_sizes( free, size )
+
+    def _predict_runtime(self, tcase):
+        """
+        The runtime from a previous run (as loaded by the TimeHandler), or the
+        test timeout if there is no previous runtime.  If neither is known,
+        the runtime is taken to be infinite.
+        """
+        rt = self.runtimes.get( tcase.getSpec().getID(), 0 )
+        if rt > 0:
+            return rt
+
+        tmo = tcase.getStat().getTimeoutValue( None )
+        if tmo is not None and tmo > 0:
+            return tmo
+
+        return float( 'inf' )
+
     def _prepare_test_backlog(self):
         ""
         tL = self.tlist.getActiveTests()
+
         for tcase in tL:
             assert tcase.getSpec().constructionCompleted()
-            self.backlog.insert( tcase )
+            tid = tcase.getSpec().getID()
+            # the sort key uses the runtime, so get it before the reset
+            self.runtimes[ tid ] = tcase.getStat().getRuntime( 0 )
+            tcase.getStat().resetResults()
+            self.waiting[ tid ] = tcase
+            self.unresolved.add( tid )
 
-        # sort by runtime, descending order so that popNext() will try to avoid
-        # launching long running tests at the end of the testing sequence
-        self.backlog.sort()
+        for tcase in tL:
+            self._count_blocking_dependencies( tcase )
 
+        # by default, the backlog pops by size and runtime, descending order,
+        # so that popNext() will try to avoid launching long running tests at
+        # the end of the testing sequence
         for tcase in tL:
-            tcase.getStat().resetResults()
+            tid = tcase.getSpec().getID()
+            self.sortkeys[ tid ] = self._compute_sort_key( tcase )
+
+        for tcase in tL:
+            if self._check_waiting( tcase ):
+                self._release_dependents( tcase )
+
+    def _compute_sort_key(self, tcase):
+        ""
+        tid = tcase.getSpec().getID()
+        np = tcase.getSize()[0]
+
+        if self.schedule == 'critical-path':
+            pathlen = self._compute_critical_path_length( tcase )
+            return [ pathlen, np, self.runtimes[tid] ]
+
+        return [ np, self.runtimes[tid] ]
+
+    def _compute_critical_path_length(self, tcase):
+        """
+        The critical path length of a test is its runtime plus the largest
+        critical path length of the tests that depend on it.  The lengths
+        are computed depth first (without recursion) and cached.
+        """
+        tid = tcase.getSpec().getID()
+
+        visited = set()
+        stack = [ (tid,False) ]
+
+        while len( stack ) > 0:
+            xid,expanded = stack.pop()
+
+            if expanded:
+                maxlen = 0
+                for deptcase in self.dependents.get( xid, [] ):
+                    depid = deptcase.getSpec().getID()
+                    # a dependency cycle results in a missing length
+                    maxlen = max( maxlen, self.pathlen.get( depid, 0 ) )
+                self.pathlen[ xid ] = self.runtimes.get( xid, 0 ) + maxlen
+
+            elif xid not in self.pathlen and xid not in visited:
+                visited.add( xid )
+                stack.append( (xid,True) )
+                for deptcase in self.dependents.get( xid, [] ):
+                    stack.append( (deptcase.getSpec().getID(),False) )
+
+        return self.pathlen[ tid ]
+
+    def _count_blocking_dependencies(self, tcase):
+        """
+        Only dependencies on tests that will be run by this object can change
+        state, so those are the only ones counted.  The others are done or
+        skipped, and are accounted for when the count reaches zero.
+        """
+        tid = tcase.getSpec().getID()
+
+        num = 0
+        for dep in tcase.getDependencies():
+            depid = dep.getTestID()
+            if depid != tid and depid in self.unresolved:
+                self.dependents.setdefault( depid, [] ).append( tcase )
+                num += 1
+
+        self.numblocking[ tid ] = num
+
+    def _check_waiting(self, tcase):
+        """
+        If all of the dependencies of the given waiting test are resolved, it
+        is moved to the backlog (or to the blocked list if a dependency
+        result prevents it from running).  A test that can never run is moved
+        to the blocked list immediately.
+
+        Returns True if the test was moved to the blocked list, in which case
+        its dependents must be released.
+        """
+        tid = tcase.getSpec().getID()
+
+        if tid in self.waiting:
+            if self.numblocking[ tid ] == 0:
+                self.waiting.pop( tid )
+                if tcase.isBlocked():
+                    self.blocked.append( tcase )
+                    return True
+                else:
+                    self.backlog.insert( tcase, self.sortkeys[tid] )
+
+            elif tcase.willNeverRun():
+                self.waiting.pop( tid )
+                self.blocked.append( tcase )
+                return True
+
+        return False
+
+    def _release_dependents(self, tcase):
+        """
+        Called when the given test is done or will never run.  The
+        dependents of tests that become blocked are released in turn.
+        """
+        stack = [ tcase ]
+        while len( stack ) > 0:
+            tid = stack.pop().getSpec().getID()
+            self.unresolved.discard( tid )
+            for deptcase in self.dependents.pop( tid, [] ):
+                depid = deptcase.getSpec().getID()
+                self.numblocking[ depid ] -= 1
+                if self._check_waiting( deptcase ):
+                    stack.append( deptcase )
+
+    def _return_unready_tests_to_backlog(self):
+        ""
+        if len( self.waiting ) > 0 or len( self.blocked ) > 0:
+
+            for tid,tcase in self.waiting.items():
+                self.backlog.insert( tcase, self.sortkeys[tid] )
+            for tcase in self.blocked:
+                tid = tcase.getSpec().getID()
+                self.backlog.insert( tcase, self.sortkeys[tid] )
+
+            self.waiting.clear()
+            self.unresolved.clear()
+            self.dependents.clear()
+            self.blocked = []
+
+    def _iterate_tests(self):
+        ""
+        for tcase in self.backlog.iterate():
+            yield tcase
+        for tcase in self.waiting.values():
+            yield tcase
+        for tcase in self.blocked:
+            yield tcase
@@ -10,6 +10,15 @@ import time
 from . import logger
 from . import utesthooks
 from .printinfo import DirectInfoPrinter, BatchInfoPrinter
+from .printinfo import standard_in_select_list
+from .childwait import ChildExitWaiter
+from .launcher import TestLauncher
+from .loadadapt import LoadAdaptiveLimit
+
+
+# the longest time the direct runner waits between checks for user input,
+# results writer updates, and so on, when no test finishes or times out
+max_wait_between_checks = 5
 
 
 class TestListRunner:
@@ -60,7 +69,7 @@ class BatchRunner( TestListRunner ):
 
         self.plat.display()
 
-        self.tlist.setResultsDate()
+        self.tlist.setResultsDate( unique=True )
 
         self.batch.clearBatchDirectories()
         self.batch.constructBatchJobs()
@@ -133,25 +142,44 @@ class DirectRunner( TestListRunner ):
         self.batch_id = None
         self.handler = xlist.getExecutionHandler()
         self.info = DirectInfoPrinter( test_dir, xlist, tlist.numActive() )
+        self.waiter = ChildExitWaiter()
+        self.launcher = None
+        self.loadlimit = None
 
     def setBatchID(self, batch_id):
         ""
         self.batch_id = batch_id
 
+    def setLoadAdaptive(self, minprocs):
+        """
+        Vary the number of cores used between 'minprocs' and the platform
+        size (-n) according to the load on the machine.
+        """
+        np = self.plat.getSize()[0]
+        if np:
+            self.loadlimit = LoadAdaptiveLimit( minprocs, np )
+
     def startup(self):
         ""
         self.setup()
         self.plat.display()
 
+        if self.handler.forkok:
+            self.launcher = TestLauncher()
+            self.launcher.start()
+
     def run(self):
         ""
         self.startup()
 
         uthook = utesthooks.construct_unit_testing_hook( 'run', self.batch_id )
 
+        self.waiter.start()
         try:
             while True:
 
+                self.check_machine_load()
+
                 tnext = self.xlist.popNext( self.plat.sizeAvailable() )
 
                 if tnext is not None:
@@ -160,7 +188,7 @@ class DirectRunner( TestListRunner ):
                     break
                 else:
                     self.info.checkPrint()
-                    time.sleep(1)
+                    self.wait_for_next_event()
 
                 doneL = self.process_finished()
 
@@ -178,6 +206,9 @@ class DirectRunner( TestListRunner ):
             nrL = self.xlist.popRemaining()  # these tests cannot be run
 
         finally:
+            self.waiter.stop()
+            if self.launcher is not None:
+                self.launcher.shutdown()
             finish_time = time.time()
             rtn = encode_integer_warning( self.tlist )
             self.tlist.writeFinished( finish_time, rtn )
@@ -190,9 +221,42 @@ class DirectRunner( TestListRunner ):
         ""
         tcase = texec.getTestCase()
         self.info.printStarting( tcase )
-        start_test( self.handler, texec, self.plat )
+        start_test( self.handler, texec, self.plat, launcher=self.launcher )
         self.tlist.appendTestResult( tcase )
 
+    def check_machine_load(self):
+        ""
+        if self.loadlimit is not None:
+            nuse = 0
+            for texec in self.xlist.getRunning():
+                nuse += len( texec.getResourceObject().procs )
+            self.plat.setProcessorLimit( self.loadlimit.update( nuse ) )
+
+    def wait_for_next_event(self):
+        """
+        Blocks until a running test exits, the next test timeout is reached,
+        the total timeout expires, or the user hits enter.
+        """
+        now = time.time()
+        deadline = now + max_wait_between_checks
+
+        for texec in self.xlist.getRunning():
+            tm = texec.getNextDeadline()
+            if tm is not None:
+                deadline = min( deadline, tm )
+
+        if self.total_timeout and self.total_timeout > 0:
+            deadline = min( deadline, self.starttime + self.total_timeout )
+
+        # add a little so the timeout checks see the deadline as passed
+        timeout = max( 0, deadline - now ) + 0.01
+
+        waitL = standard_in_select_list()
+        if self.launcher is not None:
+            waitL.append( self.launcher.getReplyFileDescriptor() )
+
+        self.waiter.wait( timeout, waitL )
+
     def process_finished(self):
         ""
         doneL = []  # TestCase objects
@@ -214,59 +278,92 @@ def run_baseline( xlist, plat ):
 
     handler = xlist.getExecutionHandler()
 
-    for texec in xlist.consumeBacklog():
+    launcher = None
+    if handler.forkok:
+        launcher = TestLauncher()
+        launcher.start()
+
+    waiter = ChildExitWaiter()
+    waiter.start()
+    try:
+        for texec in xlist.consumeBacklog():
+            if not baseline_test( handler, texec, plat, waiter, launcher ):
+                failures = True
+    finally:
+        waiter.stop()
+        if launcher is not None:
+            launcher.shutdown()
 
-        tcase = texec.getTestCase()
-        tspec = tcase.getSpec()
-        tstat = tcase.getStat()
+    if failures:
+        logger.warn( "\n\n !!!!!!!!!!!  THERE WERE FAILURES  !!!!!!!!!! \n\n" )
 
-        xdir = tspec.getDisplayString()
 
-        sys.stdout.write( "baselining "+xdir+"..." )
+def baseline_test( handler, texec, plat, waiter, launcher ):
+    """
+    Runs one test in baseline mode and waits for it to finish.  Returns
+    False if the baseline failed or timed out.
+    """
+    tcase = texec.getTestCase()
+    tspec = tcase.getSpec()
+    tstat = tcase.getStat()
 
-        start_test( handler, texec, plat, is_baseline=True )
+    xdir = tspec.getDisplayString()
 
-        tm = int( os.environ.get( 'VVTEST_BASELINE_TIMEOUT', 30 ) )
-        for i in range(tm):
+    sys.stdout.write( "baselining "+xdir+"..." )
 
-            time.sleep(1)
+    start_test( handler, texec, plat, is_baseline=True, launcher=launcher )
 
-            if texec.poll():
-                handler.finishExecution( texec )
+    tm = int( os.environ.get( 'VVTEST_BASELINE_TIMEOUT', 30 ) )
+    deadline = time.time() + tm
 
-            if texec.isDone():
-                if tstat.passed():
-                    logger.info("done")
-                else:
-                    failures = True
-                    logger.info("FAILED")
-                break
+    while True:
 
-        if not tstat.isDone():
-            if texec.killJob():
-                handler.finishExecution( texec )
-            failures = True
-            logger.info("TIMED OUT")
+        if texec.poll():
+            handler.finishExecution( texec )
 
-    if failures:
-        logger.warn( "\n\n !!!!!!!!!!!  THERE WERE FAILURES  !!!!!!!!!! \n\n" )
+        if texec.isDone():
+            if tstat.passed():
+                logger.info("done")
+                return True
+            else:
+                logger.info("FAILED")
+                return False
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+
+        waitL = []
+        if launcher is not None:
+            waitL.append( launcher.getReplyFileDescriptor() )
+
+        waiter.wait( min( remaining, max_wait_between_checks ), waitL )
 
+    if texec.killJob():
+        handler.finishExecution( texec )
+    logger.info("TIMED OUT")
 
-def start_test( handler, texec, platform, is_baseline=False ):
+    return False
+
+
+def start_test( handler, texec, platform, is_baseline=False, launcher=None ):
     ""
     tcase = texec.getTestCase()
 
-    obj = platform.getResources( tcase.getSize() )
+    obj = platform.getResources( tcase.getScheduleSize() )
 
     texec.setResourceObject( obj )
 
+    if handler.rtconfig.getAttr( 'bindcores' ):
+        texec.setAffinity( platform.getProcessorCPUs( obj.procs ) )
+
     logfile = None
     if handler.rtconfig.getAttr('logfile'):
         logfile = tcase.getSpec().getLogFilename( is_baseline )
 
     texec.start( handler.prepare_for_launch,
                  logfile, is_baseline, handler.perms,
-                 fork_supported=handler.forkok )
+                 launcher=launcher )
 
     tcase.getStat().markStarted( texec.getStartTime() )
 
@@ -0,0 +1,557 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import subprocess
+import signal
+import select
+import struct
+import errno
+import time
+import traceback
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .childwait import ChildExitWaiter, select_ignoring_interrupt
+from .childwait import set_nonblocking_close_on_exec, set_close_on_exec
+from .exechandler import setup_test_process
+from .userplugin import load_plugin_file
+
+
+class TestLauncher:
+    """
+    Starts a small launcher process and asks it to spawn test processes.
+
+    Forking the vvtest process itself gets slow when it holds a large test
+    list, and the copy-on-write pages count against the memory of shared
+    nodes.  The launcher is a fresh Python interpreter started once, which
+    receives launch requests (command, directory, environment, resource
+    limits, log file) over a pipe and forks itself for each test.  Exit
+    statuses and resource usage of the tests are sent back over a second
+    pipe.
+    """
+
+    def __init__(self):
+        ""
+        self.proc = None
+        self.reqfd = None
+        self.repfd = None
+        self.reader = None
+        self.exits = {}  # pid -> exit status
+        self.usages = {}  # pid -> resource usage dict
+
+    def start(self):
+        """
+        Starts the launcher process and waits until it is ready to take
+        launch requests, so its startup time is not part of the first test.
+        """
+        req_r,req_w = os.pipe()
+        rep_r,rep_w = os.pipe()
+
+        vdir = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+        code = 'import sys; sys.path.insert( 0, sys.argv[1] ); ' + \
+               'from libvvtest.launcher import serve; ' + \
+               'serve( int(sys.argv[2]), int(sys.argv[3]) )'
+        cmd = [ sys.executable, '-c', code, vdir, str(req_r), str(rep_w) ]
+
+        # only the launcher ends of the pipes are passed to the launcher
+        set_close_on_exec( req_w )
+        set_close_on_exec( rep_r )
+
+        if sys.version_info[0] < 3:
+            self.proc = subprocess.Popen( cmd, close_fds=False )
+        else:
+            self.proc = subprocess.Popen( cmd, pass_fds=(req_r,rep_w) )
+
+        os.close( req_r )
+        os.close( rep_w )
+
+        set_nonblocking_close_on_exec( rep_r )
+        self.reqfd = req_w
+        self.repfd = rep_r
+        self.reader = MessageReader( rep_r )
+
+        while True:
+            for msg in self._read_messages( block=True ):
+                if msg[0] == 'ready':
+                    return
+
+    def shutdown(self):
+        """
+        Closing the request pipe makes the launcher exit once the tests it
+        started have finished.
+        """
+        if self.reqfd is not None:
+            os.close( self.reqfd )
+            self.reqfd = None
+
+            # give it a moment, but do not hang on tests that are still running
+            for i in range(20):
+                if self.proc.poll() is not None:
+                    break
+                time.sleep( 0.05 )
+
+    def getReplyFileDescriptor(self):
+        """
+        Becomes readable when the launcher reports that a test exited.
+        """
+        return self.repfd
+
+    def launch(self, cmd_list, cwd, environ, logfile=None, rlimits=None,
+                     affinity=None, setup=None):
+        """
+        Spawns 'cmd_list' in the directory 'cwd' with the environment dict
+        'environ'.  Output goes to 'logfile' (appended) or to the standard
+        out of vvtest.  The 'rlimits' is a dict mapping names of the
+        'resource' module limits, such as 'RLIMIT_CORE', to (soft,hard).
+        The 'affinity' is a list of CPU ids to bind the test to.  The 'setup'
+        is a dict given to exechandler.setup_test_process() by the new
+        process before it runs the command.  Returns the process id.
+        """
+        if logfile:
+            logfile = os.path.abspath( logfile )
+
+        req = { 'cmd':cmd_list,
+                'cwd':os.path.abspath( cwd ),
+                'env':environ,
+                'logfile':logfile,
+                'rlimits':rlimits,
+                'affinity':affinity,
+                'setup':setup }
+
+        write_message( self.reqfd, req )
+
+        while True:
+            for msg in self._read_messages( block=True ):
+                if msg[0] == 'started':
+                    return msg[1]
+                elif msg[0] == 'error':
+                    raise Exception( 'test launch failed: '+msg[1] )
+
+    def checkExit(self, pid):
+        """
+        Returns the exit status (as from os.waitpid) if the given process
+        has exited, otherwise None.
+        """
+        if pid not in self.exits:
+            self._read_messages( block=False )
+
+        return self.exits.pop( pid, None )
+
+    def getResourceUsage(self, pid):
+        """
+        Returns the resource usage of an exited process as a dict (see
+        rusage_to_dict), or None if it is not available.
+        """
+        return self.usages.pop( pid, None )
+
+    def _read_messages(self, block):
+        ""
+        if block:
+            select_ignoring_interrupt( [self.repfd], None )
+
+        msgL = []
+        for msg in self.reader.read():
+            if msg[0] == 'exited':
+                self.exits[ msg[1] ] = msg[2]
+                if msg[3] is not None:
+                    self.usages[ msg[1] ] = msg[3]
+            else:
+                msgL.append( msg )
+
+        if self.reader.isClosed() and block and len( msgL ) == 0:
+            raise Exception( 'the test launcher process died' )
+
+        return msgL
+
+
+class MessageReader:
+    """
+    Reads length prefixed, pickled messages from a non-blocking file
+    descriptor.
+    """
+
+    def __init__(self, fd):
+        ""
+        self.fd = fd
+        self.buf = b''
+        self.closed = False
+
+    def isClosed(self):
+        ""
+        return self.closed
+
+    def read(self):
+        """
+        Returns a list of the complete messages currently available.
+        """
+        while True:
+            try:
+                data = os.read( self.fd, 65536 )
+            except OSError:
+                if sys.exc_info()[1].errno in [ errno.EAGAIN, errno.EINTR ]:
+                    break
+                raise
+            if not data:
+                self.closed = True
+                break
+            self.buf += data
+
+        msgL = []
+        while len( self.buf ) >= 4:
+            sz = struct.unpack( '!I', self.buf[:4] )[0]
+            if len( self.buf ) < 4+sz:
+                break
+            msgL.append( pickle.loads( self.buf[4:4+sz] ) )
+            self.buf = self.buf[4+sz:]
+
+        return msgL
+
+
+def write_message( fd, obj ):
+    ""
+    data = pickle.dumps( obj, 2 )
+    data = struct.pack( '!I', len(data) ) + data
+
+    while data:
+        try:
+            n = os.write( fd, data )
+        except OSError:
+            if sys.exc_info()[1].errno in [ errno.EAGAIN, errno.EINTR ]:
+                select_writable( fd )
+                continue
+            raise
+        data = data[n:]
+
+
+def select_writable( fd ):
+    ""
+    try:
+        select.select( [], [fd], [] )
+    except (select.error, OSError, IOError):
+        if sys.exc_info()[1].args[0] != errno.EINTR:
+            raise
+
+
+def serve( request_fd, reply_fd ):
+    """
+    The main loop of the launcher process.  Runs until the request pipe is
+    closed and all the tests it started have exited.
+    """
+    # tests are interrupted by vvtest, and the launcher must keep running to
+    # report their exit statuses
+    signal.signal( signal.SIGINT, signal.SIG_IGN )
+
+    set_nonblocking_close_on_exec( request_fd )
+    set_nonblocking_close_on_exec( reply_fd )
+
+    waiter = ChildExitWaiter()
+    waiter.start()
+
+    reader = MessageReader( request_fd )
+    running = set()
+
+    send_reply( reply_fd, ( 'ready', ) )
+
+    while not reader.isClosed() or len( running ) > 0:
+
+        if reader.isClosed():
+            waiter.wait( None )
+        else:
+            waiter.wait( None, [request_fd] )
+
+        reap_children( running, reply_fd )
+
+        if not reader.isClosed():
+            for req in reader.read():
+                try:
+                    pid = spawn_test( req, [request_fd, reply_fd], waiter )
+                except Exception:
+                    send_reply( reply_fd, ( 'error', str(sys.exc_info()[1]) ) )
+                else:
+                    running.add( pid )
+                    send_reply( reply_fd, ( 'started', pid ) )
+
+            if reader.isClosed():
+                # vvtest is finishing; do not hold its output streams open
+                # while waiting on tests that are still running
+                detach_standard_streams()
+
+    waiter.stop()
+
+
+def detach_standard_streams():
+    ""
+    sys.stdout.flush() ; sys.stderr.flush()
+
+    fd = os.open( os.devnull, os.O_RDWR )
+    for i in [0,1,2]:
+        os.dup2( fd, i )
+    os.close( fd )
+
+
+def reap_children( running, reply_fd ):
+    ""
+    while len( running ) > 0:
+        try:
+            pid,code,usage = wait_for_any_child()
+        except OSError:
+            if sys.exc_info()[1].errno == errno.EINTR:
+                continue
+            raise
+        if pid == 0:
+            break
+        running.discard( pid )
+        send_reply( reply_fd, ( 'exited', pid, code, usage ) )
+
+
+def wait_for_any_child():
+    """
+    Reaps an exited child process without blocking.  Returns the process id
+    (zero if no child has exited), the exit status, and the resource usage
+    dict (or None if os.wait4 is not available).
+    """
+    if hasattr( os, 'wait4' ):
+        pid,code,ru = os.wait4( -1, os.WNOHANG )
+        if pid != 0:
+            return pid, code, rusage_to_dict( ru )
+        return pid, code, None
+
+    pid,code = os.waitpid( -1, os.WNOHANG )
+    return pid, code, None
+
+
+def rusage_to_dict( ru ):
+    """
+    Converts a resource.struct_rusage to a dict with user and system time in
+    seconds, the max resident set size in kilobytes, the number of block
+    input and output operations, and the number of voluntary and
+    involuntary context switches.
+    """
+    maxrss = ru.ru_maxrss
+    if sys.platform.startswith( 'darwin' ):
+        # reported in bytes on Mac
+        maxrss = maxrss//1024
+
+    return { 'utime'   : round( ru.ru_utime, 3 ),
+             'stime'   : round( ru.ru_stime, 3 ),
+             'maxrss'  : int( maxrss ),
+             'inblock' : int( ru.ru_inblock ),
+             'oublock' : int( ru.ru_oublock ),
+             'nvcsw'   : int( ru.ru_nvcsw ),
+             'nivcsw'  : int( ru.ru_nivcsw ) }
+
+
+def send_reply( reply_fd, msg ):
+    ""
+    try:
+        write_message( reply_fd, msg )
+    except OSError:
+        # vvtest has exited, so there is no one to tell
+        if sys.exc_info()[1].errno != errno.EPIPE:
+            raise
+
+
+def spawn_test( req, close_fds, waiter ):
+    ""
+    import_preload_plugin( req )
+
+    pid = os_fork_with_retry( 10 )
+
+    if pid == 0:
+        # this is the new child process
+        try:
+            waiter.stop()
+            for fd in close_fds:
+                os.close( fd )
+
+            signal.signal( signal.SIGINT, signal.default_int_handler )
+
+            if req['logfile']:
+                logfp = open( req['logfile'], 'a' )
+                redirect_stdout_err( logfp )
+
+            os.chdir( req['cwd'] )
+
+            cmd = req['cmd']
+            if req.get( 'setup', None ):
+                cmd = setup_test_process( req['setup'], req['cwd'],
+                                          cmd, req['env'] )
+
+            set_resource_limits( req['rlimits'] )
+            set_cpu_affinity( req['affinity'] )
+
+            x = group_exec_subprocess( cmd, env=req['env'] )
+            os._exit(x)
+
+        except:
+            sys.stdout.flush() ; sys.stderr.flush()
+            traceback.print_exc()
+            sys.stdout.flush() ; sys.stderr.flush()
+            os._exit(1)
+
+    return pid
+
+
+def import_preload_plugin( req ):
+    """
+    The user plugin is imported once in the launcher, so the test processes
+    only have to call its preload function.
+    """
+    preload = ( req.get( 'setup', None ) or {} ).get( 'preload', None )
+    if preload is not None:
+        try:
+            load_plugin_file( preload )
+        except Exception:
+            pass  # the test process imports it again and reports the error
+
+
+def set_resource_limits( rlimits ):
+    ""
+    if rlimits:
+        for name,(soft,hard) in rlimits.items():
+            resource.setrlimit( getattr( resource, name ), (soft,hard) )
+
+
+def set_cpu_affinity( cpus ):
+    """
+    Binds the current process (and the processes it starts) to the given CPU
+    ids.  Does nothing if 'cpus' is empty or the platform does not support
+    processor affinity.
+    """
+    if cpus and hasattr( os, 'sched_setaffinity' ):
+        os.sched_setaffinity( 0, cpus )
+
+
+def redirect_stdout_err( logfp ):
+    ""
+    if logfp:
+        # reassign stdout & stderr file descriptors to the log file
+        os.dup2( logfp.fileno(), sys.stdout.fileno() )
+        os.dup2( logfp.fileno(), sys.stderr.fileno() )
+
+
+def decode_subprocess_exit_code( exit_code ):
+    ""
+    if os.WIFEXITED( exit_code ):
+        return os.WEXITSTATUS( exit_code )
+
+    if os.WIFSIGNALED( exit_code ) or os.WIFSTOPPED( exit_code ):
+        return 1
+
+    if exit_code == 0:
+        return 0
+
+    return 1
+
+
+def os_fork_with_retry( numtries ):
+    ""
+    assert numtries > 0
+
+    pause = 0.5
+
+    for i in range(numtries):
+
+        try:
+            pid = os.fork()
+            break
+
+        except OSError:
+            # the BlockingIOError subclass of OSError has been seen on heavily
+            # loaded machines; given some time between retries, it will often
+            # succeed
+            if i+1 == numtries:
+                raise
+            time.sleep( pause )
+            pause *= 2
+
+    return pid
+
+
+def group_exec_subprocess( cmd, **kwargs ):
+    """
+    Run the given command in a subprocess in its own process group, then wait
+    for it.  Catch all signals and dispatch them to the child process group.
+
+    The SIGTERM and SIGHUP signals are sent to the child group, but they also
+    cause a SIGKILL to be sent after a short delay.
+
+    This function modifies the current environment by registering signal
+    handlers, so the intended use is something like this
+
+        pid = os.fork()
+        if pid == 0:
+            x = group_exec_subprocess( 'some command', shell=True )
+            os._exit(x)
+    """
+    register_signal_handlers()
+
+    terminate_delay = kwargs.pop( 'terminate_delay', 5 )
+
+    kwargs[ 'preexec_fn' ] = lambda: os.setpgid( os.getpid(), os.getpid() )
+    proc = subprocess.Popen( cmd, **kwargs )
+
+    while True:
+        try:
+            x = proc.wait()
+            break
+        except KeyboardInterrupt:
+            os.kill( -proc.pid, signal.SIGINT )
+        except SignalException:
+            e = sys.exc_info()[1]
+            os.kill( -proc.pid, e.sig )
+            if e.sig in [ signal.SIGTERM, signal.SIGHUP ]:
+                x = check_terminate_subprocess( proc, terminate_delay )
+                break
+        except:
+            os.kill( -proc.pid, signal.SIGTERM )
+
+    return x
+
+
+class SignalException( Exception ):
+    def __init__(self, signum):
+        self.sig = signum
+        Exception.__init__( self, 'Received signal '+str(signum) )
+
+def signal_handler( signum, frame ):
+    raise SignalException( signum )
+
+
+def register_signal_handlers( reset=False ):
+    ""
+    if reset:
+        handler = signal.SIG_DFL
+    else:
+        handler = signal_handler
+
+    signal.signal( signal.SIGTERM, handler )
+    signal.signal( signal.SIGABRT, handler )
+    signal.signal( signal.SIGHUP, handler )
+    signal.signal( signal.SIGALRM, handler )
+    signal.signal( signal.SIGUSR1, handler )
+    signal.signal( signal.SIGUSR2, handler )
+
+
+def check_terminate_subprocess( proc, terminate_delay ):
+    ""
+    if terminate_delay:
+        time.sleep( terminate_delay )
+
+    x = proc.poll()
+
+    os.kill( -proc.pid, signal.SIGKILL )
+
+    return x
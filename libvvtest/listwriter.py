@@ -20,6 +20,7 @@ except Exception:
 from . import logger
 from . import outpututils
 from . import pathid
+from . import runhistory
 
 
 class ListWriter:
@@ -85,6 +86,8 @@ class ListWriter:
         tofile = os.path.join( todir, fname )
         pidr = pathid.TestPathIdentification()
 
+        testinfo = []
+
         try:
             logger.info( "Writing test results to", tofile )
 
@@ -97,10 +100,38 @@ class ListWriter:
                 for tid,tcase in tests:
                     testdict = get_test_info( pidr, tcase )
                     fp.write( json.dumps(testdict)+'\n' )
+                    testinfo.append( testdict )
 
         finally:
             self.permsetter.apply( tofile )
 
+        if finished:
+            self._add_to_history( todir, fname, hdr, testinfo )
+
+    def _add_to_history(self, todir, fname, hdr, testinfo):
+        """
+        Adds the test runtimes to the history database in the results
+        directory.  Errors are only warnings.
+        """
+        if runhistory.history_available():
+
+            dbfile = os.path.join( todir, runhistory.HISTORY_FILENAME )
+
+            try:
+                hist = runhistory.RuntimeHistory( dbfile )
+                hist.open()
+                try:
+                    hist.addResults( results_file_config( self.rtinfo ),
+                                     fname, hdr['starttime'], testinfo )
+                finally:
+                    hist.close()
+                self.permsetter.apply( dbfile )
+
+            except Exception:
+                xs,tb = outpututils.capture_traceback( sys.exc_info() )
+                logger.warn( '\n'+tb+'\n\n*** error adding to runtime '
+                             'history: '+repr(dbfile) )
+
 
 def make_filename( rtinfo, datestr, ftag ):
     """
@@ -127,7 +158,7 @@ def glob_results_files( resultsdir, rtinfo ):
     Returns a list of all vvtresults files in 'resultsdir' directory matching
     the given 'rtinfo' platform and options with any date or ftag.
     """
-    pat = '.'.join( [rtinfo['platform'],]+make_option_list(rtinfo) )
+    pat = results_file_config( rtinfo )
 
     fnL = []
     for bn in os.listdir(resultsdir):
@@ -140,6 +171,14 @@ def glob_results_files( resultsdir, rtinfo ):
     return fnL
 
 
+def results_file_config( rtinfo ):
+    """
+    The platform and options part of the results file names, which is the
+    same for all the results files of a given configuration.
+    """
+    return '.'.join( [rtinfo['platform'],]+make_option_list(rtinfo) )
+
+
 def make_option_list( rti ):
     ""
     cplr = rti.get( 'compiler', None )
@@ -233,6 +272,10 @@ def get_test_info( pidr, tcase ):
     if tm is not None:
         D['startdate'] = tm
 
+    usage = stat.getResourceUsage( None )
+    if usage:
+        D['rusage'] = usage
+
     return D
 
 
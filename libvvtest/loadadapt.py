@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import time
+import math
+
+from . import logger
+from . import rprobe
+
+
+# number of seconds between samples of the machine load
+default_sample_interval = 5
+
+# CPU pressure (the percent of time some runnable task was waiting for a
+# CPU, averaged over 10 seconds) above which no more cores are handed out
+# and the limit is brought down
+pressure_high = 40.0
+
+# CPU pressure below which the limit is allowed to grow again
+pressure_low = 10.0
+
+# the time constant (seconds) of the exponential decay of the one minute
+# load average
+load_average_period = 60.0
+
+
+class LoadAdaptiveLimit:
+    """
+    Adjusts the number of cores the direct runner may occupy according to
+    the load other users put on the machine.
+
+    The load is sampled from /proc/loadavg and /proc/pressure/cpu.  The
+    limit is the number of machine cores minus the load that is not from
+    our own tests, clamped between 'minprocs' and 'maxprocs'.  Our own load
+    is the number of cores in use averaged with the same one minute decay
+    as the load average, so tests that just finished (or just started) are
+    not mistaken for other users.  High CPU pressure pulls the limit down by
+    one step, and it only grows again once the pressure is low.  Only new
+    tests are held back; running tests are never stopped.
+    """
+
+    def __init__(self, minprocs, maxprocs, numcores=None,
+                       interval=default_sample_interval,
+                       loadavg_file=None, pressure_file=None):
+        ""
+        self.minprocs = max( 1, min( minprocs, maxprocs ) )
+        self.maxprocs = maxprocs
+        self.numcores = numcores or rprobe.probe_num_processors( maxprocs )
+        self.interval = interval
+        self.loadavg_file = loadavg_file
+        self.pressure_file = pressure_file
+
+        self.step = max( 1, maxprocs//8 )
+        self.limit = maxprocs
+        self.tsample = None
+
+        self.ownload = 0.0
+        self.nuse = 0
+        self.tusage = None
+
+    def getLimit(self):
+        ""
+        return self.limit
+
+    def update(self, num_in_use, now=None):
+        """
+        Samples the machine load if the sample interval has passed, where
+        'num_in_use' is the number of cores occupied by our running tests.
+        Returns the (possibly new) limit.
+        """
+        if now is None:
+            now = time.time()
+
+        self.trackUsage( num_in_use, now )
+
+        if self.tsample is None or now - self.tsample >= self.interval:
+            self.tsample = now
+
+            load = rprobe.read_load_average( self.loadavg_file )
+            pressure = rprobe.read_cpu_pressure( self.pressure_file )
+
+            newlim = self.computeLimit( self.ownload, load, pressure )
+
+            if newlim != self.limit:
+                logger.info( 'Machine load {0}, CPU pressure {1}%: now using '
+                             '{2} cores'.format( load, pressure, newlim ) )
+                self.limit = newlim
+
+        return self.limit
+
+    def trackUsage(self, num_in_use, now):
+        """
+        Advances the moving average of the number of cores used by our tests
+        over the time since the previous call (when the number in use was
+        recorded), then records the number currently in use.
+        """
+        if self.tusage is not None and now > self.tusage:
+            decay = math.exp( -( now - self.tusage ) / load_average_period )
+            self.ownload = self.ownload*decay + self.nuse*( 1.0 - decay )
+
+        self.nuse = num_in_use
+        self.tusage = now
+
+    def computeLimit(self, own_load, load, pressure):
+        """
+        The 'own_load' is the part of the load average due to our own tests,
+        'load' is the one minute load average and 'pressure' the CPU
+        pressure percent, either of which can be None if not available.
+        """
+        lim = self.limit
+
+        if load is not None:
+            other = max( 0.0, load - own_load )
+            lim = int( self.numcores - other + 0.5 )
+        elif pressure is not None and pressure <= pressure_low:
+            lim = self.limit + self.step
+
+        if pressure is not None:
+            if pressure >= pressure_high:
+                lim = min( lim, self.limit - self.step )
+            elif pressure > pressure_low:
+                # only grow when the pressure is low
+                lim = min( lim, self.limit )
+
+        return max( self.minprocs, min( self.maxprocs, lim ) )
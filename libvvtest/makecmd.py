@@ -18,18 +18,23 @@ class MakeScriptCommand:
     """
 
     def __init__(self, loc, tspec, program=None,
-                            shbang_supported=True):
+                            shbang_supported=True,
+                            rundir=None):
         """
         The 'program' is a path to an executable to execute the test script.
         If None, then
             - if the test file is executable and shbang is supported, then
               the script is executed directly
             - otherwise, Python is used to run the script, sys.executable
+
+        The 'rundir' is the test execution directory, if it is not the
+        current working directory.
         """
         self.loc = loc
         self.tspec = tspec
         self.prog = program
         self.shbang = shbang_supported
+        self.rundir = rundir
 
     def make_base_execute_command(self, baseline):
         ""
@@ -51,7 +56,8 @@ class MakeScriptCommand:
                                           self.tspec.getRootpath() )
         fname = basename( self.tspec.getFilename() )
         cmdL = make_file_execute_command( srcdir, fname,
-                                          self.prog, self.shbang )
+                                          self.prog, self.shbang,
+                                          self.rundir )
 
         return cmdL
 
@@ -63,7 +69,8 @@ class MakeScriptCommand:
         else:
             srcdir = self.tspec.getDirectory()
             cmdL = make_file_execute_command( srcdir, spec,
-                                              self.prog, self.shbang )
+                                              self.prog, self.shbang,
+                                              self.rundir )
 
         return cmdL
 
@@ -110,13 +117,14 @@ class MakeScriptCommand:
 
 def make_file_execute_command( srcdir, path,
                                prog=None,
-                               shbang=True ):
-    ""
+                               shbang=True,
+                               rundir=None ):
+    """
+    A relative 'srcdir' is relative to the test execution directory, which
+    is 'rundir' or the current working directory if 'rundir' is None.
+    """
     if prog:
-        if os.path.splitext(prog)[1] == '.py':
-            return [ sys.executable, prog, path ]
-        else:
-            return [ prog, path ]
+        return make_program_command( prog, [ path ] )
 
     elif os.path.isabs( path ):
         if shbang and os.access( path, os.X_OK ):
@@ -126,7 +134,20 @@ def make_file_execute_command( srcdir, path,
 
     else:
         srcpath = os.path.join( srcdir, path )
+        if rundir:
+            srcpath = os.path.join( rundir, srcpath )
         if shbang and os.access( srcpath, os.X_OK ):
             return [ './'+path ]
         else:
             return [ sys.executable, path ]
+
+
+def make_program_command( prog, args ):
+    """
+    The command to run the arguments 'args' with the program 'prog', which
+    is run with Python if it is a Python file.
+    """
+    if os.path.splitext(prog)[1] == '.py':
+        return [ sys.executable, prog ] + args
+    else:
+        return [ prog ] + args
@@ -13,6 +13,36 @@ from .vvplatform import Platform
 from .importutil import import_file_from_sys_path, gather_modules_by_filename
 
 
+def consumable_resource_sizes( value ):
+    """
+    Converts a dict, or a string such as "license=2, scratch=4", to a sorted
+    tuple of (name, positive integer) pairs.
+    """
+    if isinstance( value, dict ):
+        items = list( value.items() )
+    elif isinstance( value, (tuple,list) ):
+        items = list( value )
+    else:
+        items = []
+        for spec in str(value).replace( ',', ' ' ).split():
+            nv = spec.split( '=', 1 )
+            if len(nv) != 2:
+                raise Exception( 'expected name=amount: '+repr(spec) )
+            items.append( nv )
+
+    sizes = {}
+    for name,num in items:
+        name = str(name).strip()
+        num = int(num)
+        if not name or name in ['np','ndevice','memory']:
+            raise Exception( 'invalid resource name: '+repr(name) )
+        if num <= 0:
+            raise Exception( 'resource amount must be positive: '+repr(name) )
+        sizes[ name ] = num
+
+    return tuple( sorted( sizes.items() ) )
+
+
 platform_attrs = [
     [ 'batchsys', str, 'batch_system',
             'the batch system type, such as "slurm" or "lsf"' ],
@@ -32,6 +62,11 @@ platform_attrs = [
             "max processors per batch job, or num cores on a workstation" ],
     [ 'maxdevices', int,
             "max devices per batch job, or num devices on a workstation" ],
+    [ 'maxmemory', int,
+            "memory (megabytes) tests can use at once on a workstation" ],
+    [ 'resources', consumable_resource_sizes,
+            "named consumable resources, such as licenses, and the amount "
+            "of each (eg, license=2,scratch=4)" ],
     [ 'maxqtime', int,
             "max time allowed for each batch job submission" ],
     [ 'maxsubs', int,
@@ -122,7 +157,7 @@ class AttrTable:
 
 def create_Platform_instance( platname, mode, platopts,
                               numprocs, maxprocs, devices, max_devices,
-                              onopts, offopts ):
+                              onopts, offopts, max_memory=None ):
     ""
     assert mode in ['direct','batch','batchjob']
 
@@ -145,7 +180,7 @@ def create_Platform_instance( platname, mode, platopts,
                      attrs=dict(specs) )
 
     # options are selected first in here if non-None
-    plat.initialize( numprocs, maxprocs, devices, max_devices )
+    plat.initialize( numprocs, maxprocs, devices, max_devices, max_memory )
 
     return plat
 
@@ -80,6 +80,10 @@ class ParameterExpression:
         for w in self.wexpr.getWordList():
             self.wordD[w] = self._make_func(w)
 
+    def __str__(self):
+        ""
+        return str( self.wexpr )
+
     def evaluate(self, paramD):
         """
         Evaluate the expression previously loaded against the given parameter
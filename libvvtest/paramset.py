@@ -77,15 +77,11 @@ class ParameterSet:
         the getInstances() method afterwards. The param_filter_func() function
         is called with a parameter dict instance, and should return True to
         retain that instance or False to remove it.
-        """
-        self._constructInstances()
 
-        newL = []
-        for instD in self.instances:
-            if param_filter_func( instD ):
-                newL.append( instD )
-
-        self.instances = newL
+        The filter is applied as the instances are constructed, so removed
+        combinations are never accumulated into the instance list.
+        """
+        self._constructInstances( param_filter_func )
 
     def intersectionFilter(self, params_list):
         """
@@ -136,15 +132,22 @@ class ParameterSet:
         """
         return len( self.instances ) == 0
 
-    def _constructInstances(self):
-        ""
+    def _constructInstances(self, instance_filter=None):
+        """
+        If 'instance_filter' is not None, it is only applied when the last
+        parameter group is accumulated, because a filter (such as a parameter
+        expression) can only be evaluated against complete instances.
+        """
         if len(self.params) == 0:
             self.instances = []
 
         else:
             instL = [ {} ]  # a seed for the accumulation algorithm
-            for names,values in self.params.items():
-                instL = accumulate_parameter_group_list( instL, names, values )
+            lastidx = len(self.params) - 1
+            for i,(names,values) in enumerate( self.params.items() ):
+                func = instance_filter if i == lastidx else None
+                instL = accumulate_parameter_group_list( instL, names, values,
+                                                         func )
             self.instances = instL
 
 
@@ -180,7 +183,8 @@ def contains_parameter_name_value( instances, nameT, valL ):
     return ok
 
 
-def accumulate_parameter_group_list( Dlist, names, values_list ):
+def accumulate_parameter_group_list( Dlist, names, values_list,
+                                     instance_filter=None ):
     """
     Performs a cartesian product with an existing list of dictionaries and a
     new name=value set.  For example, if
@@ -206,18 +210,24 @@ def accumulate_parameter_group_list( Dlist, names, values_list ):
           {'A':'a1', 'B':'b2', 'C':'c2'},
           {'A':'a2', 'B':'b1', 'C':'c1'},
           {'A':'a2', 'B':'b2', 'C':'c2'} ]
+
+    If 'instance_filter' is given, it is called with each new dictionary and
+    only those for which it returns True are included in the returned list.
     """
     newL = []
     for values in values_list:
-        L = add_parameter_group_to_list_of_dicts( Dlist, names, values )
+        L = add_parameter_group_to_list_of_dicts( Dlist, names, values,
+                                                  instance_filter )
         newL.extend( L )
     return newL
 
 
-def add_parameter_group_to_list_of_dicts( Dlist, names, values ):
+def add_parameter_group_to_list_of_dicts( Dlist, names, values,
+                                          instance_filter=None ):
     """
     Copies and returns the given list of dictionaries but with
-    names[0]=values[0] and names[1]=values[1] etc added to each.
+    names[0]=values[0] and names[1]=values[1] etc added to each.  Copies for
+    which 'instance_filter' returns False are dropped.
     """
     assert len(names) == len(values)
     N = len(names)
@@ -228,6 +238,7 @@ def add_parameter_group_to_list_of_dicts( Dlist, names, values ):
         newD = D.copy()
         for i in range(N):
             newD[ names[i] ] = values[i]
-        new_Dlist.append( newD )
+        if instance_filter is None or instance_filter( newD ):
+            new_Dlist.append( newD )
 
     return new_Dlist
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+from os.path import join as pjoin, abspath, normpath
+import time
+import hashlib
+import pickle
+
+from . import logger
+from .outpututils import capture_traceback
+
+# change this whenever TestSpec or the cache layout changes incompatibly
+CACHE_VERSION = 3
+
+CACHE_FILENAME = 'vvtest.parsecache'
+GENERATOR_CACHE_FILENAME = 'vvtest.gencache'
+MANIFEST_FILENAME = 'vvtest.scanmanifest'
+
+# a file whose modification time is this close to (or after) the time its
+# cache entry was recorded gets its contents hashed before trusting the
+# entry; guards against coarse file system time stamp resolution
+RACY_SECONDS = 2
+
+
+class CacheFile:
+    """
+    Base class for a dictionary of entries stored in a pickle file.  The
+    file is read on first use, and only written if entries were changed.
+    """
+
+    def __init__(self, cachedir, filename, perms=None):
+        ""
+        self.cachedir = cachedir
+        self.filename = pjoin( cachedir, filename )
+        self.perms = perms
+
+        self.entries = None
+        self.modified = False
+
+    def getFilename(self):
+        ""
+        return self.filename
+
+    def load(self):
+        """
+        Reads the cache file, if it exists.  A corrupt or incompatible cache
+        file is ignored (it will be overwritten by save()).
+        """
+        self.entries = {}
+
+        if os.path.exists( self.filename ):
+            try:
+                with open( self.filename, 'rb' ) as fp:
+                    data = pickle.load( fp )
+                if data.get( 'version', None ) == CACHE_VERSION:
+                    self.entries = data['entries']
+            except Exception:
+                logger.info( 'ignoring unreadable cache file',
+                             repr(self.filename) )
+                self.entries = {}
+
+    def save(self):
+        """
+        Writes the cache file if any entries were added or removed since it
+        was loaded.  The write is skipped if the cache directory does not
+        exist (it can be called again once the directory is created).
+        """
+        if self.modified and os.path.isdir( self.cachedir ):
+
+            tmpname = self.filename + '.' + str( os.getpid() )
+            try:
+                with open( tmpname, 'wb' ) as fp:
+                    pickle.dump( { 'version' : CACHE_VERSION,
+                                   'entries' : self.entries }, fp, 2 )
+                os.rename( tmpname, self.filename )
+
+                if self.perms is not None:
+                    self.perms.apply( self.filename )
+
+            except Exception:
+                xs,tb = capture_traceback( sys.exc_info() )
+                logger.warn( 'failed to write cache file',
+                             repr(self.filename)+':', xs )
+                if os.path.exists( tmpname ):
+                    os.remove( tmpname )
+
+    def _check_load(self):
+        ""
+        if self.entries is None:
+            self.load()
+
+
+class ParseCache( CacheFile ):
+    """
+    An on-disk cache of the TestSpec objects produced by parsing a test file.
+
+    Entries are keyed by the test file path, and a "signature" made of the
+    settings that influence parsing (platform name, option list, forced
+    parameters, execute directory flags and the parameter expression used
+    to exclude test instances).  An entry is valid as long as
+    the test file and the files it includes are unchanged, which is checked
+    by size and modification time and, if those differ or are ambiguous, by
+    a hash of the file contents.  Only the entries with the signature of the
+    current run are saved, so the file does not grow with every combination
+    of settings.
+    """
+
+    def __init__(self, cachedir, idflags={}, platname=None,
+                       optionlist=[], force_params=None, perms=None,
+                       param_expr=None ):
+        ""
+        CacheFile.__init__( self, cachedir, CACHE_FILENAME, perms )
+
+        self.sig = make_signature( idflags, platname, optionlist,
+                                   force_params, param_expr )
+
+        self.hits = 0
+        self.misses = 0
+
+    def numHits(self):
+        ""
+        return self.hits
+
+    def numMisses(self):
+        ""
+        return self.misses
+
+    def getTests(self, rootpath, relpath):
+        """
+        Returns a list of TestSpec objects if the cache contains a valid entry
+        for the given test file, otherwise None.
+        """
+        self._check_load()
+
+        key = self._make_key( rootpath, relpath )
+        entry = self.entries.get( key, None )
+
+        if entry is not None:
+            if entry_is_current( entry ):
+                try:
+                    testL = pickle.loads( entry['tests'] )
+                except Exception:
+                    testL = None
+
+                if testL is not None:
+                    self.hits += 1
+                    return testL
+
+            self.entries.pop( key )
+            self.modified = True
+
+        self.misses += 1
+
+        return None
+
+    def putTests(self, rootpath, relpath, testL, inclfiles):
+        """
+        Stores the given list of TestSpec objects for the given test file.
+        The 'inclfiles' is a list of the files included by the test file.
+        """
+        self._check_load()
+
+        try:
+            filename = abspath( pjoin( rootpath, relpath ) )
+            entry = { 'time'     : time.time(),
+                      'file'     : make_file_info( filename ),
+                      'includes' : [ make_file_info(fn) for fn in inclfiles ],
+                      'tests'    : pickle.dumps( testL, 2 ) }
+        except Exception:
+            # a file vanished or a test could not be serialized; not fatal
+            xs,tb = capture_traceback( sys.exc_info() )
+            logger.debug( 'parse cache store failed:', xs )
+        else:
+            self.entries[ self._make_key( rootpath, relpath ) ] = entry
+            self.modified = True
+
+    def save(self):
+        ""
+        if self.entries is not None:
+            for key in list( self.entries.keys() ):
+                if key[0] != self.sig:
+                    self.entries.pop( key )
+                    self.modified = True
+
+        CacheFile.save( self )
+
+    def _make_key(self, rootpath, relpath):
+        """
+        The literal root path is part of the key because it is stored in the
+        TestSpec objects (it may be relative to the current directory).
+        """
+        rootpath = normpath( rootpath or '.' )
+        return ( self.sig, abspath( rootpath ), rootpath, normpath( relpath ) )
+
+
+class GeneratorCache( CacheFile ):
+    """
+    An on-disk cache of the output of parameter generator programs.
+
+    Entries are keyed by the expanded generator command line, the platform
+    name, and hashes of the generator program file and of the test file.
+    If 'refresh' is True, existing entries are ignored (and replaced).
+    """
+
+    def __init__(self, cachedir, perms=None, refresh=False):
+        ""
+        CacheFile.__init__( self, cachedir, GENERATOR_CACHE_FILENAME, perms )
+
+        self.refresh = refresh
+        self.newentries = {}
+
+    def getOutput(self, testfile, cmdstr, progfile, platname):
+        """
+        Returns the cached output of the generator command 'cmdstr', or None
+        if there is no entry.  The 'progfile' is the generator program file
+        name, or None if the program is not a file (such as a shell command).
+        """
+        if not self.refresh:
+            self._check_load()
+
+            key = make_generator_key( testfile, cmdstr, progfile, platname )
+            if key is not None:
+                return self.entries.get( key, None )
+
+        return None
+
+    def putOutput(self, testfile, cmdstr, progfile, platname, output):
+        ""
+        key = make_generator_key( testfile, cmdstr, progfile, platname )
+        if key is not None:
+            self.addEntries( { key : output } )
+
+    def popNewEntries(self):
+        """
+        Returns a dictionary of the entries added since the last call (used
+        to return generator output from worker processes).
+        """
+        D = self.newentries
+        self.newentries = {}
+        return D
+
+    def addEntries(self, entries):
+        ""
+        if entries:
+            self._check_load()
+            self.entries.update( entries )
+            self.newentries.update( entries )
+            self.modified = True
+
+
+class ScanManifest( CacheFile ):
+    """
+    Records the contents of each directory visited by a test scan, along with
+    the directory modification time.  On the next scan, the recorded listing
+    of a directory whose modification time is unchanged is used instead of
+    reading the directory.  Entries are only added, removed or renamed in a
+    directory by changing its modification time, so the scan results are the
+    same (the test files themselves are checked by the ParseCache).
+    """
+
+    def __init__(self, cachedir, perms=None):
+        ""
+        CacheFile.__init__( self, cachedir, MANIFEST_FILENAME, perms )
+
+        self.reused = 0
+        self.listed = 0
+
+    def numReused(self):
+        ""
+        return self.reused
+
+    def numListed(self):
+        ""
+        return self.listed
+
+    def walk(self, top):
+        """
+        A replacement for os.walk(top), which generates ( dirpath, dirnames,
+        filenames ) in the same order.  As with os.walk, entries can be
+        removed from 'dirnames' to prevent recursion into them, and soft
+        links to directories are listed in 'dirnames' but not recursed into.
+        """
+        listing = self.getListing( top )
+
+        if listing is not None:
+
+            dirs = list( listing[0] )
+            yield top, dirs, list( listing[1] )
+
+            for dname in dirs:
+                path = pjoin( top, dname )
+                if not os.path.islink( path ):
+                    for val in self.walk( path ):
+                        yield val
+
+    def getListing(self, path):
+        """
+        Returns ( subdirectory names, file names ) for the given directory, or
+        None if the directory cannot be read.
+        """
+        self._check_load()
+
+        try:
+            mtime = os.stat( path ).st_mtime
+        except Exception:
+            return None
+
+        key = abspath( path )
+
+        entry = self.entries.get( key, None )
+        if entry is not None:
+            if entry['mtime'] == mtime and mtime < entry['time'] - RACY_SECONDS:
+                self.reused += 1
+                return entry['dirs'], entry['files']
+
+        tm = time.time()
+        try:
+            dirs,files = list_directory( path )
+        except Exception:
+            return None
+
+        self.listed += 1
+        self.entries[ key ] = { 'time':tm, 'mtime':mtime,
+                                'dirs':dirs, 'files':files }
+        self.modified = True
+
+        return dirs,files
+
+
+def list_directory( path ):
+    """
+    Returns the lists ( subdirectory names, other names ) for the entries of
+    the given directory, classified and ordered the same way os.walk does.
+    """
+    dirs = []
+    files = []
+
+    if hasattr( os, 'scandir' ):
+        for entry in os.scandir( path ):
+            try:
+                isdir = entry.is_dir()
+            except OSError:
+                isdir = False
+            if isdir:
+                dirs.append( entry.name )
+            else:
+                files.append( entry.name )
+    else:
+        for name in os.listdir( path ):
+            if os.path.isdir( pjoin( path, name ) ):
+                dirs.append( name )
+            else:
+                files.append( name )
+
+    return dirs,files
+
+
+def make_generator_key( testfile, cmdstr, progfile, platname ):
+    ""
+    try:
+        testhash = hash_file_contents( testfile )
+        proghash = None
+        if progfile and os.path.isfile( progfile ):
+            proghash = hash_file_contents( progfile )
+    except Exception:
+        return None
+
+    return repr( ( sys.version_info[0], cmdstr, proghash, testhash, platname ) )
+
+
+def make_signature( idflags, platname, optionlist, force_params,
+                    param_expr=None ):
+    ""
+    fp = []
+    if force_params:
+        fp = sorted( [ (n,tuple(vals)) for n,vals in force_params.items() ] )
+
+    idf = sorted( [ (n,repr(v)) for n,v in idflags.items() ] )
+
+    return repr( ( sys.version_info[0],
+                   platname,
+                   tuple( sorted( set( optionlist ) ) ),
+                   tuple( fp ),
+                   tuple( idf ),
+                   str( param_expr ) if param_expr else None ) )
+
+
+def make_file_info( filename ):
+    """
+    Returns a tuple ( file name, size, modification time, contents hash ).
+    """
+    st = os.stat( filename )
+    return ( filename, st.st_size, st.st_mtime, hash_file_contents( filename ) )
+
+
+def entry_is_current( entry ):
+    ""
+    tm = entry['time']
+
+    if not file_is_unchanged( entry['file'], tm ):
+        return False
+
+    for finfo in entry['includes']:
+        if not file_is_unchanged( finfo, tm ):
+            return False
+
+    return True
+
+
+def file_is_unchanged( fileinfo, record_time ):
+    ""
+    filename,size,mtime,hsh = fileinfo
+
+    try:
+        st = os.stat( filename )
+    except Exception:
+        return False
+
+    if st.st_size != size:
+        return False
+
+    if st.st_mtime == mtime and mtime < record_time - RACY_SECONDS:
+        return True
+
+    return hash_file_contents( filename ) == hsh
+
+
+def hash_file_contents( filename ):
+    ""
+    with open( filename, 'rb' ) as fp:
+        return hashlib.sha1( fp.read() ).hexdigest()
@@ -6,6 +6,7 @@
 
 import os
 import re
+import math
 
 from .errors import TestSpecError
 from .wordexpr import WordExpression, create_word_expression
@@ -195,6 +196,32 @@ def parse_to_word_expression( string_or_list, lineno=None ):
     return wx
 
 
+memory_size_regex = re.compile( r'([0-9]*[.]?[0-9]+)\s*(?:([kmgt])(?:i?b)?)?$',
+                                re.IGNORECASE )
+memory_unit_factors = { 'k':1./1024, 'm':1, 'g':1024, 't':1024*1024 }
+
+def parse_memory_size( value ):
+    """
+    Parses a memory amount such as "512M", "4G", "2.5GB" or "1T" into an
+    integer number of megabytes (the units are powers of 1024).  A plain
+    number is taken to be megabytes.  Returns (megabytes, error string).
+    """
+    mb = None
+    err = ''
+
+    mat = memory_size_regex.match( str(value).strip() )
+    if mat is None:
+        err = 'invalid memory size: '+repr(value)
+    else:
+        unit = ( mat.group(2) or 'm' ).lower()
+        mb = int( math.ceil( float( mat.group(1) ) * memory_unit_factors[unit] ) )
+        if mb <= 0:
+            mb = None
+            err = 'memory size must be positive: '+repr(value)
+
+    return mb,err
+
+
 def raiseError( arg0, *args, **kwargs ):
     ""
     err = ' '.join( [str(arg0)] + [str(arg) for arg in args] )
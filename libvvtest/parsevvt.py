@@ -35,6 +35,7 @@ from .parseutil import (
         evaluate_platform_expr,
         evaluate_option_expr,
         evaluate_parameter_expr,
+        parse_memory_size,
         raiseError,
     )
 
@@ -47,8 +48,12 @@ class ScriptTestParser:
                        rootpath=None,
                        platname=None,
                        optionlist=[],
-                       force_params=None ):
-        ""
+                       force_params=None,
+                       gencache=None ):
+        """
+        If 'gencache' is not None, it is a GeneratorCache object used to store
+        and retrieve the output of parameter generator programs.
+        """
         self.fpath = filepath
 
         self.root = rootpath or '.'
@@ -56,10 +61,26 @@ class ScriptTestParser:
         self.platname = platname or platform.uname()[0]
         self.optionlist = optionlist
         self.force = force_params
+        self.gencache = gencache
 
         fname = os.path.join( self.root, filepath )
         self.reader = ScriptReader( fname )
 
+        # becomes False if the parse depends on more than the file contents
+        self.cacheable = True
+
+    def getIncludeFiles(self):
+        ""
+        return self.reader.getIncludeFiles()
+
+    def isCacheable(self):
+        """
+        False if the parse results depend on something other than the test
+        file and its include files, such as a parameter generator program
+        or a skipif expression.
+        """
+        return self.cacheable
+
     def parseTestNames(self):
         ""
         return self.parse_test_names()
@@ -78,14 +99,30 @@ class ScriptTestParser:
 
     def parseTestInstance(self, tspec):
         ""
+        self.parseFilterAttributes( tspec )
+        self.completeTestInstance( tspec )
+
+    def parseFilterAttributes(self, tspec):
+        """
+        Parses only the specifications needed to filter the test, which are
+        the enable, skipif, keywords and timeout specifications.
+        """
         self.parse_enable        ( tspec )
         self.parse_skipif        ( tspec )
         self.parse_keywords      ( tspec )
-        self.parse_working_files ( tspec )
         self.parse_timeouts      ( tspec )
+
+    def completeTestInstance(self, tspec):
+        """
+        Parses the remaining specifications of a test previously given to
+        parseFilterAttributes().
+        """
+        self.parse_working_files ( tspec )
         self.parse_baseline      ( tspec )
         self.parse_dependencies  ( tspec )
         self.parse_preload_label ( tspec )
+        self.parse_memory        ( tspec )
+        self.parse_resources     ( tspec )
 
         tspec.setConstructionCompleted()
 
@@ -170,11 +207,13 @@ class ScriptTestParser:
                     raiseError( 'cannot specify type specifiers with a',
                                 'generator attribute', line=spec.lineno )
 
+                self.cacheable = False
+
                 fname = os.path.join( self.root, self.fpath )
                 nameL,valL,depmap = generate_parameters(
                                         fname, spec.value,
                                         testname, self.platname,
-                                        spec.lineno )
+                                        spec.lineno, self.gencache )
                 valL,typmap = types_and_forced_values( nameL, valL,
                                                        self.force, spec.lineno )
 
@@ -521,6 +560,7 @@ class ScriptTestParser:
         """
         testname = tspec.getName()
         for spec in self.itr_specs(testname, "skipif"):
+            self.cacheable = False
             if not spec.value:
                 raiseError("no skipif expression at line", spec.lineno)
             reason = None
@@ -554,6 +594,73 @@ class ScriptTestParser:
                 val = ' '.join( spec.value.strip().split() )
                 tspec.setPreloadLabel( val )
 
+    def parse_memory(self, tspec):
+        """
+          #VVT: memory : 4G
+          #VVT: memory : 512M
+          #VVT: memory (parameters="np=8") : 16GB
+
+        A number with no units is megabytes.
+        """
+        testname = tspec.getName()
+        params = tspec.getParameters()
+
+        for spec in self.itr_specs( testname, 'memory' ):
+
+            check_allowed_attrs( spec.attrs, spec.lineno,
+                'testname parameter parameters platform platforms '
+                'option options' )
+
+            if self.attr_filter( spec.attrs, testname, params, spec.lineno ):
+
+                mb,err = parse_memory_size( spec.value )
+
+                if err:
+                    raiseError( 'invalid memory value:', err, line=spec.lineno )
+
+                tspec.setMemory( mb )
+
+    def parse_resources(self, tspec):
+        """
+          #VVT: resources : license
+          #VVT: resources : license=2, scratch=4
+          #VVT: resources (platforms=Linux) : license
+
+        A name without an amount means an amount of one.
+        """
+        testname = tspec.getName()
+        params = tspec.getParameters()
+
+        for spec in self.itr_specs( testname, 'resources' ):
+
+            check_allowed_attrs( spec.attrs, spec.lineno,
+                'testname parameter parameters platform platforms '
+                'option options' )
+
+            if self.attr_filter( spec.attrs, testname, params, spec.lineno ):
+
+                val = re.sub( r'\s*=\s*', '=', spec.value )
+                for item in val.replace( ',', ' ' ).split():
+
+                    name,amt = ( item.split( '=', 1 ) + ['1'] )[:2]
+                    name = name.strip()
+
+                    if not allowable_word( name ) or \
+                       name in [ 'np', 'ndevice', 'memory' ]:
+                        raiseError( 'invalid resource name:', repr(name),
+                                    line=spec.lineno )
+
+                    try:
+                        amt = int( amt )
+                    except ValueError:
+                        amt = 0
+
+                    if amt <= 0:
+                        raiseError( 'invalid resource amount:', repr(item),
+                                    line=spec.lineno )
+
+                    tspec.setResourceAmount( name, amt )
+
     def itr_specs(self, testname, *spec_names):
         ""
         return self.itr_recurse( self.reader.getSpecList(), testname, *spec_names )
@@ -647,7 +754,8 @@ def check_allowed_attrs( attrD, lineno, allowed ):
                             line=lineno )
 
 
-def generate_parameters( testfile, gencmd, testname, platname, lineno ):
+def generate_parameters( testfile, gencmd, testname, platname, lineno,
+                         gencache=None ):
     ""
     if not gencmd.strip():
         raiseError( 'generator specification is missing', line=lineno )
@@ -666,7 +774,14 @@ def generate_parameters( testfile, gencmd, testname, platname, lineno ):
     prog,xcute = get_generator_program( dname, cmdL[0] )
     cmdL[0] = prog
 
-    out = run_generator_prog( cmdL, gencmd, xcute )
+    out = None
+    if gencache is not None:
+        out = gencache.getOutput( testfile, gencmd, prog, platname )
+
+    if out is None:
+        out = run_generator_prog( cmdL, gencmd, xcute )
+        if gencache is not None:
+            gencache.putOutput( testfile, gencmd, prog, platname, out )
 
     plist,deplist = parse_generator_output( out, lineno )
 
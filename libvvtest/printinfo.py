@@ -184,6 +184,16 @@ def standard_in_has_data():
     return False
 
 
+def standard_in_select_list():
+    """
+    The files to wait on for user input, which is standard in if it is a
+    terminal.
+    """
+    if not_windows and sys.stdin and sys.stdin.isatty():
+        return [ sys.stdin ]
+    return []
+
+
 def exec_path( tcase, test_dir ):
     ""
     xdir = tcase.getSpec().getDisplayString()
@@ -9,6 +9,7 @@ sys.dont_write_bytecode = True
 sys.excepthook = sys.__excepthook__
 import os
 import re
+import time
 import token
 import tokenize
 
@@ -40,6 +41,7 @@ class ScriptReader:
         self.speclineL = []  # list of [line number, raw spec string]
         self.specL = []  # list of ScriptSpec objects
         self.shbang = None  # None or a string
+        self.inclfiles = []  # absolute paths of included files (all depths)
 
         self.readfile()
 
@@ -56,6 +58,13 @@ class ScriptReader:
         """
         return self.specL
 
+    def getIncludeFiles(self):
+        """
+        Returns a list of the files included by this file, including nested
+        includes.  The file names are absolute paths.
+        """
+        return list( self.inclfiles )
+
     vvtpat = re.compile( '[ \t]*#[ \t]*VVT[ \t]*:' )
 
     def readfile(self):
@@ -181,14 +190,17 @@ class ScriptReader:
             filename = os.path.normpath( os.path.join( d, filename ) )
 
         try:
-            inclreader = ScriptReader( filename, self.nested_depth+1 )
+            specL,inclfiles = read_include_file( filename, self.nested_depth+1 )
         except TestSpecError:
             raise
         except Exception:
             raise TestSpecError( 'at line ' + info + ' the include '
                                  'failed: ' + str( sys.exc_info()[1] ) )
 
-        return inclreader.getSpecList()
+        self.inclfiles.append( os.path.abspath( filename ) )
+        self.inclfiles.extend( inclfiles )
+
+        return specL
 
     def _get_file_line_info(self, lineno):
         ""
@@ -198,8 +210,260 @@ class ScriptReader:
             return os.path.basename(self.filename)+':'+str(lineno)
 
 
+# a file whose modification time is this close to (or after) the time its
+# include cache entry was made is read again; guards against coarse file
+# system time stamp resolution
+INCLUDE_CACHE_RACY_SECONDS = 2
+
+# absolute include file path -> ( cache time, file stamps, spec list,
+# nested include files ); shared by all ScriptReader objects in the process
+include_cache = {}
+
+
+def read_include_file( filename, nested_depth ):
+    """
+    Returns the list of ScriptSpec objects from the given include file, and
+    the list of files it includes (nested).  The results are cached by the
+    absolute file path and are reused as long as the modification time and
+    size of the file, and its nested include files, are unchanged.
+
+    The line info strings in the specs depend on the nesting depth only by
+    whether it is zero, and include files always have a nonzero depth, so
+    the depth is not part of the cache key.
+    """
+    assert nested_depth > 0
+
+    absfn = os.path.abspath( filename )
+
+    entry = include_cache.get( absfn, None )
+    if entry is not None:
+        tm,stamps,specL,inclfiles = entry
+        if file_stamps_are_current( stamps, tm ):
+            return list( specL ), list( inclfiles )
+
+    tm = time.time()
+
+    inclreader = ScriptReader( filename, nested_depth )
+
+    specL = inclreader.getSpecList()
+    inclfiles = inclreader.getIncludeFiles()
+
+    # a file changed after 'tm' will not match its stamp
+    stamps = get_file_stamps( [ absfn ] + inclfiles )
+    if stamps is not None:
+        include_cache[ absfn ] = ( tm, stamps, list( specL ), list( inclfiles ) )
+
+    return specL, inclfiles
+
+
+def get_file_stamps( filenames ):
+    """
+    Returns a list of ( file name, modification time, size ), or None if a
+    file could not be stat'ed.
+    """
+    stamps = []
+    for fn in filenames:
+        try:
+            st = os.stat( fn )
+        except Exception:
+            return None
+        stamps.append( ( fn, st.st_mtime, st.st_size ) )
+    return stamps
+
+
+def file_stamps_are_current( stamps, cache_time ):
+    ""
+    for fn,mtime,size in stamps:
+        try:
+            st = os.stat( fn )
+        except Exception:
+            return False
+        if st.st_mtime != mtime or st.st_size != size or \
+           mtime >= cache_time - INCLUDE_CACHE_RACY_SECONDS:
+            return False
+
+    return True
+
+
 def read_directive_lines( filename ):
+    """
+    Returns a list of ( comment string, line number ) for the comments, blank
+    lines and strings at the top of the given Python script, stopping at the
+    first line of code.  Blank lines and strings give an empty comment string.
+
+    The result is the same as using the tokenize module (see the function
+    read_directive_lines_tokenize), but only the header of the file is read
+    and only comments and string literals are recognized.
+    """
+    lines = []
+
+    with open( filename, 'rt' ) as fp:
+        read_header_lines( fp.readline, lines )
+
+    return lines
+
+
+if sys.version_info[0] < 3:
+    STRING_PREFIX = r'(?:[uUbB][rR]?|[rR])?'
+else:
+    STRING_PREFIX = r'(?:[bB][rR]?|[rR][bBfF]?|[fF][rR]?|[uU])?'
+
+STRING_START_REGEX = re.compile( STRING_PREFIX + r'''(\'\'\'|"""|'|")''' )
+
+# these match the remainder of a string starting just after the opening
+# quote(s); they are the same patterns used by the tokenize module
+STRING_END_REGEX = {
+    "'"     : re.compile( r"[^\n'\\]*(?:\\.[^\n'\\]*)*'" ),
+    '"'     : re.compile( r'[^\n"\\]*(?:\\.[^\n"\\]*)*"' ),
+    "'''"   : re.compile( r"[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''" ),
+    '"""'   : re.compile( r'[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""' ),
+}
+
+# single quoted strings can be continued onto the next line with a backslash;
+# the first matches the start of such a string, the second its remainder on
+# each following line
+CONTINUE_STRING_REGEX = {
+    "'" : re.compile( r"[^\n'\\]*(?:\\.[^\n'\\]*)*\\\r?\n" ),
+    '"' : re.compile( r'[^\n"\\]*(?:\\.[^\n"\\]*)*\\\r?\n' ),
+}
+CONTINUED_STRING_REGEX = {
+    "'" : re.compile( r"[^'\\]*(?:\\.[^'\\]*)*'" ),
+    '"' : re.compile( r'[^"\\]*(?:\\.[^"\\]*)*"' ),
+}
+
+
+def read_header_lines( readline, lines ):
+    """
+    A line oriented state machine that appends ( comment, line number ) to
+    'lines' for each comment, blank line and string token that tokenize would
+    produce at the top of a file.  The 'readline' function should return the
+    next line of the file (an empty string at end of file).
+    """
+    lnum = 0
+    continued = False
+
+    while True:
+
+        line = readline()
+        lnum += 1
+
+        if continued:
+            if not line:
+                raise tokenize.TokenError( "EOF in multi-line statement", (lnum,0) )
+            continued = False
+            pos = 0
+
+        else:
+            if not line:
+                return
+
+            pos,col = skip_indentation( line )
+
+            if pos == len(line):
+                return
+            elif line[pos] in '\r\n':
+                lines.append( ('',lnum) )
+                continue
+            elif line[pos] == '#':
+                lines.append( (line[pos:].strip(),lnum) )
+                continue
+            elif col > 0:
+                # an indented statement
+                return
+
+        # read the tokens of the (logical) line
+        while True:
+
+            while pos < len(line) and line[pos] in ' \t\f':
+                pos += 1
+
+            if pos == len(line) or line[pos] in '\r\n':
+                break
+
+            if line[pos] == '#':
+                lines.append( (line[pos:].strip(),lnum) )
+                break
+
+            if line[pos] == '\\' and line[pos+1:].lstrip('\r') == '\n':
+                continued = True
+                break
+
+            m = STRING_START_REGEX.match( line, pos )
+            if m is None:
+                return
+
+            line,pos,lnum = find_string_end( readline, line, m.end(), lnum,
+                                             m.group(1) )
+            if line is None:
+                return
+
+            lines.append( ('',lnum) )
+
+
+def skip_indentation( line ):
+    """
+    Returns the position of the first non-white space character and the
+    indentation column (computed the same way the tokenize module does).
+    """
+    pos = 0
+    col = 0
+    for c in line:
+        if c == ' ':
+            col += 1
+        elif c == '\t':
+            col = ( col//8 + 1 )*8
+        elif c == '\f':
+            col = 0
+        else:
+            break
+        pos += 1
+
+    return pos,col
+
+
+def find_string_end( readline, line, pos, lnum, quote ):
+    """
+    Given the position just after the opening quote(s) of a string literal,
+    returns ( line, position after the closing quote, line number ), reading
+    more lines if necessary.  Returns None for the line if the string is not
+    terminated (where tokenize would produce an ERRORTOKEN).
+    """
+    m = STRING_END_REGEX[quote].match( line, pos )
+    if m is not None:
+        return line, m.end(), lnum
+
+    if len(quote) == 1:
+        if CONTINUE_STRING_REGEX[quote].match( line, pos ) is None:
+            return None, None, lnum
+        endrx = CONTINUED_STRING_REGEX[quote]
+    else:
+        endrx = STRING_END_REGEX[quote]
+
+    while True:
+
+        line = readline()
+        lnum += 1
+
+        if not line:
+            raise tokenize.TokenError( "EOF in multi-line string", (lnum,0) )
+
+        m = endrx.match( line )
+        if m is not None:
+            return line, m.end(), lnum
+
+        if len(quote) == 1 and not line_ends_with_continuation( line ):
+            return None, None, lnum
+
+
+def line_ends_with_continuation( line ):
     ""
+    return line.endswith( '\\\n' ) or line.endswith( '\\\r\n' )
+
+
+def read_directive_lines_tokenize( filename ):
+    """
+    The original (and reference) implementation of read_directive_lines().
+    """
     lines = []
 
     skipnl = False
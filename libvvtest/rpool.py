@@ -18,6 +18,8 @@ class ResourcePool:
             self.maxavail = maxavail
 
         self.pool = None  # maps hardware id to num available
+        self.groups = None  # maps hardware id to a locality group number
+        self.limit = None  # if set, the total is reduced to this number
 
     def maxAvailable(self):
         ""
@@ -36,10 +38,38 @@ class ResourcePool:
             for cnt in self.pool.values():
                 num += max( 0, cnt )
 
+        if self.limit is not None:
+            num = max( 0, num - ( self.total - self.limit ) )
+
         return num
 
+    def setLimit(self, num):
+        """
+        Lowers the number available to at most 'num' in total, without taking
+        back items already handed out.  None removes the limit.
+        """
+        if num is None or num >= self.total:
+            self.limit = None
+        else:
+            self.limit = max( 0, num )
+
+    def setLocalityGroups(self, groups):
+        """
+        The 'groups' is a list of lists of hardware ids, such as the ids on
+        each NUMA node.  Ranges of ids handed out by get() are kept within a
+        group when possible.
+        """
+        self.groups = {}
+        for i,idL in enumerate( groups ):
+            for idx in idL:
+                self.groups[ idx ] = i
+
     def get(self, num):
-        ""
+        """
+        Returns a list of 'num' hardware ids.  A contiguous range of the most
+        available ids is used if there is one, choosing the smallest such
+        range that fits.  Otherwise the ids are spread out.
+        """
         items = []
 
         if num > 0:
@@ -47,6 +77,8 @@ class ResourcePool:
             if self.pool == None:
                 self._initialize_pool()
 
+            items = self._get_contiguous( num )
+
             while len(items) < num:
                 self._get_most_available( items, num )
 
@@ -70,6 +102,28 @@ class ResourcePool:
             if len(items) == num:
                 break
 
+    def _get_contiguous(self, num):
+        ""
+        top = max( self.pool.values() )
+        if top <= 0:
+            return []
+
+        idL = sorted( [ idx for idx,cnt in self.pool.items() if cnt == top ] )
+
+        groupings = [ self.groups, None ] if self.groups else [ None ]
+        for groups in groupings:
+
+            fits = [ (len(run),run[0],run)
+                        for run in find_ranges( idL, groups )
+                            if len(run) >= num ]
+            if fits:
+                items = min( fits )[2][:num]
+                for idx in items:
+                    self.pool[idx] = ( self.pool[idx] - 1 )
+                return items
+
+        return []
+
     def _initialize_pool(self):
         ""
         self.pool = {}
@@ -77,3 +131,55 @@ class ResourcePool:
         for i in range(self.total):
             idx = i%(self.maxavail)
             self.pool[idx] = self.pool.get( idx, 0 ) + 1
+
+
+def find_ranges( idL, groups=None ):
+    """
+    Splits the sorted list of ids into lists of consecutive ids.  If 'groups'
+    is given (a map from id to group number), a range is also split where
+    the group changes.
+    """
+    ranges = []
+
+    for idx in idL:
+        if ranges and ranges[-1][-1]+1 == idx and \
+           ( groups is None or groups.get( ranges[-1][-1] ) == groups.get( idx ) ):
+            ranges[-1].append( idx )
+        else:
+            ranges.append( [idx] )
+
+    return ranges
+
+
+class ConsumablePool:
+    """
+    A pool of a quantity, such as megabytes of memory, where only the amount
+    in use is tracked (not which items are in use).
+    """
+
+    def __init__(self, total):
+        ""
+        assert total and total > 0
+        self.total = total
+        self.used = 0
+
+    def numTotal(self):
+        ""
+        return self.total
+
+    def numAvailable(self):
+        ""
+        return max( 0, self.total - self.used )
+
+    def get(self, num):
+        """
+        Takes the given amount from the pool and returns it.  More than the
+        available amount can be taken (for a test larger than the pool).
+        """
+        num = max( 0, num )
+        self.used += num
+        return num
+
+    def put(self, num):
+        ""
+        self.used -= num
@@ -106,6 +106,217 @@ def num_cores_from_osx_sysctl( fakedata=None ):
     return nc
 
 
+def probe_memory_size():
+    """
+    Tries to determine the memory available on the current machine, in
+    megabytes.  A memory limit on the control group of this process is used
+    if it is smaller than the physical memory.  Returns None if the probes
+    fail.
+    """
+    if platform.uname()[0].startswith( 'Darwin' ):
+        mb = memory_from_osx_sysctl()
+    else:
+        mb = memory_from_proc_meminfo()
+
+    lim = memory_limit_from_cgroup()
+    if lim is not None and ( mb is None or lim < mb ):
+        mb = lim
+
+    return mb
+
+
+def memory_from_proc_meminfo( fakefile=None ):
+    """
+    parse the line of this pattern:
+
+        MemTotal:       16318412 kB
+    """
+    mb = None
+
+    try:
+        fn = fakefile or '/proc/meminfo'
+        with open( fn, 'rt' ) as fp:
+            for line in fp:
+                if line.startswith( 'MemTotal:' ):
+                    kb = int( line.split(':')[1].split()[0] )
+                    mb = kb//1024
+                    break
+    except Exception:
+        pass
+
+    return mb
+
+
+def memory_limit_from_cgroup( fakeroot=None, fakecgroup=None ):
+    """
+    Looks for a memory limit on the control group (version 2 or version 1)
+    containing this process.  Returns megabytes, or None if there is no
+    limit.
+    """
+    root = fakeroot or '/sys/fs/cgroup'
+
+    v2path,v1path = cgroup_paths( fakecgroup or '/proc/self/cgroup' )
+
+    fileL = []
+    if v2path is not None:
+        fileL.append( os.path.join( root, v2path.lstrip('/'), 'memory.max' ) )
+    if v1path is not None:
+        fileL.append( os.path.join( root, 'memory', v1path.lstrip('/'),
+                                    'memory.limit_in_bytes' ) )
+    fileL.append( os.path.join( root, 'memory.max' ) )
+    fileL.append( os.path.join( root, 'memory', 'memory.limit_in_bytes' ) )
+
+    for fn in fileL:
+        try:
+            with open( fn, 'rt' ) as fp:
+                val = fp.read().strip()
+            mb = int(val)//(1024*1024)
+        except Exception:
+            # missing file, or "max" meaning no limit
+            continue
+
+        # version 1 reports a huge number when there is no limit
+        if mb > 0 and mb < 2**40:
+            return mb
+
+    return None
+
+
+def cgroup_paths( filename ):
+    """
+    Returns the version 2 control group path and the version 1 memory control
+    group path of this process, either of which can be None.  The file lines
+    look like
+
+        0::/user.slice/session-3.scope
+        4:memory:/user.slice
+    """
+    v2path = None
+    v1path = None
+
+    try:
+        with open( filename, 'rt' ) as fp:
+            for line in fp:
+                L = line.strip().split( ':', 2 )
+                if len(L) == 3:
+                    if L[0] == '0' and L[1] == '':
+                        v2path = L[2]
+                    elif 'memory' in L[1].split(','):
+                        v1path = L[2]
+    except Exception:
+        pass
+
+    return v2path, v1path
+
+
+def memory_from_osx_sysctl( fakedata=None ):
+    ""
+    try:
+        if fakedata is None:
+            data = shell( 'sysctl -n hw.memsize' )
+        else:
+            data = fakedata
+        mb = int( data.strip() )//(1024*1024)
+    except Exception:
+        mb = None
+
+    return mb
+
+
+def read_load_average( fakefile=None ):
+    """
+    Returns the one minute load average from /proc/loadavg, or None.  The
+    file contents look like
+
+        0.52 0.58 0.59 2/1043 12345
+    """
+    try:
+        with open( fakefile or '/proc/loadavg', 'rt' ) as fp:
+            return float( fp.read().split()[0] )
+    except Exception:
+        return None
+
+
+def read_cpu_pressure( fakefile=None ):
+    """
+    Returns the percent of time in the last 10 seconds that some task was
+    waiting for a CPU, from /proc/pressure/cpu, or None.  The line is
+
+        some avg10=1.53 avg60=0.87 avg300=0.42 total=123456789
+    """
+    try:
+        with open( fakefile or '/proc/pressure/cpu', 'rt' ) as fp:
+            for line in fp:
+                L = line.split()
+                if L and L[0] == 'some':
+                    for item in L[1:]:
+                        if item.startswith( 'avg10=' ):
+                            return float( item.split('=',1)[1] )
+    except Exception:
+        pass
+
+    return None
+
+
+def probe_available_cpus():
+    """
+    Returns a sorted list of the CPU ids this process is allowed to run on,
+    or None if processor affinity is not supported on this platform.
+    """
+    if hasattr( os, 'sched_getaffinity' ):
+        try:
+            return sorted( os.sched_getaffinity(0) )
+        except Exception:
+            pass
+
+    return None
+
+
+def numa_node_cpus( fakeroot=None ):
+    """
+    Returns a list of CPU id lists, one for each NUMA node, or an empty list
+    if the nodes cannot be determined.
+    """
+    root = fakeroot or '/sys/devices/system/node'
+
+    nodes = []
+
+    try:
+        names = [ fn for fn in os.listdir( root )
+                        if re.match( r'node[0-9]+$', fn ) ]
+        names.sort( key=lambda fn: int( fn[4:] ) )
+
+        for fn in names:
+            with open( os.path.join( root, fn, 'cpulist' ), 'rt' ) as fp:
+                cpus = parse_cpu_list( fp.read() )
+            if cpus:
+                nodes.append( cpus )
+
+    except Exception:
+        nodes = []
+
+    return nodes
+
+
+def parse_cpu_list( text ):
+    """
+    Parses the Linux CPU list format, such as "0-3,8-11,16", into a list of
+    integers.
+    """
+    cpus = []
+
+    for item in text.strip().split( ',' ):
+        item = item.strip()
+        if item:
+            if '-' in item:
+                lo,hi = item.split( '-', 1 )
+                cpus.extend( range( int(lo), int(hi)+1 ) )
+            else:
+                cpus.append( int(item) )
+
+    return cpus
+
+
 def shell( cmd ):
     ""
     pop = subprocess.Popen( cmd, shell=True,
@@ -27,6 +27,7 @@ class RuntimeConfig:
         'postclean'  : False,
         'analyze'    : False,
         'logfile'    : True,
+        'bindcores'  : False,
         'testargs'   : [],
     }
 
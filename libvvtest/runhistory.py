@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import json
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+
+# the file name of the database in the test results directory
+HISTORY_FILENAME = 'vvthistory.db'
+
+# results that give a usable runtime sample
+SAMPLE_RESULTS = ( 'pass', 'diff', 'timeout' )
+
+# the max number of variables in one SQL statement (the SQLite default
+# limit is 999)
+QUERY_CHUNK_SIZE = 500
+
+
+def history_available():
+    ""
+    return sqlite3 is not None
+
+
+class RuntimeHistory:
+    """
+    An SQLite database of test runtime samples, stored in the test results
+    directory next to the vvtresults files.  Each sample is keyed by the
+    platform/options configuration (the same string used to match results
+    file names), the test id from pathid (the path relative to the repository
+    root plus the test name and parameters), and the results file it came
+    from.  The results files that have been added are recorded, so each file
+    is only read once.
+    """
+
+    def __init__(self, filename):
+        ""
+        self.filename = filename
+        self.conn = None
+
+    def open(self):
+        ""
+        if self.conn is None:
+            self.conn = sqlite3.connect( self.filename, timeout=60 )
+            self._create_tables()
+
+    def close(self):
+        ""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _create_tables(self):
+        ""
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS samples ( '
+                    'config TEXT, testkey TEXT, source TEXT, '
+                    'date REAL, runtime REAL, result TEXT, rusage TEXT, '
+                    'UNIQUE ( config, testkey, source ) )' )
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS samples_by_test '
+                    'ON samples ( config, testkey, date )' )
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS sources ( source TEXT PRIMARY KEY )' )
+
+    def hasSource(self, source):
+        ""
+        cur = self.conn.execute( 'SELECT 1 FROM sources WHERE source = ?',
+                                 (source,) )
+        return cur.fetchone() is not None
+
+    def addResults(self, config, source, date, testinfo):
+        """
+        Adds the tests from one results file.  The 'source' is the results
+        file base name, 'date' the run start date, and 'testinfo' a list of
+        test dicts as written by listwriter.  Adding the same source again
+        replaces its samples.
+        """
+        rows = []
+        for tD in testinfo:
+            res = tD.get( 'result', None )
+            rt = tD.get( 'runtime', None )
+            if res in SAMPLE_RESULTS and rt is not None:
+                tkey = make_test_key( tD['testid'] )
+                usage = tD.get( 'rusage', None )
+                if usage:
+                    usage = json.dumps( usage )
+                rows.append( ( config, tkey, source,
+                               tD.get( 'startdate', date ), rt, res, usage ) )
+
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO samples VALUES (?,?,?,?,?,?,?)', rows )
+            self.conn.execute(
+                'INSERT OR IGNORE INTO sources VALUES (?)', (source,) )
+
+    def getSamples(self, config, testids, maxsamples):
+        """
+        Returns a dict mapping each test id (a tuple) that has samples to a
+        list of up to 'maxsamples' samples, most recent first.  Each sample is
+        a dict with 'date', 'runtime', 'result', and optionally 'rusage'.
+        """
+        keymap = {}
+        for tid in testids:
+            keymap[ make_test_key( tid ) ] = tuple( tid )
+
+        keys = list( keymap.keys() )
+        samples = {}
+
+        for i in range( 0, len(keys), QUERY_CHUNK_SIZE ):
+            chunk = keys[i:i+QUERY_CHUNK_SIZE]
+            marks = ','.join( ['?']*len(chunk) )
+            cur = self.conn.execute(
+                'SELECT testkey, date, runtime, result, rusage FROM samples '
+                'WHERE config = ? AND testkey IN ('+marks+') '
+                'ORDER BY testkey, date DESC', [config]+chunk )
+
+            for tkey,date,rt,res,usage in cur:
+                L = samples.setdefault( keymap[tkey], [] )
+                if len(L) < maxsamples:
+                    D = { 'date':date, 'runtime':rt, 'result':res }
+                    if usage:
+                        D['rusage'] = json.loads( usage )
+                    L.append( D )
+
+        return samples
+
+
+def make_test_key( testid ):
+    ""
+    return json.dumps( list( testid ) )
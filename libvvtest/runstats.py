@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import math
+
+
+# the weight of the newest sample in the moving average
+EWMA_ALPHA = 0.3
+
+# results whose runtimes are complete measurements (a timeout is only a
+# lower bound on the runtime)
+MEASURED_RESULTS = ( 'pass', 'diff' )
+
+# the coefficient of determination (R^2) of a runtime scaling fit below
+# which it is not used for predictions
+MIN_FIT_QUALITY = 0.5
+
+
+class RuntimeEstimate:
+    """
+    Summarizes the previous runtimes of a test.
+
+        mean    : exponentially weighted moving average of the measured
+                  runtimes, favoring recent runs
+        count   : the number of measured runtimes
+        last_runtime, last_result : the most recent run, which can be a
+                  timeout
+    """
+
+    def __init__(self, runtimes, last_runtime, last_result,
+                       alpha=EWMA_ALPHA):
+        """
+        The 'runtimes' are the measured runtimes, oldest first.
+        """
+        self.runtimes = list( runtimes )
+        self.count = len( self.runtimes )
+        self.last_runtime = last_runtime
+        self.last_result = last_result
+
+        if self.count > 0:
+            self.mean = ewma( self.runtimes, alpha )
+        else:
+            self.mean = last_runtime
+
+    def percentile(self, pct):
+        """
+        The 'pct' percentile (0 to 100) of the measured runtimes, or None if
+        there are none.
+        """
+        if self.count > 0:
+            return percentile( self.runtimes, pct )
+        return None
+
+
+def estimate_from_samples( samples, alpha=EWMA_ALPHA ):
+    """
+    The 'samples' are dicts with 'runtime' and 'result' keys, most recent
+    first (as from RuntimesLookup.getSamples).  Returns a RuntimeEstimate,
+    or None if there are no samples.
+    """
+    if not samples:
+        return None
+
+    runtimes = []
+    for samp in samples:
+        if samp['result'] in MEASURED_RESULTS:
+            runtimes.append( samp['runtime'] )
+    runtimes.reverse()
+
+    return RuntimeEstimate( runtimes,
+                            samples[0]['runtime'],
+                            samples[0]['result'],
+                            alpha )
+
+
+def ewma( values, alpha=EWMA_ALPHA ):
+    """
+    Exponentially weighted moving average of the values, oldest first.
+    """
+    avg = None
+    for val in values:
+        if avg is None:
+            avg = float( val )
+        else:
+            avg = alpha*val + (1.0-alpha)*avg
+
+    return avg
+
+
+def percentile( values, pct ):
+    """
+    The 'pct' percentile (0 to 100) of the values, interpolating linearly
+    between the closest ranks.
+    """
+    L = sorted( values )
+
+    pos = ( len(L)-1 ) * max( 0.0, min( 100.0, pct ) ) / 100.0
+    i = int( pos )
+
+    if i+1 < len(L):
+        return float( L[i] ) + ( L[i+1] - L[i] ) * ( pos - i )
+    return float( L[i] )
+
+
+class RuntimeExtrapolator:
+    """
+    Predicts the runtime of a test instance that has never run from the
+    runtimes of its siblings, which are the instances of the same test
+    name in the same test file.
+
+    A power law in the numeric parameters that differ between the siblings,
+
+        runtime = c * p1^b1 * p2^b2 * ...
+
+    is fit in log space.  Siblings must have the same parameter names and
+    the same values for the parameters that are not positive numbers.
+    """
+
+    def __init__(self):
+        ""
+        self.siblings = {}
+        self.fits = {}
+
+    def addRuntime(self, tspec, runtime):
+        ""
+        if runtime is not None and runtime > 0:
+            key = ( tspec.getFilepath(), tspec.getName() )
+            L = self.siblings.setdefault( key, [] )
+            L.append( ( tspec.getParameters(), float(runtime) ) )
+
+    def predict(self, tspec):
+        """
+        Returns a pair ( runtime, PowerLawFit ), or ( None, None ) if there
+        are not enough siblings or the fit quality is too low.
+        """
+        params = tspec.getParameters()
+
+        numeric = {}
+        for name,val in params.items():
+            num = positive_number( val )
+            if num is not None:
+                numeric[ name ] = num
+
+        if not numeric:
+            return None,None
+
+        fixed = [ (n,v) for n,v in params.items() if n not in numeric ]
+        fitkey = ( tspec.getFilepath(), tspec.getName(),
+                   tuple( sorted( fixed ) ), tuple( sorted( numeric ) ) )
+
+        if fitkey not in self.fits:
+            self.fits[ fitkey ] = self._fit_siblings( fitkey )
+
+        fit = self.fits[ fitkey ]
+
+        if fit is None:
+            return None,None
+
+        for name,val in fit.constants.items():
+            if numeric[ name ] != val:
+                # cannot extrapolate in a parameter that never varied
+                return None,None
+
+        xvals = [ numeric[ name ] for name in fit.names ]
+
+        return fit.evaluate( xvals ), fit
+
+    def _fit_siblings(self, fitkey):
+        ""
+        filepath, testname, fixed, numnames = fitkey
+
+        points = []
+        for sibparams,rt in self.siblings.get( ( filepath, testname ), [] ):
+            if len( sibparams ) == len( fixed ) + len( numnames ) and \
+               all( [ sibparams.get( n, None ) == v for n,v in fixed ] ):
+                xL = [ positive_number( sibparams.get( n, None ) )
+                       for n in numnames ]
+                if None not in xL:
+                    points.append( ( xL, rt ) )
+
+        # only fit the parameters that vary between the siblings
+        names = []
+        constants = {}
+        for i,name in enumerate( numnames ):
+            vals = set( [ xL[i] for xL,rt in points ] )
+            if len( vals ) > 1:
+                names.append( name )
+            elif len( vals ) == 1:
+                constants[ name ] = vals.pop()
+
+        # require more points than coefficients for a meaningful R^2
+        if not names or len( points ) < len( names ) + 2:
+            return None
+
+        idx = [ numnames.index( name ) for name in names ]
+        fit = fit_power_law( [ ( [ xL[i] for i in idx ], rt )
+                               for xL,rt in points ] )
+
+        if fit is None or fit.r2 < MIN_FIT_QUALITY:
+            return None
+
+        fit.names = names
+        fit.constants = constants
+
+        return fit
+
+
+class PowerLawFit:
+    """
+    The fit y = exp(coefs[0]) * x1^coefs[1] * x2^coefs[2] * ..., with the
+    coefficient of determination 'r2' in log space and the number of points
+    fit 'npoints'.
+    """
+
+    def __init__(self, coefs, r2, npoints):
+        ""
+        self.coefs = coefs
+        self.r2 = r2
+        self.npoints = npoints
+
+        self.names = []
+        self.constants = {}
+
+    def evaluate(self, xvals):
+        ""
+        ly = self.coefs[0]
+        for b,x in zip( self.coefs[1:], xvals ):
+            ly += b * math.log( x )
+        return math.exp( ly )
+
+
+def fit_power_law( points ):
+    """
+    Least squares fit of log(y) as a linear function of log(x1), log(x2),
+    ... where 'points' is a list of ( [x1,x2,...], y ) with positive values.
+    Returns a PowerLawFit, or None if the system is singular.
+    """
+    rows = [ [1.0] + [ math.log( x ) for x in xL ] for xL,y in points ]
+    lys = [ math.log( y ) for xL,y in points ]
+
+    n = len( rows[0] )
+    A = [ [ sum( [ r[i]*r[j] for r in rows ] ) for j in range(n) ]
+          for i in range(n) ]
+    b = [ sum( [ r[i]*ly for r,ly in zip( rows, lys ) ] ) for i in range(n) ]
+
+    coefs = solve_linear_system( A, b )
+    if coefs is None:
+        return None
+
+    mean = sum( lys ) / len( lys )
+    sstot = sum( [ (ly-mean)**2 for ly in lys ] )
+    ssres = 0.0
+    for r,ly in zip( rows, lys ):
+        ssres += ( ly - sum( [ c*v for c,v in zip( coefs, r ) ] ) )**2
+
+    if sstot > 0.0:
+        r2 = 1.0 - ssres/sstot
+    else:
+        r2 = 1.0
+
+    return PowerLawFit( coefs, r2, len( points ) )
+
+
+def solve_linear_system( A, b, tol=1.e-10 ):
+    """
+    Gaussian elimination with partial pivoting.  Returns the solution list,
+    or None if the matrix is (nearly) singular.
+    """
+    n = len( b )
+    M = [ [ float(v) for v in A[i] ] + [ float(b[i]) ] for i in range(n) ]
+
+    for k in range(n):
+        piv = max( range( k, n ), key=lambda i: abs( M[i][k] ) )
+        if abs( M[piv][k] ) < tol:
+            return None
+        M[k],M[piv] = M[piv],M[k]
+
+        for i in range( k+1, n ):
+            f = M[i][k] / M[k][k]
+            for j in range( k, n+1 ):
+                M[i][j] -= f * M[k][j]
+
+    x = [ 0.0 ] * n
+    for i in range( n-1, -1, -1 ):
+        s = M[i][n] - sum( [ M[i][j]*x[j] for j in range( i+1, n ) ] )
+        x[i] = s / M[i][i]
+
+    return x
+
+
+def positive_number( value ):
+    ""
+    try:
+        num = float( value )
+    except Exception:
+        return None
+
+    if num > 0.0 and not math.isinf( num ):
+        return num
+
+    return None
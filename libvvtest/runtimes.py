@@ -11,15 +11,26 @@ import glob
 
 from . import listwriter
 from . import pathid
+from . import runhistory
 from . import logger
 from .outpututils import capture_traceback
 
 # only this number of previous results files will be read when searching
-# for a test runtime
+# for a test runtime (when the runtime history database is not available)
 NUM_HISTORICAL_RESULTS_FILES = 7
 
+# the max number of runtime samples of each test taken from the history
+NUM_HISTORY_SAMPLES = 30
+
 
 class RuntimesLookup:
+    """
+    Finds runtimes of tests from previous vvtest runs saved in the results
+    directory.  If possible, the samples come from the runtime history
+    database (see runhistory.py), which is brought up to date with any
+    results files it does not have yet.  Otherwise, the most recent results
+    files are read directly.
+    """
 
     def __init__(self, rtinfo, resultsdir):
         ""
@@ -29,19 +40,70 @@ class RuntimesLookup:
         self.pathcache = pathid.TestPathIdentification()
         self.filecache = []  # list of pairs (filename, test key -> results dict)
 
+        self.history = None
+        self.samples = {}  # test key -> list of samples, most recent first
+
     def load(self):
         ""
         if self.resultsdir is not None:
             if check_results_directory( self.resultsdir ):
 
-                fnL = find_results_files( self.rtinfo, self.resultsdir,
-                                          NUM_HISTORICAL_RESULTS_FILES )
-                for fn in fnL:
-                    self.filecache.append( [fn,None] )
+                if self.history is None and runhistory.history_available():
+                    self.history = open_runtime_history( self.rtinfo,
+                                                         self.resultsdir )
+
+                if self.history is None:
+                    self._load_results_files()
+
+    def _load_results_files(self):
+        ""
+        fnL = find_results_files( self.rtinfo, self.resultsdir,
+                                  NUM_HISTORICAL_RESULTS_FILES )
+        for fn in fnL:
+            self.filecache.append( [fn,None] )
+
+        # read in the first file; the rest are only read in as needed
+        if len(fnL) > 0:
+            get_results_file_map( self.filecache, 0 )
+
+    def loadTests(self, testspecs):
+        """
+        Looks up the history of the given tests with one query, rather than
+        one for each test.
+        """
+        if self.history is not None:
+            tkeyL = []
+            for tspec in testspecs:
+                tkey = self._get_test_key( tspec )
+                if tkey is not None and tkey not in self.samples:
+                    tkeyL.append( tkey )
+                    self.samples[ tkey ] = []
+
+            self.samples.update( self._query_history( tkeyL ) )
+
+    def getSamples(self, testspec):
+        """
+        Returns a list of the previous runs of the test, most recent first,
+        as dicts with 'runtime', 'result', 'date', and optionally 'rusage'.
+        Only runs that passed, diffed, or timed out are included.
+        """
+        tkey = self._get_test_key( testspec )
+        if tkey is None:
+            return []
+
+        if self.history is not None:
+            if tkey not in self.samples:
+                self.loadTests( [ testspec ] )
+            return self.samples[ tkey ]
 
-                # read in the first file; the rest are only read in as needed
-                if len(fnL) > 0:
-                    get_results_file_map( self.filecache, 0 )
+        tinfo = find_test_info( tkey, self.filecache )
+        if tinfo:
+            return [ { 'runtime':tinfo['runtime'],
+                       'result':tinfo['result'],
+                       'date':tinfo.get('startdate',None),
+                       'rusage':tinfo.get('rusage',None) } ]
+
+        return []
 
     def getRunTime(self, testspec):
         """
@@ -50,13 +112,107 @@ class RuntimesLookup:
         """
         rt = res = None
 
-        if self.filecache:
-            tkey = self.pathcache.get_testid( testspec.getFilename(), testspec.getID() )
+        if self.history is not None:
+            sampL = self.getSamples( testspec )
+            if sampL:
+                rt,res = sampL[0]['runtime'],sampL[0]['result']
+
+        elif self.filecache:
+            tkey = self._get_test_key( testspec )
             if tkey is not None:
                 rt,res = find_runtime_for_test( tkey, self.filecache )
 
         return rt,res
 
+    def getResourceUsage(self, testspec):
+        """
+        Search for the resource usage (a dict) of the given test from results
+        files saved from previous vvtest runs.  Returns None if not found.
+        """
+        if self.history is not None:
+            for samp in self.getSamples( testspec ):
+                if samp.get( 'rusage', None ):
+                    return samp['rusage']
+
+        elif self.filecache:
+            tkey = self._get_test_key( testspec )
+            if tkey is not None:
+                return find_resource_usage_for_test( tkey, self.filecache )
+
+        return None
+
+    def _get_test_key(self, testspec):
+        ""
+        return self.pathcache.get_testid( testspec.getFilename(),
+                                          testspec.getID() )
+
+    def _query_history(self, tkeyL):
+        ""
+        try:
+            config = listwriter.results_file_config( self.rtinfo )
+            return self.history.getSamples( config, tkeyL,
+                                            NUM_HISTORY_SAMPLES )
+        except Exception:
+            xs,tb = capture_traceback( sys.exc_info() )
+            logger.warn( '\n'+tb+'\n\n*** error reading runtime history: ' + \
+                         repr(self.history.filename)+'\n...ignoring...' )
+            return {}
+
+
+def open_runtime_history( rtinfo, resultsdir ):
+    """
+    Opens the runtime history database in the results directory and adds any
+    finished results files it does not have yet.  Returns None on error.
+    """
+    dbfile = pjoin( resultsdir, runhistory.HISTORY_FILENAME )
+
+    try:
+        hist = runhistory.RuntimeHistory( dbfile )
+        hist.open()
+        add_results_files_to_history( hist, rtinfo, resultsdir )
+
+    except Exception:
+        xs,tb = capture_traceback( sys.exc_info() )
+        logger.warn( '\n'+tb+'\n\n*** error opening runtime history: ' + \
+                     repr(dbfile)+'\n...reading results files instead...' )
+        hist = None
+
+    return hist
+
+
+def add_results_files_to_history( hist, rtinfo, resultsdir ):
+    ""
+    config = listwriter.results_file_config( rtinfo )
+
+    for fn in listwriter.glob_results_files( resultsdir, rtinfo ):
+        bn = basename( fn )
+        if not hist.hasSource( bn ):
+            try:
+                finfo,tinfo = listwriter.read_results_file( fn )
+            except Exception:
+                xs,tb = capture_traceback( sys.exc_info() )
+                logger.warn( '\n'+tb+'\n\n*** error reading results file: ' + \
+                             repr(fn)+'\n...ignoring...' )
+            else:
+                # unfinished files are added once they are finished
+                if finfo and finfo.get( 'endtime', None ) is not None:
+                    hist.addResults( config, bn, finfo.get( 'starttime', None ),
+                                     tinfo )
+
+
+def find_test_info( testkey, fcache ):
+    """
+    Find the most recent run of the test with a valid runtime.
+    """
+    for i in range(len(fcache)):
+        tmap = get_results_file_map( fcache, i )
+        if tmap:
+            tinfo = tmap.get( testkey, None )
+            if tinfo:
+                return tinfo
+
+    return None
+
 
 def find_runtime_for_test( testkey, fcache ):
     """
@@ -76,6 +232,20 @@ def find_runtime_for_test( testkey, fcache ):
     return None, None
 
 
+def find_resource_usage_for_test( testkey, fcache ):
+    """
+    Find the most recent run of the test that recorded resource usage.
+    """
+    for i in range(len(fcache)):
+        tmap = get_results_file_map( fcache, i )
+        if tmap:
+            tinfo = tmap.get( testkey, None )
+            if tinfo and tinfo.get( 'rusage', None ):
+                return tinfo['rusage']
+
+    return None
+
+
 def get_results_file_map( fcache, index ):
     ""
     L = fcache[index]
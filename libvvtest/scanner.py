@@ -16,24 +16,50 @@ from . import logger
 
 class TestFileScanner:
 
-    def __init__(self, loc, creator, tcasefactory, path_list=[], specform=None ):
+    def __init__(self, loc, creator, tcasefactory, path_list=[], specform=None,
+                       numjobs=None ):
         """
         The 'loc' is a Locator object.
 
         If 'specform' is not None, it must be a list of strings, such as
         ['vvt','xml'].  The scanner will only pick up files for those test
         specification forms.  Default is only 'vvt' files.
+
+        If 'numjobs' is greater than one, the test files found in a directory
+        scan are parsed using a pool of that many worker processes.
         """
         self.loc = loc
         self.creator = creator
         self.fact = tcasefactory
         self.path_list = path_list
+        self.numjobs = numjobs or 1
 
         # this converts the specified form(s) to file name extensions
         self.extensions = creator.getValidFileExtensions( specform )
 
         self.xdirmap = {}  # TestSpec xdir -> TestCase object
 
+        self.pcache = None  # a ParseCache object
+        self.manifest = None  # a ScanManifest object
+
+        # (basepath, relfile) -> (tests, include files, error) as produced
+        # by worker processes
+        self.preparsed = {}
+
+    def setParseCache(self, parse_cache):
+        """
+        If set, test files are only parsed if the given ParseCache object does
+        not have a valid entry for them.
+        """
+        self.pcache = parse_cache
+
+    def setScanManifest(self, scan_manifest):
+        """
+        If set, the given ScanManifest object is used to avoid reading the
+        contents of directories that have not changed since the last scan.
+        """
+        self.manifest = scan_manifest
+
     def scanPaths(self, testlist):
         ""
         for d in self.path_list:
@@ -42,6 +68,31 @@ class TestFileScanner:
 
             self.scanPath( testlist, d )
 
+        if self.pcache is not None:
+            logger.debug( 'parse cache hits', self.pcache.numHits(),
+                          'misses', self.pcache.numMisses() )
+
+        if self.manifest is not None:
+            logger.debug( 'scan manifest directories reused',
+                          self.manifest.numReused(),
+                          'listed', self.manifest.numListed() )
+
+        self.saveParseCache()
+
+    def saveParseCache(self):
+        """
+        Writes the parse cache and the parameter generator cache, if any.
+        """
+        if self.pcache is not None:
+            self.pcache.save()
+
+        if self.manifest is not None:
+            self.manifest.save()
+
+        gencache = self.creator.getGeneratorCache()
+        if gencache is not None:
+            gencache.save()
+
     def scanPath(self, testlist, path):
         """
         Recursively scans for test files starting at 'path'.
@@ -54,22 +105,56 @@ class TestFileScanner:
             else:
                 self._read_from_testlist_file( testlist, path )
         else:
-            for root,dirs,files in os.walk( path ):
-                self._scan_recurse( testlist, path, root, dirs, files )
+            filelist = []
+            for root,dirs,files in self._walk( path ):
+                self._scan_recurse( filelist, path, root, dirs, files )
+
+            self._read_test_files( testlist, filelist )
+
+    def completeTestParsing(self, testlist, deferred_only=False):
+        """
+        Finishes parsing the active tests that were created with deferred
+        parsing or read from a test list file.  If 'deferred_only' is True,
+        tests read from a test list file are left alone.
+        """
+        fmap = {}
+        for tcase in testlist.getActiveTests():
+            tspec = tcase.getSpec()
+            if not tspec.constructionCompleted():
+                if tspec.constructionDeferred() or not deferred_only:
+                    fmap.setdefault( tspec.getFilename(), [] ).append( tcase )
 
-    def completeTestParsing(self, testlist):
-        ""
         with change_directory( self.loc.make_abspath('.') ):
-            for tcase in testlist.getActiveTests():
-                tspec = tcase.getSpec()
-                if not tspec.constructionCompleted():
-                    self.creator.reparse( tspec )
+            for fname,tcaseL in fmap.items():
+                self._complete_file_tests( fname, tcaseL )
 
-    def _scan_recurse(self, testlist, basedir, d, dirs, files):
+        gencache = self.creator.getGeneratorCache()
+        if gencache is not None:
+            gencache.save()
+
+    def _complete_file_tests(self, filename, tcaseL):
+        """
+        A specification error found while completing deferred tests causes
+        the tests in the file to be skipped (similar to a scan error).
+        """
+        specL = [ tcase.getSpec() for tcase in tcaseL ]
+
+        try:
+            self.creator.complete( specL )
+        except TestSpecError:
+            if not any( [ ts.constructionDeferred() for ts in specL ] ):
+                raise
+            logger.warn( "skipping file", filename,
+                         "because", str( sys.exc_info()[1] ) )
+            for tcase in tcaseL:
+                tcase.getStat().markSkipBySpecificationError()
+
+    def _scan_recurse(self, filelist, basedir, d, dirs, files):
         """
         This function is given to os.walk to recursively scan a directory
         tree for test files.  The 'basedir' is the directory originally sent
-        to the os.walk function.
+        to the os.walk function.  Each test file found is appended to
+        'filelist' as a pair ( basedir, file path relative to basedir ).
         """
         d = os.path.normpath(d)
 
@@ -82,7 +167,7 @@ class TestFileScanner:
             bn,ext = os.path.splitext(f)
             if bn and ext in self.extensions:
                 fname = os.path.join(reldir,f)
-                self.readTestFile( testlist, basedir, fname )
+                filelist.append( (basedir,fname) )
 
         linkdirs = []
         for subd in list(dirs):
@@ -101,8 +186,61 @@ class TestFileScanner:
 
         # manually recurse into soft linked directories
         for ld in linkdirs:
-            for lroot,ldirs,lfiles in os.walk( ld ):
-                self._scan_recurse( testlist, basedir, lroot, ldirs, lfiles )
+            for lroot,ldirs,lfiles in self._walk( ld ):
+                self._scan_recurse( filelist, basedir, lroot, ldirs, lfiles )
+
+    def _walk(self, path):
+        ""
+        if self.manifest is None:
+            return os.walk( path )
+        else:
+            return self.manifest.walk( path )
+
+    def _read_test_files(self, testlist, filelist):
+        """
+        Parses and adds the tests in each (basedir,relfile) in 'filelist'.  If
+        parallel parsing is enabled, the files are parsed by worker processes
+        first, but the tests are always added to the test list in the order
+        of 'filelist' (so duplicate test detection is deterministic).
+        """
+        if self.numjobs > 1 and len( filelist ) > 1:
+            self._parse_in_parallel( filelist )
+
+        try:
+            for basedir,fname in filelist:
+                self.readTestFile( testlist, basedir, fname )
+        finally:
+            self.preparsed = {}
+
+    def _parse_in_parallel(self, filelist):
+        ""
+        todo = []
+        for basedir,fname in filelist:
+            key = normalize_file_paths( basedir, fname )
+            if self.pcache is None:
+                todo.append( key )
+            else:
+                testL = self.pcache.getTests( *key )
+                if testL is None:
+                    todo.append( key )
+                else:
+                    # None for the include files prevents a cache store
+                    self.preparsed[ key ] = ( testL, None, None )
+
+        results = None
+
+        if len( todo ) > 1:
+            try:
+                results = parse_files_with_process_pool( self.creator, todo,
+                                                         self.numjobs )
+            except Exception:
+                logger.warn( 'parallel test file parsing failed, falling back',
+                             'to serial parsing:', str( sys.exc_info()[1] ) )
+
+        if results is None:
+            results = [ parse_test_file( self.creator, key ) for key in todo ]
+
+        self.preparsed.update( zip( todo, results ) )
 
     def readTestFile(self, testlist, basepath, relfile):
         """
@@ -111,13 +249,12 @@ class TestFileScanner:
         """
         assert relfile and not os.path.isabs( relfile )
 
-        basepath = os.path.normpath( basepath or '.' )
-        relfile  = os.path.normpath( relfile )
+        basepath,relfile = normalize_file_paths( basepath, relfile )
 
         assert relfile
 
         try:
-            testL = self.creator.fromFile( relfile, basepath )
+            testL = self._create_tests( basepath, relfile )
         except TestSpecError:
             logger.warn( "skipping file", os.path.join( basepath, relfile ),
                          "because", str( sys.exc_info()[1] ) )
@@ -131,6 +268,30 @@ class TestFileScanner:
                 testlist.addTest( tcase )
                 self.xdirmap[ tspec.getExecuteDirectory() ] = tcase
 
+    def _create_tests(self, basepath, relfile):
+        ""
+        result = self.preparsed.pop( (basepath,relfile), None )
+
+        if result is not None:
+            testL,inclfiles,err = result
+            if err is not None:
+                raise TestSpecError( err )
+            if self.pcache is not None and inclfiles is not None:
+                self.pcache.putTests( basepath, relfile, testL, inclfiles )
+            return testL
+
+        if self.pcache is None:
+            return self.creator.fromFile( relfile, basepath )
+
+        testL = self.pcache.getTests( basepath, relfile )
+
+        if testL is None:
+            testL,inclfiles = self.creator.fromFileWithIncludes( relfile, basepath )
+            if inclfiles is not None:
+                self.pcache.putTests( basepath, relfile, testL, inclfiles )
+
+        return testL
+
     def _is_duplicate_execute_directory(self, tspec):
         ""
         xdir = tspec.getExecuteDirectory()
@@ -173,6 +334,77 @@ class TestFileScanner:
                 self.xdirmap[ tspec.getExecuteDirectory() ] = tcase
 
 
+def normalize_file_paths( basepath, relfile ):
+    ""
+    return os.path.normpath( basepath or '.' ), os.path.normpath( relfile )
+
+
+def parse_files_with_process_pool( creator, filelist, numjobs ):
+    """
+    Parses each (basepath,relfile) in 'filelist' using a pool of 'numjobs'
+    processes.  Returns a list of ( tests, include files, error string ),
+    one for each file and in the same order as 'filelist'.
+    """
+    import multiprocessing
+
+    chunksize = max( 1, len(filelist) // ( 8*numjobs ) )
+
+    pool = multiprocessing.Pool( numjobs, _initialize_parse_worker, (creator,) )
+    try:
+        outL = pool.map( _parse_file_in_worker, filelist, chunksize )
+    finally:
+        pool.close()
+        pool.join()
+
+    gencache = creator.getGeneratorCache()
+
+    results = []
+    for result,genentries in outL:
+        results.append( result )
+        if gencache is not None:
+            gencache.addEntries( genentries )
+
+    return results
+
+
+_worker_creator = None
+
+def _initialize_parse_worker( creator ):
+    ""
+    global _worker_creator
+    _worker_creator = creator
+
+
+def _parse_file_in_worker( basepath_relfile ):
+    """
+    Returns the parse_test_file() result and any new parameter generator
+    cache entries.
+    """
+    result = parse_test_file( _worker_creator, basepath_relfile )
+
+    genentries = None
+    gencache = _worker_creator.getGeneratorCache()
+    if gencache is not None:
+        genentries = gencache.popNewEntries()
+
+    return result, genentries
+
+
+def parse_test_file( creator, basepath_relfile ):
+    """
+    Returns ( tests, include files, None ), or if the file has a test
+    specification error, ( None, None, error string ).
+    """
+    basepath,relfile = basepath_relfile
+
+    try:
+        testL,inclfiles = creator.fromFileWithIncludes( relfile, basepath )
+    except TestSpecError:
+        return None, None, str( sys.exc_info()[1] )
+
+    return testL, inclfiles, None
+
+
 def is_vvtest_cache_directory( cdir ):
     ""
     fname = pjoin( cdir, 'vvtest.cache' )
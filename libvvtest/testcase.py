@@ -5,7 +5,11 @@ import os, sys
 from .teststatus import TestStatus
 
 
-class TestCase:
+class TestCase( object ):
+
+    # slots are used to reduce memory for large test lists
+    __slots__ = ( 'tspec', 'nsize', 'tstat', 'deps', 'depidx', 'depdirs',
+                  'has_dependent', 'resource_obj' )
 
     def __init__(self, testspec, nodesize=None):
         ""
@@ -14,6 +18,7 @@ class TestCase:
         self.tstat = TestStatus()
 
         self.deps = []
+        self.depidx = None  # dep test ID -> index into self.deps
         self.depdirs = {}  # xdir -> match pattern
         self.has_dependent = False
         self.resource_obj = None
@@ -30,6 +35,28 @@ class TestCase:
         ""
         return determine_test_size( self.getSpec().getParameters(), self.nsize )
 
+    def getScheduleSize(self):
+        """
+        The size used when choosing tests to run, which is the num procs and
+        num devices plus a sorted tuple of (name,amount) for the consumable
+        resources needed by the test, such as ('memory',megabytes).  Without
+        a memory specification, the peak memory of a previous run is used.
+        """
+        np,nd = self.getSize()
+
+        amounts = self.getSpec().getResourceAmounts()
+        mem = self.getSpec().getMemory()
+        if not mem:
+            peak = self.getStat().getPeakMemory()
+            if peak:
+                # the peak is of the largest single process, not the sum over
+                # the processes of an MPI test
+                mem = round_memory_estimate( peak * max( 1, np ) )
+        if mem:
+            amounts['memory'] = mem
+
+        return ( np, nd, tuple( sorted( amounts.items() ) ) )
+
     def setHasDependent(self):
         ""
         self.has_dependent = True
@@ -40,15 +67,18 @@ class TestCase:
 
     def addDependency(self, testdep):
         ""
-        append = True
-        for i,tdep in enumerate( self.deps ):
-            if tdep.getTestID() == testdep.getTestID():
-                # if same test ID, overwrite
-                self.deps[i] = testdep
-                append = False
-                break
-
-        if append:
+        if self.depidx is None:
+            self.depidx = {}
+
+        depid = testdep.getTestID()
+        i = self.depidx.get( depid, None )
+
+        if i is not None:
+            # if same test ID, overwrite
+            self.deps[i] = testdep
+
+        else:
+            self.depidx[ depid ] = len( self.deps )
             self.deps.append( testdep )
 
             if testdep.ranOrCouldRun():
@@ -130,3 +160,19 @@ def determine_test_size( params, nodesize ):
         nd = 0
 
     return np,nd
+
+
+def round_memory_estimate( megabytes ):
+    """
+    Rounds a measured memory size up to one of a few values per power of two
+    (1, 1.25, 1.5, 1.75 times a power of two), which keeps the number of
+    distinct test sizes small.  None or zero returns None.
+    """
+    if not megabytes:
+        return None
+
+    step = 1
+    while step*8 <= megabytes:
+        step *= 2
+
+    return ( ( megabytes + step - 1 )//step ) * step
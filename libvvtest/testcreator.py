@@ -29,6 +29,40 @@ class TestCreator:
         self.optionlist = optionlist
         self.force_params = force_params
 
+        self.gencache = None  # a GeneratorCache object
+        self.param_expr = None  # a ParameterExpression object
+        self.deferred = False
+
+    def setGeneratorCache(self, generator_cache):
+        """
+        If set, the output of parameter generator programs is taken from the
+        given GeneratorCache object when available, and stored otherwise.
+        """
+        self.gencache = generator_cache
+
+    def getGeneratorCache(self):
+        ""
+        return self.gencache
+
+    def setParameterFilter(self, param_expr):
+        """
+        If set, test instances whose parameters do not satisfy the given
+        ParameterExpression are not created when a test file is parsed.
+        """
+        self.param_expr = param_expr
+
+    def getParameterFilter(self):
+        ""
+        return self.param_expr
+
+    def setDeferredParsing(self, deferred):
+        """
+        If True, the tests created from a file only have the attributes needed
+        for filtering (such as keywords and parameters).  The rest of the
+        parsing is done with the complete() method.
+        """
+        self.deferred = deferred
+
     def getValidFileExtensions(self, specform=None):
         """
         Returns the list of test file extensions that this instance of vvtest
@@ -55,13 +89,29 @@ class TestCreator:
 
         Returns a list of TestSpec objects, including a "parent" test if needed.
         """
+        tests,inclfiles = self.fromFileWithIncludes( relpath, rootpath )
+
+        return tests
+
+    def fromFileWithIncludes(self, relpath, rootpath=None):
+        """
+        Same as fromFile() but also returns the list of files included by the
+        test file (absolute paths).  If the parse results depend on something
+        other than the contents of these files (such as a parameter generator
+        program), the include list is returned as None.
+        """
         assert not os.path.isabs( relpath )
 
         maker = self.create_test_maker( relpath, rootpath, False )
 
         tests = maker.createTests()
 
-        return tests
+        if maker.isCacheable():
+            inclfiles = maker.getIncludeFiles()
+        else:
+            inclfiles = None
+
+        return tests,inclfiles
 
     def reparse(self, tspec):
         """
@@ -77,6 +127,24 @@ class TestCreator:
                                         strict=True )
         maker.reparseTest( tspec )
 
+    def complete(self, tspec_list):
+        """
+        Finishes the construction of each test in the list, either by parsing
+        the rest of a deferred test or by reparsing the test (see reparse()).
+        Each test source file is only read once.
+
+        A TestSpecError is raised if a file has an invalid specification.
+        """
+        for (root,fpath),specL in group_tests_by_file( tspec_list ):
+
+            maker = self.create_test_maker( fpath, root, strict=True )
+
+            for tspec in specL:
+                if tspec.constructionDeferred():
+                    maker.completeTest( tspec )
+                else:
+                    maker.reparseTest( tspec )
+
     def create_test_maker(self, relpath, rootpath, strict):
         """
         When there were two different supported test file formats, this
@@ -89,11 +157,12 @@ class TestCreator:
             parser = ScriptTestParser( relpath, rootpath,
                                        self.platname,
                                        self.optionlist,
-                                       self.force_params )
+                                       self.force_params,
+                                       self.gencache )
         else:
             raise Exception( "Internal error: unknown test file format: "+str(form) )
 
-        maker = TestMaker( parser, self.idflags )
+        maker = TestMaker( parser, self.idflags, self.param_expr, self.deferred )
 
         return maker
 
@@ -126,10 +195,12 @@ def map_extension_to_spec_form( filepath ):
 
 class TestMaker:
 
-    def __init__(self, parser, idflags={}):
+    def __init__(self, parser, idflags={}, param_expr=None, deferred=False):
         ""
         self.parser = parser
         self.idflags = idflags
+        self.param_expr = param_expr
+        self.deferred = deferred
 
     def createTests(self):
         """
@@ -147,6 +218,14 @@ class TestMaker:
 
         return self.tests
 
+    def getIncludeFiles(self):
+        ""
+        return self.parser.getIncludeFiles()
+
+    def isCacheable(self):
+        ""
+        return self.parser.isCacheable()
+
     def reparseTest(self, tspec):
         ""
         # run through the test name logic to check validity
@@ -169,23 +248,54 @@ class TestMaker:
         self.parser.parseTestInstance( tspec )
         add_generator_dependencies( tspec, depmap )
 
+    def completeTest(self, tspec):
+        """
+        Parses the specifications not needed for filtering, for a test created
+        with deferred parsing.
+        """
+        self.parser.completeTestInstance( tspec )
+
     def create_test_list(self, tname):
         ""
         pset,depmap = self.parser.parseParameterSet( tname )
 
-        testL = self.generate_test_objects( tname, pset )
+        # computed before filtering so execute directories do not depend on
+        # the parameter expression
+        suppress = get_suppressed_parameters( pset, self.idflags )
+
+        self.apply_parameter_filter( pset, depmap )
+
+        testL = self.generate_test_objects( tname, pset, suppress )
 
         mark_staged_tests( pset, testL )
 
         analyze_spec = self.parser.parseAnalyzeSpec( tname )
         self.check_add_analyze_test( analyze_spec, tname, pset, testL )
 
-        for t in testL:
-            self.parser.parseTestInstance( t )
-            add_generator_dependencies( t, depmap )
+        # generator dependencies require the parameter generator output, so
+        # tests with a generator are always fully parsed
+        if self.deferred and depmap is None:
+            for t in testL:
+                self.parser.parseFilterAttributes( t )
+                t.setConstructionDeferred()
+        else:
+            for t in testL:
+                self.parser.parseTestInstance( t )
+                add_generator_dependencies( t, depmap )
 
         return testL
 
+    def apply_parameter_filter(self, pset, depmap):
+        """
+        Instances excluded by the parameter expression are never created.
+        Staged tests and generator dependencies refer to sibling instances,
+        so those are left for the test filter to mark as skipped.
+        """
+        if self.param_expr is not None and \
+           depmap is None and \
+           not pset.getStagedGroup():
+            pset.applyParamFilter( self.param_expr.evaluate )
+
     def check_add_analyze_test(self, analyze_spec, tname, pset, testL):
         ""
         if analyze_spec:
@@ -207,7 +317,7 @@ class TestMaker:
 
         return parent
 
-    def generate_test_objects(self, tname, paramset):
+    def generate_test_objects(self, tname, paramset, suppress=None):
         ""
         testL = []
 
@@ -217,7 +327,8 @@ class TestMaker:
             testL.append(t)
 
         else:
-            suppress = get_suppressed_parameters( paramset, self.idflags )
+            if suppress is None:
+                suppress = get_suppressed_parameters( paramset, self.idflags )
 
             # take a cartesian product of all the parameter values
             for pdict in paramset.getInstances():
@@ -230,6 +341,26 @@ class TestMaker:
         return testL
 
 
+def group_tests_by_file( tspec_list ):
+    """
+    Returns a list of ( (root path, file path), test list ) in the order the
+    files first appear in 'tspec_list'.
+    """
+    fmap = {}
+    groups = []
+
+    for tspec in tspec_list:
+        key = ( tspec.getRootpath(), tspec.getFilepath() )
+        specL = fmap.get( key, None )
+        if specL is None:
+            specL = []
+            fmap[ key ] = specL
+            groups.append( ( key, specL ) )
+        specL.append( tspec )
+
+    return groups
+
+
 def get_suppressed_parameters( paramset, idflags ):
     ""
     if 'minxdirs' in idflags:
@@ -11,6 +11,11 @@ import time
 import traceback
 from contextlib import contextmanager
 
+from .launcher import decode_subprocess_exit_code
+from .launcher import set_cpu_affinity
+from .exechandler import setup_test_process
+from .pathutil import change_directory
+
 
 # if a test times out, it receives a SIGINT.  if it doesn't finish up
 # after that in this number of seconds, it gets sent a SIGKILL
@@ -29,13 +34,17 @@ class TestExec:
         self.timeout = 0
         self.rundir = None
         self.resource_obj = None
+        self.affinity = None
 
         self.pid = None
+        self.subpid = None
+        self.launcher = None
         self.tstart = None
         self.tstop = None
 
         self.timedout = None     # time.time() if the test times out
         self.exit_status = None  # subprocess exit status or None if timed out
+        self.rusage = None       # resource usage dict, if available
 
     def getTestCase(self):
         ""
@@ -72,32 +81,44 @@ class TestExec:
         ""
         return self.resource_obj
 
+    def setAffinity(self, cpus):
+        """
+        Bind the test to this list of CPU ids (None means do not bind).
+        """
+        self.affinity = cpus
+
+    def getAffinity(self):
+        ""
+        return self.affinity
+
     def start(self, prepare_for_launch, logfile, is_baseline, perms,
-                    fork_supported=True):
+                    launcher=None):
         """
-        Launches the child process.
+        Prepares the test then launches the child process.  If 'launcher' is
+        a TestLauncher object, the process is spawned by it, otherwise the
+        subprocess module is used.  The start time is taken once the process
+        exists, so the preparation is not counted in the test runtime.
         """
         assert self.pid == None
 
-        self.tstart = time.time()
-
         sys.stdout.flush()
         sys.stderr.flush()
         logfp = self._open_logfile( logfile, is_baseline, perms )
 
-        cwd = os.getcwd()
         try:
-            os.chdir( self.rundir )
-
-            if fork_supported:
-                self.pid = self.prepare_then_execute(
-                                    prepare_for_launch, is_baseline, logfp )
-            else:
-                self.subpid = self.forkless_prepare_then_execute(
-                                    prepare_for_launch, is_baseline, logfp )
+            cmd_list,environ,setup = self._prepare( prepare_for_launch,
+                                                    is_baseline, logfp,
+                                                    launcher is None )
         finally:
             self._close_logfile( logfp )
-            os.chdir( cwd )
+
+        if cmd_list is not None:
+            if launcher is not None:
+                self._launch( launcher, cmd_list, environ, setup, logfp )
+            else:
+                self.subpid = self._popen( cmd_list, environ, logfp )
+
+        self.tstart = time.time()
 
     def _open_logfile(self, logfile, is_baseline, perms):
         ""
@@ -137,13 +158,14 @@ class TestExec:
 
                 assert self.pid > 0
 
-                cpid,code = os.waitpid( self.pid, os.WNOHANG )
+                code = self.launcher.checkExit( self.pid )
 
-                if cpid > 0:
+                if code is not None:
 
                     # test finished
 
                     self.tstop = time.time()
+                    self.rusage = self.launcher.getResourceUsage( self.pid )
 
                     if self.timedout is None:
                         self.exit_status = decode_subprocess_exit_code( code )
@@ -189,10 +211,30 @@ class TestExec:
         ""
         return self.tstop is not None
 
+    def getNextDeadline(self):
+        """
+        Returns the time at which poll() next needs to be called to act on
+        a timeout, or None if the test has no pending deadline.
+        """
+        if self.isStarted() and not self.isDone() and self.timeout > 0:
+            if self.timedout is None:
+                return self.tstart + self.timeout
+            elif self.pid:
+                return self.timedout + interrupt_to_kill_timeout
+
+        return None
+
     def getExitInfo(self):
         ""
         return self.exit_status, self.timedout
 
+    def getResourceUsage(self):
+        """
+        The resource usage of the finished test (a dict), or None if it is not
+        known, such as when the test was not started by a launcher.
+        """
+        return self.rusage
+
     def signalJob(self, sig):
         """
         Sends a signal to the job, such as signal.SIGINT.
@@ -223,59 +265,85 @@ class TestExec:
         
         return t1 or t2
 
-    def prepare_then_execute(self, prepare_for_launch, is_baseline, logfp):
-        ""
-        pid = os_fork_with_retry( 10 )
-        if pid == 0:
-            # this is the new child process
+    def _prepare(self, prepare_for_launch, is_baseline, logfp, setup_here):
+        """
+        Runs the test preparation in this process, with output going to the
+        log file.  The test setup is done here too, in the test directory,
+        if 'setup_here' is True, otherwise it is left to the launcher.
+        Returns the command, environment and test setup, or None,None,None if
+        the test is already finished.
+        """
+        self.subpid = None
 
-            redirect_stdout_err( logfp )
+        try:
+            with redirect_output(logfp):
+                cmd_list,environ,setup = prepare_for_launch( self, is_baseline )
 
-            try:
-                cmd_list = prepare_for_launch( self, is_baseline )
+                if cmd_list is not None and setup and setup_here:
+                    rundir = os.path.abspath( self.rundir )
+                    with change_directory( rundir ):
+                        cmd_list = setup_test_process( setup, rundir,
+                                                       cmd_list, environ )
 
-                sys.stdout.flush() ; sys.stderr.flush()
+            if cmd_list is None:
+                # can only happen in baseline mode
+                self.exit_status = 0
+                return None,None,None
 
-                if cmd_list == None:
-                    # can only happen in baseline mode
-                    os._exit(0)
-                else:
-                    x = group_exec_subprocess( cmd_list )
-                    os._exit(x)
+            return cmd_list,environ,setup
 
-            except:
-                sys.stdout.flush() ; sys.stderr.flush()
-                traceback.print_exc()
-                sys.stdout.flush() ; sys.stderr.flush()
-                os._exit(1)
+        except Exception:
+            traceback.print_exc( file=logfp )
+            self.exit_status = 1
 
-        return pid
+        return None,None,None
 
-    def forkless_prepare_then_execute(self, prepare_for_launch, is_baseline, logfp):
+    def _launch(self, launcher, cmd_list, environ, setup, logfp):
         ""
-        subpid = None
+        logname = None if logfp is None else logfp.name
 
         try:
-            with redirect_output(logfp):
-                cmd_list = prepare_for_launch( self, is_baseline )
+            self.pid = launcher.launch( cmd_list, self.rundir, environ, logname,
+                                        affinity=self.affinity, setup=setup )
+            self.launcher = launcher
+        except Exception:
+            self._write_launch_error( logname )
+            self.exit_status = 1
 
-            if cmd_list is None:
-                # can only happen in baseline mode
-                self.exit_status = 0
-            elif logfp is None:
-                subpid = subprocess.Popen( cmd_list )
-            else:
-                sys.stdout.flush() ; sys.stderr.flush()
-                subpid = subprocess.Popen( cmd_list,
-                                           stdout=logfp.fileno(),
-                                           stderr=subprocess.STDOUT )
+    def _popen(self, cmd_list, environ, logfp):
+        ""
+        subpid = None
+
+        if logfp is None:
+            kwargs = {}
+        else:
+            fp = open( logfp.name, 'a' )
+            kwargs = { 'stdout':fp.fileno(), 'stderr':subprocess.STDOUT }
 
+        if self.affinity:
+            cpus = self.affinity
+            kwargs[ 'preexec_fn' ] = lambda: set_cpu_affinity( cpus )
+
+        try:
+            subpid = subprocess.Popen( cmd_list, cwd=self.rundir,
+                                       env=environ, **kwargs )
         except Exception:
-            traceback.print_exc( file=logfp )
+            self._write_launch_error( None if logfp is None else logfp.name )
             self.exit_status = 1
 
+        if logfp is not None:
+            fp.close()
+
         return subpid
 
+    def _write_launch_error(self, logname):
+        ""
+        if logname:
+            with open( logname, 'a' ) as fp:
+                traceback.print_exc( file=fp )
+        else:
+            traceback.print_exc()
+
 
 @contextmanager
 def redirect_output( fileptr ):
@@ -292,126 +360,3 @@ def redirect_output( fileptr ):
         finally:
             sys.stdout = save_stdout
             sys.stderr = save_stderr
-
-
-def redirect_stdout_err( logfp ):
-    ""
-    if logfp:
-        # reassign stdout & stderr file descriptors to the log file
-        os.dup2( logfp.fileno(), sys.stdout.fileno() )
-        os.dup2( logfp.fileno(), sys.stderr.fileno() )
-
-
-def decode_subprocess_exit_code( exit_code ):
-    ""
-    if os.WIFEXITED( exit_code ):
-        return os.WEXITSTATUS( exit_code )
-
-    if os.WIFSIGNALED( exit_code ) or os.WIFSTOPPED( exit_code ):
-        return 1
-
-    if exit_code == 0:
-        return 0
-
-    return 1
-
-
-def os_fork_with_retry( numtries ):
-    ""
-    assert numtries > 0
-
-    pause = 0.5
-
-    for i in range(numtries):
-
-        try:
-            pid = os.fork()
-            break
-
-        except OSError:
-            # the BlockingIOError subclass of OSError has been seen on heavily
-            # loaded machines; given some time between retries, it will often
-            # succeed
-            if i+1 == numtries:
-                raise
-            time.sleep( pause )
-            pause *= 2
-
-    return pid
-
-
-def group_exec_subprocess( cmd, **kwargs ):
-    """
-    Run the given command in a subprocess in its own process group, then wait
-    for it.  Catch all signals and dispatch them to the child process group.
-
-    The SIGTERM and SIGHUP signals are sent to the child group, but they also
-    cause a SIGKILL to be sent after a short delay.
-
-    This function modifies the current environment by registering signal
-    handlers, so the intended use is something like this
-
-        pid = os.fork()
-        if pid == 0:
-            x = group_exec_subprocess( 'some command', shell=True )
-            os._exit(x)
-    """
-    register_signal_handlers()
-
-    terminate_delay = kwargs.pop( 'terminate_delay', 5 )
-
-    kwargs[ 'preexec_fn' ] = lambda: os.setpgid( os.getpid(), os.getpid() )
-    proc = subprocess.Popen( cmd, **kwargs )
-
-    while True:
-        try:
-            x = proc.wait()
-            break
-        except KeyboardInterrupt:
-            os.kill( -proc.pid, signal.SIGINT )
-        except SignalException:
-            e = sys.exc_info()[1]
-            os.kill( -proc.pid, e.sig )
-            if e.sig in [ signal.SIGTERM, signal.SIGHUP ]:
-                x = check_terminate_subprocess( proc, terminate_delay )
-                break
-        except:
-            os.kill( -proc.pid, signal.SIGTERM )
-
-    return x
-
-
-class SignalException( Exception ):
-    def __init__(self, signum):
-        self.sig = signum
-        Exception.__init__( self, 'Received signal '+str(signum) )
-
-def signal_handler( signum, frame ):
-    raise SignalException( signum )
-
-
-def register_signal_handlers( reset=False ):
-    ""
-    if reset:
-        handler = signal.SIG_DFL
-    else:
-        handler = signal_handler
-
-    signal.signal( signal.SIGTERM, handler )
-    signal.signal( signal.SIGABRT, handler )
-    signal.signal( signal.SIGHUP, handler )
-    signal.signal( signal.SIGALRM, handler )
-    signal.signal( signal.SIGUSR1, handler )
-    signal.signal( signal.SIGUSR2, handler )
-
-
-def check_terminate_subprocess( proc, terminate_delay ):
-    ""
-    if terminate_delay:
-        time.sleep( terminate_delay )
-
-    x = proc.poll()
-
-    os.kill( -proc.pid, signal.SIGKILL )
-
-    return x
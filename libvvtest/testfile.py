@@ -4,29 +4,39 @@
 # (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
 # Government retains certain rights in this software.
 
-import os
+import os, sys
 from os.path import basename
 
 from .paramset import ParameterSet
 
 
-class TestFile:
+class TestFile( object ):
+
+    # slots are used to reduce memory for large test lists
+    __slots__ = ( 'rootpath', 'filepath', 'enabled', 'plat_enable',
+                  'option_enable', 'keywords', 'paramset', 'param_types',
+                  'analyze_spec', 'timeout', 'memory', 'resources', 'preload',
+                  'execL', 'lnfiles', 'cpfiles', 'baseline_files',
+                  'baseline_spec', 'src_files', 'deps', 'skip_reason',
+                  'complete', 'partial' )
 
     def __init__(self, rootpath, filepath):
         ""
         assert not os.path.isabs(filepath)
 
-        self.rootpath = rootpath
-        self.filepath = filepath
+        self.rootpath = intern_string( rootpath )
+        self.filepath = intern_string( filepath )
 
         self.enabled = True
         self.plat_enable = None    # a WordExpression
         self.option_enable = None  # a WordExpression
-        self.keywords = set()      # set of strings
+        self.keywords = EMPTY_KEYWORDS  # frozenset of strings
         self.paramset = ParameterSet()
         self.param_types = {}      # param name to param type
         self.analyze_spec = None
         self.timeout = None        # timeout value in seconds (an integer)
+        self.memory = None         # memory needed in megabytes (an integer)
+        self.resources = None      # consumable resource name to amount
         self.preload = None        # a string label
         self.execL = []            # list of
                                    #   (name, fragment, exit status, analyze)
@@ -42,6 +52,8 @@ class TestFile:
         self.skip_reason = None
 
         self.complete = False      # True if parsing from file is complete
+        self.partial = False       # True if only the attributes needed for
+                                   # filtering have been parsed from file
 
     def getFilename(self):
         """
@@ -110,7 +122,7 @@ class TestFile:
         """
         A list of strings.
         """
-        self.keywords = set( keyword_list )
+        self.keywords = shared_keyword_set( keyword_list )
 
     def getKeywordList(self, include_implicit=True):
         """
@@ -177,6 +189,38 @@ class TestFile:
         """
         return self.timeout
 
+    def setMemory(self, megabytes):
+        """
+        Sets the amount of memory the test needs.  Sending in None will remove
+        the memory specification.
+        """
+        if megabytes != None:
+            megabytes = int(megabytes)
+        self.memory = megabytes
+
+    def getMemory(self):
+        """
+        Returns the memory needed by the test in megabytes (an integer), or
+        None if not specified.
+        """
+        return self.memory
+
+    def setResourceAmount(self, name, amount):
+        """
+        Sets the amount of a named consumable resource (such as a license)
+        needed by the test.
+        """
+        if self.resources is None:
+            self.resources = {}
+        self.resources[ intern_string( name ) ] = int( amount )
+
+    def getResourceAmounts(self):
+        """
+        Returns a dict mapping consumable resource names to the amount needed
+        by the test.
+        """
+        return dict( self.resources or {} )
+
     def setPreloadLabel(self, label):
         ""
         self.preload = label
@@ -324,9 +368,48 @@ class TestFile:
     def setConstructionCompleted(self):
         ""
         self.complete = True
+        self.partial = False
+
+    def constructionDeferred(self):
+        """
+        True if the test was created with only the attributes needed for
+        filtering, and the rest of the parsing was deferred.
+        """
+        return self.partial
+
+    def setConstructionDeferred(self):
+        ""
+        self.partial = True
 
     def setRootpath(self, path):
         ""
-        self.rootpath = path
+        self.rootpath = intern_string( path )
+
+
+if sys.version_info[0] < 3:
+    _intern = intern
+else:
+    _intern = sys.intern
+
+
+def intern_string( value ):
+    """
+    Returns the interned version of 'value' if it is a string, otherwise
+    'value' is returned.  Interning repeated strings (such as file paths
+    and parameter values) reduces memory for large test lists.
+    """
+    if type(value) == str:
+        return _intern( value )
+    return value
+
+
+EMPTY_KEYWORDS = frozenset()
 
+# the tests in a file usually have the same keywords, so the keyword sets
+# are shared (they are never modified)
+keyword_sets = {}
 
+def shared_keyword_set( keyword_list ):
+    ""
+    kwset = frozenset( [ intern_string(k) for k in keyword_list ] )
+    return keyword_sets.setdefault( kwset, kwset )
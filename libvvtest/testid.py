@@ -13,7 +13,15 @@ import hashlib
 DEFAULT_MAX_NAME_LENGTH = 100
 
 
-class TestID:
+class TestID( object ):
+    """
+    Computes the identifiers of a test from its name, file path, parameters
+    and staging.  The identifiers are memoized, so the parameter dictionary
+    and staging list must not be modified after construction (a new TestID
+    must be made instead).
+    """
+
+    __slots__ = ( 'name', 'filepath', 'params', 'staged', 'idtraits', 'memo' )
 
     def __init__(self, testname, filepath, params, staged_names, idtraits={}):
         ""
@@ -22,13 +30,49 @@ class TestID:
         self.params = params
         self.staged = staged_names
         self.idtraits = idtraits
+        self.memo = None
 
     def computeExecuteDirectory(self):
+        ""
+        return self._memoize( 'xdir', self._compute_execute_directory )
+
+    def computeDisplayString(self):
+        ""
+        return self._memoize( 'displ', self._compute_display_string )
+
+    def computeID(self, compress_stage=False):
+        ""
+        return self._memoize( ('id',compress_stage),
+                              self._compute_id, compress_stage )
+
+    def executeDirectoryIsShortened(self):
+        ""
+        return self._memoize( 'shortened', self._is_shortened )
+
+    def computeMatchString(self):
+        ""
+        return self._memoize( 'match', self._compute_match_string )
+
+    def _memoize(self, key, func, *args):
+        ""
+        if self.memo is None:
+            self.memo = {}
+        else:
+            val = self.memo.get( key, None )
+            if val is not None:
+                return val
+
+        val = func( *args )
+        self.memo[ key ] = val
+
+        return val
+
+    def _compute_execute_directory(self):
         ""
         paramL = self._get_parameters( compress_stage=True, compress_hidden=True )
         return self._compute_execute_path( paramL )
 
-    def computeDisplayString(self):
+    def _compute_display_string(self):
         ""
         paramL = self._get_parameters( compress_stage=True, compress_hidden=True )
         displ = self._compute_execute_path( paramL, shorten=False )
@@ -36,13 +80,13 @@ class TestID:
 
         return displ
 
-    def computeID(self, compress_stage=False):
+    def _compute_id(self, compress_stage):
         ""
         lst = [ self.filepath, self.name ]
         lst.extend( self._get_parameters( compress_stage ) )
         return tuple( lst )
 
-    def executeDirectoryIsShortened(self):
+    def _is_shortened(self):
         ""
         paramL = self._get_parameters( compress_stage=True )
         xdir1 = self._compute_execute_path( paramL, shorten=True )
@@ -50,7 +94,7 @@ class TestID:
 
         return xdir1 != xdir2
 
-    def computeMatchString(self):
+    def _compute_match_string(self):
         ""
         paramL = self._get_parameters( compress_stage=True, compress_hidden=False )
         displ = self._compute_execute_path( paramL, shorten=False )
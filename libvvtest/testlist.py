@@ -49,12 +49,21 @@ class TestList:
         ""
         return self.filename
 
-    def setResultsDate(self, starttime=None):
-        ""
+    def setResultsDate(self, starttime=None, unique=False):
+        """
+        If 'unique' is True, the date is moved forward as needed so the
+        results file name is not the same as that of a previous run.
+        """
+        # truncate rather than round, so that durations measured from the
+        # results date are not shortened
         if starttime is not None:
-            self.rundate = int( float( starttime ) + 0.5 )
+            self.rundate = int( float( starttime ) )
         else:
-            self.rundate = int( float( time.time() ) + 0.5 )
+            self.rundate = int( float( time.time() ) )
+
+        if unique:
+            while os.path.exists( self.getResultsFilename() ):
+                self.rundate += 1
 
     def getResultsDate(self):
         ""
@@ -325,6 +334,7 @@ class TestList:
         """
         tmap = self.getTestMap()
         groups = self.getGroupMap()
+        index = None
 
         for tcase in self.getTests():
             if not tcase.getStat().skipTest():
@@ -333,7 +343,12 @@ class TestList:
                     grpL = groups.getGroup( tcase )
                     depend.connect_analyze_dependencies( tcase, grpL, tmap )
 
-                depend.check_connect_dependencies( tcase, tmap, check_dependencies )
+                if index is None and tcase.getSpec().getDependencyPatterns():
+                    index = depend.TestMatchIndex( tmap )
+
+                depend.check_connect_dependencies( tcase, tmap,
+                                                   check_dependencies,
+                                                   index )
 
     def copyResultsIfStateChange(self, tests):
         """
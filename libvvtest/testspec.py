@@ -7,7 +7,7 @@
 import os
 from os.path import basename
 
-from .testfile import TestFile
+from .testfile import TestFile, intern_string
 from .testid import TestID
 
 
@@ -17,6 +17,10 @@ class TestSpec( TestFile ):
     realizations (instances) of the test.
     """
 
+    __slots__ = ( 'name', 'is_analyze', 'params', 'staged', 'first_stage',
+                  'last_stage', 'idtraits', 'testid', 'xdir', 'displ',
+                  'tid' )
+
     def __init__(self, name, rootpath, filepath, idtraits={}):
         """
         A test object always needs a root path and file path, where the file
@@ -24,7 +28,7 @@ class TestSpec( TestFile ):
         """
         TestFile.__init__( self, rootpath, filepath )
 
-        self.name = name
+        self.name = intern_string( name )
 
         self.is_analyze = False
 
@@ -168,7 +172,7 @@ class TestSpec( TestFile ):
         Set the key/value pairs for this test and reset the ID and execute
         directory.
         """
-        self.params = dict( param_dict )
+        self.params = intern_parameters( param_dict )
         self._set_identifiers()
 
     def getParameters(self, typed=False):
@@ -208,12 +212,18 @@ class TestSpec( TestFile ):
 
     def getTestID(self):
         """
-        constructs and returns a TestID object; this object is used to
-        determine the exec dir, the ID, and the display string
+        returns a TestID object; this object is used to determine the exec
+        dir, the ID, and the display string
+
+        The object is constructed on first use and kept, so its memoized
+        identifiers (such as the match string) are reused.  It is discarded
+        when the parameters, staging, or ID traits change.
         """
-        return TestID( self.name, self.getFilepath(),
-                       self.params, self.staged,
-                       self.idtraits )
+        if self.tid is None:
+            self.tid = TestID( self.name, self.getFilepath(),
+                               self.params, self.staged,
+                               self.idtraits )
+        return self.tid
 
     def getIDTraits(self):
         ""
@@ -226,12 +236,29 @@ class TestSpec( TestFile ):
 
     def _set_identifiers(self):
         ""
-        tid = self.getTestID()
+        # not kept until needed (most tests never need more than these ids)
+        self.tid = None
+        tid = TestID( self.name, self.getFilepath(),
+                      self.params, self.staged,
+                      self.idtraits )
 
-        self.testid = tid.computeID()
+        self.testid = tuple( [ intern_string(s) for s in tid.computeID() ] )
         self.xdir   = tid.computeExecuteDirectory()
         self.displ  = tid.computeDisplayString()
 
+        if self.displ == self.xdir:
+            self.displ = self.xdir
+
+
+def intern_parameters( param_dict ):
+    """
+    Returns a copy of 'param_dict' with the names and values interned.
+    """
+    D = {}
+    for n,v in param_dict.items():
+        D[ intern_string(n) ] = intern_string(v)
+    return D
+
 
 def apply_types_to_param_values( paramD, param_types ):
     ""
@@ -6,6 +6,8 @@
 
 import time
 
+from .testfile import intern_string
+
 
 RESULTS_KEYWORDS = [ 'notrun', 'notdone',
                      'fail', 'diff', 'pass',
@@ -43,10 +45,13 @@ SKIP_REASON = {
         'nobaseline'         : 'no rebaseline specification',
         'depskip'            : 'analyze dependency skipped',
         'tsum'               : 'cummulative runtime exceeded',
+        'badspec'            : 'invalid test specification',
     }
 
 
-class TestStatus:
+class TestStatus( object ):
+
+    __slots__ = ( 'attrs', )
 
     def __init__(self):
         ""
@@ -54,7 +59,7 @@ class TestStatus:
 
     def setAttr(self, name, value):
         ""
-        self.attrs[name] = value
+        self.attrs[ intern_string(name) ] = intern_string( value )
 
     def hasAttr(self, name):
         return name in self.attrs
@@ -181,6 +186,10 @@ class TestStatus:
         ""
         self.markSkipped('tsum')
 
+    def markSkipBySpecificationError(self):
+        ""
+        self.markSkipped('badspec')
+
     def markSkipByUserValidation(self, reason):
         ""
         self.markSkipped(reason)
@@ -258,6 +267,8 @@ class TestStatus:
         self.attrs['state'] = 'notdone'
         self.attrs['xtime'] = -1
         self.attrs['xdate'] = int( 100 * start_time ) * 0.01
+        # usage from a previous run must not be reported for this one
+        self.removeAttr( 'rusage' )
 
     def getStartDate(self, *default):
         ""
@@ -291,6 +302,29 @@ class TestStatus:
         ""
         self.attrs['timeout'] = timeout_seconds
 
+    def setResourceUsage(self, usage):
+        """
+        The 'usage' is a dict with keys 'utime', 'stime' (seconds), 'maxrss'
+        (kilobytes), 'inblock', 'oublock', 'nvcsw', and 'nivcsw'.
+        """
+        self.attrs['rusage'] = dict( usage )
+
+    def getResourceUsage(self, *default):
+        ""
+        if len( default ) > 0:
+            return self.attrs.get( 'rusage', default[0] )
+        return self.attrs['rusage']
+
+    def getPeakMemory(self):
+        """
+        Returns the max resident set size from the resource usage in
+        megabytes (rounded up), or None if not known.
+        """
+        usage = self.attrs.get( 'rusage', None )
+        if usage and usage.get( 'maxrss', None ):
+            return ( usage['maxrss'] + 1023 )//1024
+        return None
+
     def markDone(self, exit_status, done_time=None):
         ""
         tzero = self.getStartDate()
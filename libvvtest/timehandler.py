@@ -6,27 +6,55 @@
 
 import os, sys
 
+from . import logger
+from . import runstats
+
+
+# the number of measured runtimes needed before timeouts are computed from
+# the runtime distribution rather than from the most recent runtime
+MIN_SAMPLES_FOR_PERCENTILE = 5
+
+# the smallest timeout computed from the runtime distribution
+MIN_PERCENTILE_TIMEOUT = 60
+
 
 class TimeHandler:
 
     def __init__(self, userplugin, cmdline_timeout,
                        timeout_multiplier, max_timeout,
-                       cache):
-        ""
+                       cache,
+                       timeout_percentile=95,
+                       timeout_margin=1.5):
+        """
+        With enough runtime history, the timeout of a test is the
+        'timeout_percentile' of its previous runtimes times 'timeout_margin'.
+        """
         self.plugin = userplugin
         self.cmdline_timeout = cmdline_timeout
         self.tmult = timeout_multiplier
         self.maxtime = max_timeout
         self.cache = cache
+        self.tpct = timeout_percentile
+        self.tmargin = timeout_margin
+
+        self.predicted = {}
 
     def loadExternalRuntimes(self, tcaselist):
         """
         For each test, the user plugin will be queried or a "runtimes" file
         will be read (if it exists) and the run time for this platform extracted.
         This run time is saved in the 'xtime' test attribute (accessed via the
-        TestStatus.getRuntime() method).
+        TestStatus.getRuntime() method).  With several previous runs, it is the
+        moving average of their runtimes.  Tests that have never run get a
+        runtime extrapolated from the other parameter values of the same test.
+        The resource usage of the most recent run is also loaded from the
+        results files, if the test has none.
         """
         self.cache.load()
+        self.cache.loadTests( [ tcase.getSpec() for tcase in tcaselist ] )
+
+        extrap = runstats.RuntimeExtrapolator()
+        norun = []
 
         for tcase in tcaselist:
 
@@ -37,12 +65,55 @@ class TimeHandler:
             if tout is not None:
                 # Prefer plugin value
                 tstat.setRuntime( int(tout) )
+                extrap.addRuntime( tspec, tout )
             else:
-                tlen, _ = self.cache.getRunTime( tspec )
-                if tlen is not None:
+                est = self.getRuntimeEstimate( tspec )
+                if est is not None:
                     rt = tstat.getRuntime( None )
                     if rt is None:
-                        tstat.setRuntime( int(tlen) )
+                        tstat.setRuntime( int( est.mean + 0.5 ) )
+                    if est.count > 0:
+                        extrap.addRuntime( tspec, est.mean )
+                else:
+                    norun.append( tcase )
+
+            if tstat.getResourceUsage( None ) is None:
+                usage = self.cache.getResourceUsage( tspec )
+                if usage:
+                    tstat.setResourceUsage( usage )
+
+        self._extrapolate_runtimes( extrap, norun )
+
+    def _extrapolate_runtimes(self, extrap, tcaselist):
+        ""
+        self.predicted = {}
+        minr2 = None
+
+        for tcase in tcaselist:
+
+            tspec = tcase.getSpec()
+            tstat = tcase.getStat()
+
+            rt,fit = extrap.predict( tspec )
+            if rt is not None:
+                rt = max( 1, int( rt + 0.5 ) )
+                self.predicted[ tspec.getID() ] = rt
+
+                if tstat.getRuntime( None ) is None:
+                    tstat.setRuntime( rt )
+
+                logger.debug( 'Extrapolated runtime of {0} is {1}s from {2} '
+                              'runs (R^2 = {3:.3f})'.format(
+                                    tspec.getDisplayString(), rt,
+                                    fit.npoints, fit.r2 ) )
+
+                if minr2 is None or fit.r2 < minr2:
+                    minr2 = fit.r2
+
+        if self.predicted:
+            logger.info( 'Extrapolated the runtimes of {0} tests with no '
+                         'previous runs (R^2 of the fits is at least '
+                         '{1:.3f})'.format( len(self.predicted), minr2 ) )
 
     def setTimeouts(self, tcaselist):
         """
@@ -59,24 +130,44 @@ class TimeHandler:
                 # grab explicit timeout value, if the test specifies it
                 tout = tspec.getTimeout()
 
-            # look for a previous runtime value
-            tlen,tresult = self.cache.getRunTime( tspec )
+            # look for previous runtime values
+            est = self.getRuntimeEstimate( tspec )
 
-            if tlen is not None:
+            if est is not None:
 
                 if tout is None:
-                    if tresult == "timeout":
-                        tout = self._timeout_if_test_timed_out( tspec, tlen )
+                    if est.last_result == "timeout":
+                        tout = self._timeout_if_test_timed_out(
+                                                tspec, est.last_runtime )
+                    elif est.count >= MIN_SAMPLES_FOR_PERCENTILE:
+                        tout = self._timeout_from_runtime_distribution( est )
                     else:
-                        tout = self._timeout_from_previous_runtime( tlen )
+                        tout = self._timeout_from_previous_runtime(
+                                                est.last_runtime )
 
             elif tout is None:
-                tout = self._default_timeout( tspec )
+                rt = self.predicted.get( tspec.getID(), None )
+                if rt is not None:
+                    tout = self._timeout_from_previous_runtime( rt )
+                else:
+                    tout = self._default_timeout( tspec )
 
             tout = self._apply_timeout_options( tout )
 
             tstat.setTimeoutValue( tout )
 
+    def getRuntimeEstimate(self, tspec):
+        """
+        Returns a runstats.RuntimeEstimate from the previous runs of the test,
+        or None if there are none.
+        """
+        return runstats.estimate_from_samples( self.cache.getSamples( tspec ) )
+
+    def _timeout_from_runtime_distribution(self, estimate):
+        ""
+        tm = estimate.percentile( self.tpct ) * self.tmargin
+        return max( MIN_PERCENTILE_TIMEOUT, int( tm + 0.5 ) )
+
     def _timeout_if_test_timed_out(self, tspec, runtime):
         ""
         # for tests that timed out, make timeout much larger
@@ -162,6 +253,15 @@ def parse_timeout_multiplier( value ):
     return val,err
 
 
+def parse_timeout_percentile( value ):
+    ""
+    val,err = parse_number( value )
+    if not err and val is not None and ( val < 0 or val > 100 ):
+        err = 'must be between 0 and 100: '+repr(value)
+
+    return val,err
+
+
 def parse_max_time( value ):
     """
     Negative values and zero will be None. A positive value will result in
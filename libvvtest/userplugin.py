@@ -103,27 +103,33 @@ class UserPluginBridge:
         prog = None
 
         if self.preload is not None:
-            specs = make_test_to_user_interface_dict( self.rtconfig, tcase, self.idcache )
-            try:
-                label = tcase.getSpec().getPreloadLabel()
-                if label:
-                    specs['preload'] = label
-                prog = self.preload( specs )
-                if prog is not None:
-                    if type(prog) != type(''):
-                        raise Exception( "function 'preload' returned an object "
-                            "of type "+str(type(prog))+" but only None or "
-                            "string are allowed" )
-                    if not prog.strip():
-                        raise Exception( "function 'preload' returned an "
-                            "empty string" )
-            except Exception:
-                xs,tb = outpututils.capture_traceback( sys.exc_info() )
-                sys.stdout.write( '\n' + tb + '\n' )
-                prog = None
+            specs = self._make_preload_specs( tcase )
+            prog = call_preload_function( self.preload, specs )
 
         return prog
 
+    def getPreloadRequest(self, tcase):
+        """
+        Returns None if there is no preload function, otherwise a dict that
+        call_preload_request() uses to call it in another process.
+        """
+        if self.preload is None:
+            return None
+
+        return { 'plugin'   : os.path.abspath( self.plugin.__file__ ),
+                 'sys.path' : list( sys.path ),
+                 'specs'    : self._make_preload_specs( tcase ) }
+
+    def _make_preload_specs(self, tcase):
+        ""
+        specs = make_test_to_user_interface_dict( self.rtconfig, tcase, self.idcache )
+
+        label = tcase.getSpec().getPreloadLabel()
+        if label:
+            specs['preload'] = label
+
+        return specs
+
     def _call_time_function(self, tcase, func):
         ""
         rtn = None
@@ -226,6 +232,60 @@ def make_test_to_user_interface_dict( rtconfig, tcase, idcache ):
     return specs
 
 
+def call_preload_function( preload, specs ):
+    ""
+    prog = None
+
+    try:
+        prog = preload( specs )
+        if prog is not None:
+            if type(prog) != type(''):
+                raise Exception( "function 'preload' returned an object "
+                    "of type "+str(type(prog))+" but only None or "
+                    "string are allowed" )
+            if not prog.strip():
+                raise Exception( "function 'preload' returned an "
+                    "empty string" )
+    except Exception:
+        xs,tb = outpututils.capture_traceback( sys.exc_info() )
+        sys.stdout.write( '\n' + tb + '\n' )
+        prog = None
+
+    return prog
+
+
+def call_preload_request( request ):
+    """
+    Calls the preload function of a request made by
+    UserPluginBridge.getPreloadRequest().  As with testPreload(), the
+    function may modify os.environ, and the return value is None or the
+    program to run the test with.
+    """
+    def preload( specs ):
+        return load_plugin_file( request ).test_preload( specs )
+
+    return call_preload_function( preload, request['specs'] )
+
+
+plugin_file_modules = {}  # plugin file name -> module
+
+def load_plugin_file( request ):
+    """
+    Imports the plugin file of a preload request, only once per process.
+    """
+    fname = request['plugin']
+
+    mod = plugin_file_modules.get( fname, None )
+    if mod is None:
+        for dn in request['sys.path']:
+            if dn not in sys.path:
+                sys.path.append( dn )
+        mod = importutil.create_module_from_filename( fname )
+        plugin_file_modules[ fname ] = mod
+
+    return mod
+
+
 def import_user_plugin( modulename ):
     ""
     mod = None
@@ -29,9 +29,12 @@ class Platform:
         self.maxsize  = (None,None)  # max core, max device
         self.size     = (None,None)  # num core, num device
         self.nodesize = (None,None)  # ppn, dpn
+        self.maxmemory = None        # megabytes
 
         self.procpool = None
         self.devicepool = None
+        self.cpus = None  # CPU ids this process can run on
+        self.consumables = {}  # name -> rpool.ConsumablePool
 
     # ----------------------------------------------------------------
 
@@ -50,6 +53,39 @@ class Platform:
         ""
         return self.nodesize
 
+    def getMaxMemory(self):
+        """
+        The memory that tests can use at any one time, in megabytes, or None
+        if memory is not limited.
+        """
+        return self.maxmemory
+
+    def getConsumableSizes(self):
+        """
+        Returns a dict mapping the name of each consumable resource pool,
+        such as "memory" or the names given by the "resources" platform
+        attribute, to its total amount.
+        """
+        D = {}
+        for name,pool in self.consumables.items():
+            D[ name ] = pool.numTotal()
+        return D
+
+    def getProcessorCPUs(self, procs):
+        """
+        Maps the processor ids handed out by getResources() to the ids of
+        the CPUs of this machine.  Returns a sorted list, or None if the CPUs
+        are not known.
+        """
+        if not self.cpus:
+            return None
+
+        cpuset = set()
+        for idx in procs:
+            cpuset.add( self.cpus[ idx % len(self.cpus) ] )
+
+        return sorted( cpuset )
+
     def getAttributes(self):
         ""
         return self.attrs
@@ -67,6 +103,10 @@ class Platform:
             if maxnp is not None: s += ', max cores = '+str(maxnp)
             if nd    is not None: s += ', num devices = '+str(nd)
             if maxnd is not None: s += ', max devices = '+str(maxnd)
+            if self.maxmemory is not None:
+                s += ', max memory = '+str(self.maxmemory)+'M'
+            for name,num in self.attrs.get( 'resources', () ):
+                s += ', '+name+' = '+str(num)
         logger.info( s )
 
     ##################################################################
@@ -83,17 +123,20 @@ class Platform:
         n = self.attrs.get( 'maxsubs', 5 )
         return n
 
-    def initialize(self, num_procs, max_procs, num_devices, max_devices ):
+    def initialize(self, num_procs, max_procs, num_devices, max_devices,
+                         max_memory=None ):
         """
-        Determine and set the number of CPU cores and devices.  The arguments
-        are from the command line:
+        Determine and set the number of CPU cores and devices, and the amount
+        of memory.  The arguments are from the command line:
 
             num_procs   is -n
             num_devices is --devices
             max_procs   is -N
             max_devices is --max-devices
+            max_memory  is --max-memory (in megabytes)
         """
         self._init_size( num_procs, max_procs, num_devices, max_devices )
+        self._init_memory( max_memory )
 
         if self.mode != 'batch':
             self._construct_resource_pools()
@@ -120,6 +163,16 @@ class Platform:
         self.size = (np,nd)
         self.maxsize = (maxnp,maxnd)
 
+    def _init_memory(self, max_memory):
+        ""
+        mx = max_memory
+        if mx is None:
+            mx = self._get_max_size_from_plugin( 'maxmemory' )
+            if mx is None and self.mode != 'batch':
+                mx = rprobe.probe_memory_size()
+
+        self.maxmemory = mx or None
+
     def _get_max_size_from_plugin(self, attrname):
         ""
         if self.mode == 'batchjob':
@@ -204,9 +257,23 @@ class Platform:
         if np:
             self.procpool = rpool.ResourcePool( np, maxnp )
 
+            self.cpus = rprobe.probe_available_cpus()
+            if self.cpus:
+                nodes = rprobe.numa_node_cpus()
+                groups = processor_locality_groups( maxnp or np,
+                                                    self.cpus, nodes )
+                if len( groups ) > 1:
+                    self.procpool.setLocalityGroups( groups )
+
         if nd:
             self.devicepool = rpool.ResourcePool( nd, maxnd )
 
+        if self.maxmemory:
+            self.consumables['memory'] = rpool.ConsumablePool( self.maxmemory )
+
+        for name,num in self.attrs.get( 'resources', () ):
+            self.consumables[name] = rpool.ConsumablePool( num )
+
     def _set_subprocess_batching(self):
         """
         If cores/devices per node is not set, we set the compute node size
@@ -223,16 +290,39 @@ class Platform:
         self.attrs['dpn'] = self.attrs.get( 'dpn', maxnd )
 
     def sizeAvailable(self):
-        ""
+        """
+        Returns the available (num procs, num devices, consumables), where
+        consumables is a dict mapping the name of each consumable resource
+        pool (such as "memory") to its available amount.
+        """
         sznp = self.procpool.numAvailable()
+
         if self.devicepool is None:
-            return ( sznp, 0 )
+            sznd = 0
         else:
-            return ( sznp, self.devicepool.numAvailable() )
+            sznd = self.devicepool.numAvailable()
+
+        avail = {}
+        for name,pool in self.consumables.items():
+            avail[ name ] = pool.numAvailable()
+
+        return ( sznp, sznd, avail )
+
+    def setProcessorLimit(self, num):
+        """
+        Reduces the number of processors handed out (in total) to 'num', such
+        as when other users are loading the machine.  None means no limit.
+        """
+        if self.procpool is not None:
+            self.procpool.setLimit( num )
 
     def getResources(self, size):
-        ""
-        np,ndevice = size
+        """
+        The 'size' is (num procs, num devices) or (num procs, num devices,
+        consumables), where consumables is a sequence of (name, amount) pairs,
+        such as ('memory',1024).  Names without a pool are ignored.
+        """
+        np,ndevice = size[:2]
 
         procs = self.procpool.get( np )
 
@@ -246,6 +336,12 @@ class Platform:
                                        self.getattr( 'mpifile', '' ),
                                        self.getattr( 'mpiopts', '' ) )
 
+        if len(size) > 2:
+            for name,amount in size[2]:
+                if name in self.consumables:
+                    pool = self.consumables[name]
+                    job_info.consumed[ name ] = pool.get( amount )
+
         return job_info
 
     def returnResources(self, job_info):
@@ -253,6 +349,27 @@ class Platform:
         self.procpool.put( job_info.procs )
         if self.devicepool != None and job_info.devices != None:
             self.devicepool.put( job_info.devices )
+        for name,amount in job_info.consumed.items():
+            self.consumables[name].put( amount )
+
+
+def processor_locality_groups( maxprocs, cpus, nodes ):
+    """
+    Groups the processor ids 0 to 'maxprocs'-1 by the NUMA node of the CPU
+    each one maps to, where processor id i maps to cpus[i%len(cpus)].  The
+    'nodes' is a list of CPU id lists.  Returns a list of processor id lists.
+    """
+    nodemap = {}
+    for i,cpuL in enumerate( nodes ):
+        for cpu in cpuL:
+            nodemap[ cpu ] = i
+
+    groups = {}
+    for idx in range( maxprocs ):
+        node = nodemap.get( cpus[ idx % len(cpus) ], -1 )
+        groups.setdefault( node, [] ).append( idx )
+
+    return [ groups[node] for node in sorted( groups.keys() ) ]
 
 
 def determine_processor_cores( num_procs, max_procs, plugin_max, use_probe=True ):
@@ -302,6 +419,7 @@ class JobInfo:
         self.maxprocs = maxprocs
         self.devices = None
         self.maxdevices = None
+        self.consumed = {}  # consumable resource name -> amount
         self.mpi_opts = ''
 
 